@@ -0,0 +1,626 @@
+"""
+This module contains the data backends that DataAnalysis runs its aggregations
+on. The PandasBackend works on a dataframe in memory. The DuckDBBackend runs
+the same aggregations as multi-threaded, columnar SQL queries over a Parquet
+or CSV file, so only the columns a query uses are read and only its
+aggregated result is brought into memory. DuckDB is optional and is only
+imported when a DuckDBBackend is created.
+
+Rows are selected with filters in the format used by pyarrow, a list of
+(column, operator, value) tuples that must all hold, e.g.,
+[("Balance (EUR)", "==", 0), ("Exited", "==", 1)].
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from features import FeatureBuilder, quote_identifier
+
+# Operators that can be used in filters
+FILTER_OPERATORS = {
+    "==": np.equal,
+    "!=": np.not_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+}
+
+# SQL operator of each filter operator
+SQL_FILTER_OPERATORS = {
+    "==": "=",
+    "!=": "<>",
+    ">": ">",
+    ">=": ">=",
+    "<": "<",
+    "<=": "<=",
+}
+
+# Quartiles and whisker range used for box plots, matching seaborn
+BOX_PLOT_QUANTILES = [0.25, 0.5, 0.75]
+WHISKER_IQR = 1.5
+
+# File types the lazy backends can query in place
+LAZY_EXTENSIONS = (".parquet", ".csv")
+
+
+def _sql_literal(value) -> str:
+    """
+    Writes a string, number or boolean as a SQL literal
+    """
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    if isinstance(value, (bool, np.bool_)):
+        return "TRUE" if value else "FALSE"
+
+    return repr(value)
+
+
+def _check_filters(filters: list[tuple]) -> None:
+    """
+    Raises a ValueError for filters with an unknown operator
+    """
+    for _, operator, _ in filters:
+        if operator not in FILTER_OPERATORS:
+            raise ValueError(f"Unknown filter operator {operator}")
+
+
+class PandasBackend():
+    """
+    The PandasBackend runs aggregations on a dataframe in memory. Filters
+    are applied lazily when an aggregation runs, and only to the columns the
+    aggregation uses.
+
+    Attributes:
+        * self.df: (pd.DataFrame)
+        * self.filters: (list(tuple))
+
+    Methods:
+        * where
+        * num_rows
+        * describe
+        * value_counts
+        * label_counts
+        * group_means
+        * box_plot_stats
+        * select
+        * split
+    """
+
+    def __init__(self, df: pd.DataFrame,
+                 filters: list[tuple] | None = None) -> None:
+        """
+        Init function for the PandasBackend class
+
+        Inputs:
+            * df: (pd.DataFrame) The data
+            * filters: (list(tuple)) Filters selecting the rows to use
+        """
+        self.df = df
+        self.filters = [] if filters is None else list(filters)
+        _check_filters(self.filters)
+
+    def where(self, filters: list[tuple]) -> "PandasBackend":
+        """
+        Inputs:
+            * filters: (list(tuple)) Filters to add
+
+        Returns:
+            * backend: (PandasBackend) Backend over the rows that also match
+              the filters
+        """
+        return PandasBackend(self.df, self.filters + list(filters))
+
+    def num_rows(self) -> int:
+        """
+        Returns:
+            * num_rows: (int) Number of rows that match the filters
+        """
+        mask = self._mask()
+        return len(self.df) if mask is None else int(mask.sum())
+
+    def describe(self, columns: list[str],
+                 categorical: bool = False) -> pd.DataFrame:
+        """
+        Inputs:
+            * columns: (list(string)) Columns to describe
+            * categorical: (bool) If True then the columns are described as
+              categories, otherwise as numbers
+
+        Returns:
+            * description: (pd.DataFrame) Summary statistics of each column
+              in the format of pd.DataFrame.describe
+        """
+        data = self.select(columns)
+        if categorical:
+            return data.describe(exclude=[np.number])
+
+        return data.describe()
+
+    def value_counts(self, col: str) -> pd.Series:
+        """
+        Inputs:
+            * col: (string) Column to count the values of
+
+        Returns:
+            * counts: (pd.Series) Number of rows with each value, most
+              frequent first
+        """
+        return self._columns([col])[0].value_counts()
+
+    def label_counts(self, col: str, label_col: str) -> pd.DataFrame:
+        """
+        Inputs:
+            * col: (string) Column to count the values of
+            * label_col: (string) Column containing the labels
+
+        Returns:
+            * counts: (pd.DataFrame) Number of rows for each label (columns)
+              and value of col (rows)
+        """
+        values, labels = self._columns([col, label_col])
+
+        return labels.groupby(values, observed=True).value_counts() \
+            .unstack(fill_value=0).sort_index()
+
+    def group_means(self, col: str, label_col: str) \
+            -> tuple[float, pd.Series]:
+        """
+        Inputs:
+            * col: (string) Column to average
+            * label_col: (string) Column containing the labels
+
+        Returns:
+            * all_mean: (float) Mean of col over every row
+            * label_means: (pd.Series) Mean of col for each label
+        """
+        values, labels = self._columns([col, label_col])
+
+        return values.mean(), values.groupby(labels).mean()
+
+    def box_plot_stats(self, col: str, label_col: str) -> list[dict]:
+        """
+        Computes the statistics needed to draw a box plot of a column for each
+        label without passing the raw rows to the plotting library. Whiskers
+        extend to the most extreme values within 1.5 times the interquartile
+        range of the box, matching seaborn.
+
+        Inputs:
+            * col: (string) Column the box plots are drawn for
+            * label_col: (string) Column the box plots are split by
+
+        Returns:
+            * box_stats: (list(dict)) Statistics for matplotlib's bxp, one
+              per label in ascending order
+        """
+        values, labels = self._columns([col, label_col])
+
+        quartiles = values.groupby(labels).quantile(BOX_PLOT_QUANTILES) \
+            .unstack()
+        iqr = quartiles[0.75] - quartiles[0.25]
+        lower_fence = labels.map(quartiles[0.25] - WHISKER_IQR * iqr)
+        upper_fence = labels.map(quartiles[0.75] + WHISKER_IQR * iqr)
+
+        within_fences = (values >= lower_fence) & (values <= upper_fence)
+        whiskers = values[within_fences].groupby(labels[within_fences]) \
+            .agg(['min', 'max'])
+
+        return [{'label': label,
+                 'q1': quartiles.loc[label, 0.25],
+                 'med': quartiles.loc[label, 0.5],
+                 'q3': quartiles.loc[label, 0.75],
+                 'whislo': whiskers.loc[label, 'min'],
+                 'whishi': whiskers.loc[label, 'max']}
+                for label in quartiles.index]
+
+    def select(self, columns: list[str] | None = None) -> pd.DataFrame:
+        """
+        Inputs:
+            * columns: (list(string)) Columns to return. Defaults to every
+              column.
+
+        Returns:
+            * df: (pd.DataFrame) The rows that match the filters
+        """
+        df = self.df if columns is None else self.df[columns]
+        mask = self._mask()
+
+        return df if mask is None else df[mask]
+
+    def split(self, id_col: str, test_percent: int,
+              columns: list[str] | None = None) \
+            -> tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Splits the rows into a training and a test set by a hash of their id,
+        so each customer is always in the same set
+
+        Inputs:
+            * id_col: (string) Column identifying each row
+            * test_percent: (int) Percentage of rows in the test set
+            * columns: (list(string)) Columns to return. Defaults to every
+              column.
+
+        Returns:
+            * train: (pd.DataFrame) Training rows
+            * test: (pd.DataFrame) Test rows
+        """
+        df = self.select(columns if columns is None or id_col in columns
+                         else columns + [id_col])
+        test_mask = pd.util.hash_array(df[id_col].to_numpy()) % 100 \
+            < test_percent
+
+        if columns is not None and id_col not in columns:
+            df = df[columns]
+
+        return df[~test_mask], df[test_mask]
+
+    def _mask(self) -> np.ndarray | None:
+        """
+        Returns:
+            * mask: (np.ndarray or None) Rows that match the filters, or None
+              if there are no filters
+        """
+        mask = None
+        for col, operator, value in self.filters:
+            matches = FILTER_OPERATORS[operator](self.df[col].to_numpy(),
+                                                 value)
+            mask = matches if mask is None else mask & matches
+
+        return mask
+
+    def _columns(self, columns: list[str]) -> list[pd.Series]:
+        """
+        Returns:
+            * series: (list(pd.Series)) The rows of each column that match
+              the filters
+        """
+        mask = self._mask()
+        return [self.df[col] if mask is None else self.df[col][mask]
+                for col in columns]
+
+
+class DuckDBBackend():
+    """
+    The DuckDBBackend runs aggregations as SQL queries over a Parquet or CSV
+    file with DuckDB. Filters, column selection and derived features are
+    pushed into each query, so DuckDB only reads the columns and row groups
+    it needs and streams the file through its multi-threaded engine without
+    loading it into memory.
+
+    Derived features declared for a FeatureBuilder are computed in the query
+    from their SQL expressions and can be used like any other column. Missing
+    values can be replaced as the file is read, in the same way as
+    DataLoader.clean replaces NaNs, so the aggregations match those of the
+    cleaned data in memory.
+
+    Attributes:
+        * self.path: (string)
+        * self.filters: (list(tuple))
+        * self.derived_features: (list(dict) or None)
+        * self.threads: (int or None)
+        * self.fill_values: (dict or None)
+
+    Methods:
+        * where
+        * num_rows
+        * describe
+        * value_counts
+        * label_counts
+        * group_means
+        * box_plot_stats
+        * select
+        * split
+    """
+
+    def __init__(self, path: str, filters: list[tuple] | None = None,
+                 derived_features: list[dict] | None = None,
+                 threads: int | None = None, connection=None,
+                 fill_values: dict | None = None) -> None:
+        """
+        Init function for the DuckDBBackend class
+
+        Inputs:
+            * path: (string) Parquet or CSV file, or a glob of them
+            * filters: (list(tuple)) Filters selecting the rows to use
+            * derived_features: (list(dict)) Optional feature specs, see
+              FeatureBuilder, computed in each query
+            * threads: (int) Number of threads DuckDB uses. Defaults to the
+              number of CPUs.
+            * connection: (duckdb.DuckDBPyConnection) Optional connection to
+              share with other backends over the same data
+            * fill_values: (dict) Optional mapping of numpy dtype kind to the
+              value that replaces missing values in columns of that kind,
+              e.g., data_loader.NAN_FILL_VALUES
+        """
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in LAZY_EXTENSIONS:
+            raise ValueError(f"The DuckDB backend reads files of type "
+                             f"{LAZY_EXTENSIONS} but was given {path}. "
+                             f"Convert the dataset to Parquet or use the "
+                             f"pandas backend.")
+
+        # DuckDB is optional, so only import it when it is used
+        import duckdb
+
+        self.path = path
+        self.filters = [] if filters is None else list(filters)
+        _check_filters(self.filters)
+        self.derived_features = derived_features
+        self.threads = threads
+        self.fill_values = fill_values
+
+        if connection is None:
+            connection = duckdb.connect()
+            if threads is not None:
+                connection.execute(f"SET threads = {int(threads)}")
+        self._connection = connection
+
+        reader = "read_parquet" if extension == ".parquet" else \
+            "read_csv_auto"
+        self._source = f"{reader}({_sql_literal(path)})"
+        if fill_values is not None:
+            self._source = self._filled_source(fill_values)
+
+        self._expressions = {}
+        if derived_features is not None:
+            self._expressions = FeatureBuilder(derived_features) \
+                .sql_expressions()
+
+    def where(self, filters: list[tuple]) -> "DuckDBBackend":
+        """
+        Inputs:
+            * filters: (list(tuple)) Filters to add
+
+        Returns:
+            * backend: (DuckDBBackend) Backend over the rows that also match
+              the filters, sharing this backend's connection
+        """
+        return DuckDBBackend(self.path, self.filters + list(filters),
+                             self.derived_features, self.threads,
+                             self._connection, self.fill_values)
+
+    def num_rows(self) -> int:
+        """
+        Returns:
+            * num_rows: (int) Number of rows that match the filters
+        """
+        return int(self._query("SELECT count(*) FROM customers",
+                               []).iloc[0, 0])
+
+    def describe(self, columns: list[str],
+                 categorical: bool = False) -> pd.DataFrame:
+        """
+        See PandasBackend.describe. The statistics of every column are
+        computed in one query, except for the most frequent category of each
+        column which needs a query of its own.
+        """
+        if categorical:
+            statistics = ["count", "unique", "top", "freq"]
+            aggregates = [f"count({quote_identifier(col)}), "
+                          f"count(DISTINCT {quote_identifier(col)})"
+                          for col in columns]
+        else:
+            statistics = ["count", "mean", "std", "min", "25%", "50%",
+                          "75%", "max"]
+            aggregates = []
+            for col in columns:
+                value = quote_identifier(col)
+                aggregates.append(
+                    f"count({value}), avg({value}), stddev_samp({value}), "
+                    f"min({value}), "
+                    + ", ".join(f"quantile_cont({value}, {quantile})"
+                                for quantile in BOX_PLOT_QUANTILES)
+                    + f", max({value})")
+
+        values = self._query(f"SELECT {', '.join(aggregates)} "
+                             f"FROM customers", columns).iloc[0].to_numpy()
+        num_aggregates = len(values) // len(columns)
+
+        description = {}
+        for idx, col in enumerate(columns):
+            column_values = list(values[idx * num_aggregates:
+                                        (idx + 1) * num_aggregates])
+            if categorical:
+                value = quote_identifier(col)
+                top = self._query(
+                    f"SELECT {value}, count(*) FROM customers "
+                    f"WHERE {value} IS NOT NULL GROUP BY ALL "
+                    f"ORDER BY count(*) DESC LIMIT 1", [col])
+                column_values += list(top.iloc[0]) if len(top) else \
+                    [np.nan, np.nan]
+            description[col] = column_values
+
+        description = pd.DataFrame(description, index=statistics)
+
+        return description if categorical else description.astype(float)
+
+    def value_counts(self, col: str) -> pd.Series:
+        """
+        See PandasBackend.value_counts
+        """
+        counts = self._query(
+            f"SELECT {quote_identifier(col)} AS value, count(*) AS count "
+            f"FROM customers GROUP BY ALL ORDER BY count DESC", [col])
+
+        return counts.set_index("value")["count"].rename_axis(col)
+
+    def label_counts(self, col: str, label_col: str) -> pd.DataFrame:
+        """
+        See PandasBackend.label_counts
+        """
+        counts = self._query(
+            f"SELECT {quote_identifier(col)} AS value, "
+            f"{quote_identifier(label_col)} AS label, count(*) AS count "
+            f"FROM customers GROUP BY ALL", [col, label_col])
+
+        counts = counts.pivot(index="value", columns="label",
+                              values="count").fillna(0).astype(int) \
+            .sort_index()
+        counts.index.name = col
+        counts.columns.name = label_col
+
+        return counts
+
+    def group_means(self, col: str, label_col: str) \
+            -> tuple[float, pd.Series]:
+        """
+        See PandasBackend.group_means
+        """
+        means = self._query(
+            f"SELECT {quote_identifier(label_col)} AS label, "
+            f"avg({quote_identifier(col)}) AS mean, count(*) AS count "
+            f"FROM customers GROUP BY ALL ORDER BY label", [col, label_col])
+
+        all_mean = np.average(means["mean"], weights=means["count"])
+        label_means = means.set_index("label")["mean"].rename_axis(label_col)
+
+        return float(all_mean), label_means
+
+    def box_plot_stats(self, col: str, label_col: str) -> list[dict]:
+        """
+        See PandasBackend.box_plot_stats. The quartiles and whiskers are
+        computed in a single query.
+        """
+        value = quote_identifier(col)
+        label = quote_identifier(label_col)
+        stats = self._query(
+            f"SELECT quartiles.label, any_value(q1) AS q1, "
+            f"any_value(med) AS med, any_value(q3) AS q3, "
+            f"min({value}) AS whislo, max({value}) AS whishi "
+            f"FROM customers JOIN ("
+            f"  SELECT {label} AS label, "
+            f"  quantile_cont({value}, 0.25) AS q1, "
+            f"  quantile_cont({value}, 0.5) AS med, "
+            f"  quantile_cont({value}, 0.75) AS q3 "
+            f"  FROM customers GROUP BY ALL) AS quartiles "
+            f"ON {label} = quartiles.label "
+            f"WHERE {value} BETWEEN q1 - {WHISKER_IQR} * (q3 - q1) "
+            f"AND q3 + {WHISKER_IQR} * (q3 - q1) "
+            f"GROUP BY quartiles.label ORDER BY quartiles.label",
+            [col, label_col])
+
+        return stats.to_dict(orient="records")
+
+    def select(self, columns: list[str] | None = None) -> pd.DataFrame:
+        """
+        See PandasBackend.select. Only the selected columns are read.
+        """
+        if columns is None:
+            return self._query("SELECT * FROM customers", None)
+
+        selection = ", ".join(map(quote_identifier, columns))
+        return self._query(f"SELECT {selection} FROM customers", columns)
+
+    def split(self, id_col: str, test_percent: int,
+              columns: list[str] | None = None) \
+            -> tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        See PandasBackend.split. Each set is extracted by its own query with
+        the split condition pushed down, using DuckDB's hash of the id.
+        The hash differs from pandas', so the sets are stable between runs
+        but not the same as those of a PandasBackend.
+        """
+        test_condition = f"hash({quote_identifier(id_col)}) % 100 < " \
+            f"{int(test_percent)}"
+        selection = "*" if columns is None else \
+            ", ".join(map(quote_identifier, columns))
+        used = None if columns is None else columns + [id_col]
+
+        train = self._query(f"SELECT {selection} FROM customers "
+                            f"WHERE NOT ({test_condition})", used)
+        test = self._query(f"SELECT {selection} FROM customers "
+                           f"WHERE {test_condition}", used)
+
+        return train, test
+
+    def _filled_source(self, fill_values: dict) -> str:
+        """
+        Wraps the file in a query that replaces missing values according to
+        the numpy dtype kind of each column. NaNs in float columns count as
+        missing, as they do in pandas.
+
+        Returns:
+            * source: (string) Subquery reading the file with its missing
+              values replaced
+        """
+        with self._connection.cursor() as cursor:
+            dtypes = cursor.execute(
+                f"SELECT * FROM {self._source} LIMIT 0").df().dtypes
+
+        replacements = []
+        for col, dtype in dtypes.items():
+            if dtype.kind not in fill_values:
+                continue
+
+            value = quote_identifier(col)
+            fill_value = _sql_literal(fill_values[dtype.kind])
+            missing = f"{value} IS NULL OR isnan({value})" \
+                if dtype.kind == "f" else f"{value} IS NULL"
+            replacements.append(f"CASE WHEN {missing} THEN {fill_value} "
+                                f"ELSE {value} END AS {value}")
+
+        if not replacements:
+            return self._source
+
+        return f"(SELECT * REPLACE ({', '.join(replacements)}) " \
+            f"FROM {self._source})"
+
+    def _query(self, sql: str, used_columns: list[str] | None) \
+            -> pd.DataFrame:
+        """
+        Runs a query against a customers relation holding the rows that
+        match the filters. Derived features are only computed when the
+        query or the filters use them.
+
+        Inputs:
+            * sql: (string) Query selecting from customers
+            * used_columns: (list(string) or None) Columns used by the
+              query, or None if it uses every column
+
+        Returns:
+            * result: (pd.DataFrame) The result of the query
+        """
+        used = set(self._expressions) if used_columns is None \
+            else set(used_columns) | {col for col, _, _ in self.filters}
+        features = "".join(f", {expression} AS {quote_identifier(name)}"
+                           for name, expression in self._expressions.items()
+                           if name in used)
+
+        conditions = " AND ".join(
+            f"{quote_identifier(col)} {SQL_FILTER_OPERATORS[operator]} ?"
+            for col, operator, _ in self.filters)
+        where = f"WHERE {conditions}" if conditions else ""
+
+        # The filters can refer to derived features, so they are applied
+        # after the features are computed
+        cte = (f"WITH source AS (SELECT *{features} FROM {self._source}), "
+               f"customers AS (SELECT * FROM source {where}) ")
+
+        # Each query runs on its own cursor, so that backends sharing a
+        # connection can be queried from several threads
+        with self._connection.cursor() as cursor:
+            return cursor.execute(
+                cte + sql, [value for _, _, value in self.filters]).df()
+
+
+# Backends DataLoader.lazy can create
+BACKENDS = {
+    "duckdb": DuckDBBackend,
+}
+
+
+def as_backend(data) -> PandasBackend | DuckDBBackend:
+    """
+    Wraps a dataframe in a PandasBackend, leaving backends unchanged
+
+    Inputs:
+        * data: (pd.DataFrame or backend) The data
+
+    Returns:
+        * backend: (PandasBackend or DuckDBBackend) Backend over the data
+    """
+    if isinstance(data, pd.DataFrame):
+        return PandasBackend(data)
+
+    return data
@@ -0,0 +1,473 @@
+"""
+This module contains the Benchmark class which times each stage of the churn
+pipeline on synthetic customer data of increasing size, along with the
+startup time of each cli.py subcommand. Results are written to JSON and can be
+compared against a stored baseline to flag regressions.
+
+Usage:
+    python benchmark.py --sizes 10000 100000 --output results.json \
+        --baseline baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+from sklearn.model_selection import train_test_split
+
+from data_analysis import DataAnalysis
+from data_loader import DataLoader
+from instrumentation import PeakRSSSampler
+from lexicon_sentiment import (BOOSTER_DECR, BOOSTER_INCR, CASED_WORDS,
+                               NEGATE)
+from model import METADATA_FILE, MachineLearningModel
+from rendering import FigureRenderer
+from sentiment import SentimentEngine, load_analyzer
+from synthetic_data import generate_customer_data, write_customer_data
+
+# Sizes of the synthetic datasets benchmarked by default
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+
+# A stage is flagged as a regression when it is this much slower than the
+# baseline
+DEFAULT_TOLERANCE = 0.2
+
+# Datasets of up to this many rows are written as Excel spreadsheets, like the
+# real dataset. Parsing larger spreadsheets with openpyxl would dominate the
+# run, so larger datasets are written as Parquet.
+EXCEL_BENCHMARK_MAX_ROWS = 100_000
+
+# Location of the command line entry point whose startup is measured
+CLI_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cli.py")
+
+# Subcommands whose startup time is measured. The fastest of STARTUP_REPEATS
+# launches is recorded, as the first launch also pays for a cold disk cache.
+STARTUP_COMMANDS = ["analyze", "train", "score", "bench"]
+STARTUP_REPEATS = 3
+
+# Libraries that are only needed for training or analysis, which loading a
+# saved model for scoring must not import
+SCORING_DEFERRED_MODULES = ["imblearn", "nltk", "matplotlib", "duckdb"]
+
+# Models that need XGBoost to be scored. Any other model must not import it.
+XGBOOST_MODEL_TYPES = ["XGB", "XGBC"]
+
+# Texts exercising each VADER rule that the lexicon sentiment backend must
+# score exactly as VADER does
+PARITY_TEXTS = [
+    "", "The service is good", "The service is not good",
+    "The service isn't good", "The service is never good",
+    "The service is very good", "The service is VERY good",
+    "The service is GOOD", "The service is good!!!", "Is the service good?",
+    "Is the service good???", "The service is kind of good",
+    "The service is sort of bad", "The service is good but the fees are bad",
+    "The fees are bad BUT the service is good", "Never so happy",
+    "This is the least good bank", "At least the app is good",
+    "The app is barely good", "The app is good, the staff are good",
+    "Not bad at all", "Without doubt the best bank", "I don't hate it",
+    "I really, really love it :)", "Terrible terrible terrible",
+    "ok ok OK ok", "It's fine I guess...", "THE WORST BANK EVER",
+]
+
+# Number of seeded random texts, built from lexicon, booster and negation
+# words with capitals and punctuation, that are also scored by both backends
+PARITY_RANDOM_TEXTS = 5_000
+PARITY_PUNCTUATION = ["", ".", "!", "?", ",", "!!", "???", "?!?", "...",
+                      ":)", "'", '"']
+
+# Largest difference between the compound scores of the two backends that
+# counts as agreement. The backends agree to floating point precision.
+PARITY_TOLERANCE = 1e-9
+
+
+class Benchmark():
+    """
+    The Benchmark runs each stage of the pipeline on synthetic datasets and
+    records the wall time, peak resident set size and throughput of every
+    stage.
+
+    Attributes:
+        * self.sizes: (list(int))
+        * self.data_dir: (string)
+        * self.model_type: (string)
+        * self.score_model_dir: (string or None)
+        * self.results: (list(dict))
+
+    Methods:
+        * run
+        * measure_startup
+        * check_scoring_imports
+        * check_sentiment_parity
+        * save
+        * compare_to_baseline
+    """
+
+    def __init__(self, sizes: list[int] | None = None,
+                 data_dir: str = "benchmark_data",
+                 model_type: str = "XGB",
+                 score_model_dir: str | None = None) -> None:
+        """
+        Init function for the Benchmark class
+
+        Inputs:
+            * sizes: (list(int)) Number of customers in each dataset
+            * data_dir: (string) Directory the synthetic datasets are written
+              to and reused from
+            * model_type: (string) Type of MachineLearningModel to train
+            * score_model_dir: (string) Saved model loaded when measuring
+              the startup of the score subcommand. If None, or there is no
+              model saved there, the score subcommand is not measured.
+        """
+        self.sizes = DEFAULT_SIZES if sizes is None else sizes
+        self.data_dir = data_dir
+        self.model_type = model_type
+        self.score_model_dir = score_model_dir
+        self.results = []
+
+    def run(self) -> list[dict]:
+        """
+        Measures the startup of every subcommand and benchmarks every dataset
+        size
+
+        Returns:
+            * results: (list(dict)) One record per size and stage. Startup
+              records have 0 rows.
+        """
+        self.measure_startup()
+
+        for num_rows in self.sizes:
+            self._run_size(num_rows)
+
+        return self.results
+
+    def measure_startup(self, repeats: int = STARTUP_REPEATS) -> None:
+        """
+        Launches each subcommand of cli.py with --startup-only, which exits
+        once the subcommand has imported its modules and, for score, loaded
+        the model. Records the wall time and peak memory of each launch as
+        the stage startup_<subcommand>.
+
+        Inputs:
+            * repeats: (int) Number of launches of each subcommand
+        """
+        for command in STARTUP_COMMANDS:
+            args = [command]
+            if command == "score":
+                if self.score_model_dir is None or not os.path.exists(
+                        os.path.join(self.score_model_dir,
+                                     METADATA_FILE)):
+                    print(f"Skipping startup_score, there is no saved model "
+                          f"in {self.score_model_dir}")
+                    continue
+                # The input is never read when only starting up
+                args += [os.devnull, "--model-dir", self.score_model_dir]
+
+            launches = [self._launch([sys.executable, CLI_PATH,
+                                      "--startup-only", *args])
+                        for _ in range(repeats)]
+            seconds, peak_mb = min(launches)
+            self._record(f"startup_{command}", 0, seconds, peak_mb)
+
+    def check_scoring_imports(self) -> list[str]:
+        """
+        Imports the scoring code in a new process and, when there is a saved
+        model in self.score_model_dir, loads the model. Prints any library of
+        SCORING_DEFERRED_MODULES that this imported, and XGBoost unless the
+        model is one of XGBOOST_MODEL_TYPES.
+
+        Returns:
+            * imported: (list(string)) The deferred libraries that were
+              imported
+        """
+        code = ("import sys, os\n"
+                "import scorer\n"
+                "from model import MachineLearningModel\n"
+                f"deferred = {SCORING_DEFERRED_MODULES + ['xgboost']!r}\n"
+                f"model_dir = {self.score_model_dir!r}\n"
+                "if model_dir is not None and os.path.exists(os.path.join("
+                f"model_dir, {METADATA_FILE!r})):\n"
+                "    model = MachineLearningModel.load(model_dir)\n"
+                f"    if model.model_type in {XGBOOST_MODEL_TYPES!r}:\n"
+                "        deferred.remove('xgboost')\n"
+                "print(' '.join(name for name in deferred"
+                " if name in sys.modules))\n")
+        output = subprocess.run(
+            [sys.executable, "-c", code], check=True, capture_output=True,
+            text=True, cwd=os.path.dirname(CLI_PATH)).stdout
+        imported = output.split()
+
+        if imported:
+            print(f"REGRESSION scoring imports {', '.join(imported)}")
+
+        return imported
+
+    def check_sentiment_parity(self, num_random_texts: int =
+                               PARITY_RANDOM_TEXTS) -> list[str]:
+        """
+        Scores a fixed set of texts with the "vader" and "lexicon" sentiment
+        backends and prints every text on which they disagree. The texts are
+        PARITY_TEXTS, the feedback of the synthetic customers and seeded
+        random texts. Random texts containing one of VADER's special case
+        idioms, e.g., "the bomb", are left out, as the lexicon backend does
+        not apply them.
+
+        Inputs:
+            * num_random_texts: (int) Number of random texts to generate
+
+        Returns:
+            * disagreements: (list(string)) Texts whose compound scores
+              differ by more than PARITY_TOLERANCE or whose buckets differ
+        """
+        with SentimentEngine(n_workers=1) as vader_engine, \
+                SentimentEngine(backend="lexicon") as lexicon_engine:
+            # NLTK has been imported by the vader engine
+            from nltk.sentiment.vader import VaderConstants
+
+            idioms = list(VaderConstants.SPECIAL_CASE_IDIOMS)
+            rng = np.random.default_rng(42)
+            words = np.concatenate([
+                rng.choice(sorted(load_analyzer().lexicon), 400),
+                sorted(NEGATE | BOOSTER_INCR | BOOSTER_DECR),
+                CASED_WORDS, ["least", "at", "very", "but", "BUT"]])
+
+            random_texts = []
+            for num_words in rng.integers(1, 25, num_random_texts):
+                text_words = rng.choice(words, num_words)
+                capitals = rng.random(num_words) < 0.1
+                text_words[capitals] = np.char.upper(text_words[capitals])
+                punctuation = np.array(PARITY_PUNCTUATION)[rng.integers(
+                    0, len(PARITY_PUNCTUATION), num_words)]
+                text = " ".join(np.char.add(text_words, punctuation))
+                if not any(idiom in text.lower() for idiom in idioms):
+                    random_texts.append(text)
+
+            feedback = generate_customer_data(len(random_texts))[
+                "CustomerFeedback"].dropna().tolist()
+            texts = np.array(PARITY_TEXTS + feedback + random_texts,
+                             dtype=object)
+
+            vader_scores = vader_engine.score(texts)
+            lexicon_scores = lexicon_engine.score(texts)
+
+        disagree = (np.abs(vader_scores - lexicon_scores) > PARITY_TOLERANCE) \
+            | (SentimentEngine.to_buckets(vader_scores)
+               != SentimentEngine.to_buckets(lexicon_scores))
+        disagreements = texts[disagree].tolist()
+
+        print(f"Lexicon sentiment agrees with VADER on "
+              f"{len(texts) - len(disagreements)} of {len(texts)} texts")
+        if disagreements:
+            print(f"REGRESSION lexicon sentiment disagrees with VADER on "
+                  f"{len(disagreements)} texts, e.g.:")
+            for idx in np.flatnonzero(disagree)[:5]:
+                print(f"    {texts[idx]!r}: vader {vader_scores[idx]:.4f}, "
+                      f"lexicon {lexicon_scores[idx]:.4f}")
+
+        return disagreements
+
+    def save(self, path: str) -> None:
+        """
+        Writes the results and details of the machine to JSON
+
+        Inputs:
+            * path: (string) File to write
+        """
+        report = {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "results": self.results,
+        }
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+
+    def compare_to_baseline(self, baseline_path: str,
+                            tolerance: float = DEFAULT_TOLERANCE) \
+            -> list[dict]:
+        """
+        Compares the wall time of each stage against a baseline written by
+        save and prints every stage that is more than tolerance slower
+
+        Inputs:
+            * baseline_path: (string) Baseline results file
+            * tolerance: (float) Allowed slowdown, e.g., 0.2 for 20%
+
+        Returns:
+            * regressions: (list(dict)) The stages that regressed
+        """
+        with open(baseline_path, encoding="utf-8") as file:
+            baseline = {(record["rows"], record["stage"]): record
+                        for record in json.load(file)["results"]}
+
+        regressions = []
+        for record in self.results:
+            baseline_record = baseline.get((record["rows"], record["stage"]))
+            if baseline_record is None:
+                continue
+
+            slowdown = record["seconds"] / baseline_record["seconds"] - 1
+            if slowdown > tolerance:
+                regressions.append({**record, "baseline_seconds":
+                                    baseline_record["seconds"],
+                                    "slowdown": slowdown})
+                print(f"REGRESSION {record['stage']} ({record['rows']} rows):"
+                      f" {baseline_record['seconds']:.3f}s -> "
+                      f"{record['seconds']:.3f}s (+{slowdown:.0%})")
+
+        return regressions
+
+    def _time_stage(self, stage: str, num_rows: int, func, *args):
+        """
+        Runs one stage and records its wall time, peak memory and throughput
+
+        Returns:
+            * result: The value returned by the stage
+        """
+        with PeakRSSSampler() as sampler:
+            start_time = time.perf_counter()
+            result = func(*args)
+            seconds = time.perf_counter() - start_time
+
+        self._record(stage, num_rows, seconds, sampler.peak_mb)
+
+        return result
+
+    def _record(self, stage: str, num_rows: int, seconds: float,
+                peak_mb: float) -> None:
+        """
+        Adds a result and prints it
+        """
+        self.results.append({
+            "rows": num_rows,
+            "stage": stage,
+            "seconds": seconds,
+            "peak_rss_mb": peak_mb,
+            "rows_per_second": num_rows / seconds if seconds > 0 else None,
+        })
+        print(f"{stage:<30} {num_rows:>10} rows {seconds:>9.3f}s "
+              f"{peak_mb:>9.0f} MB")
+
+    @staticmethod
+    def _launch(command: list[str]) -> tuple[float, float]:
+        """
+        Runs a command in a new process and waits for it to exit
+
+        Returns:
+            * seconds: (float) Wall time from launch to exit
+            * peak_mb: (float) Peak resident set size of the process in MB
+        """
+        start_time = time.perf_counter()
+        process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+        # wait4 gives the resource usage of this process alone
+        _, status, usage = os.wait4(process.pid, 0)
+        seconds = time.perf_counter() - start_time
+        process.returncode = os.waitstatus_to_exitcode(status)
+
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, command)
+
+        return seconds, usage.ru_maxrss / 1024
+
+    def _run_size(self, num_rows: int) -> None:
+        """
+        Benchmarks every stage on a dataset of the given size
+        """
+        extension = ".xlsx" if num_rows <= EXCEL_BENCHMARK_MAX_ROWS \
+            else ".parquet"
+        dataset_path = write_customer_data(
+            os.path.join(self.data_dir, f"customers_{num_rows}{extension}"),
+            num_rows)
+
+        dataloader = DataLoader(dataset_path)
+        customer_data = self._time_stage("load_and_clean", num_rows,
+                                         dataloader.load_and_clean)
+
+        # Figures are rendered headlessly and not saved
+        data_analysis = DataAnalysis(FigureRenderer(headless=True))
+        self._time_stage("compare_mean_against_exited", num_rows,
+                         data_analysis.compare_mean_against_exited,
+                         customer_data, 'Age')
+        self._time_stage("compare_label_against_col", num_rows,
+                         lambda: data_analysis.compare_label_against_col(
+                             customer_data, 'Tenure', plot=False))
+        splits = {
+            'Stayed': customer_data.loc[customer_data['Exited'] == 0],
+            'Exited': customer_data.loc[customer_data['Exited'] == 1]
+        }
+        self._time_stage("compare_splits_against_col", num_rows,
+                         data_analysis.compare_splits_against_col, splits,
+                         'Tenure', "Tenure", "tenure.png")
+        self._time_stage("group_box_plot", num_rows,
+                         data_analysis.group_box_plot, customer_data,
+                         ['CreditScore', 'Age', 'Tenure', 'Balance (EUR)',
+                          'EstimatedSalary'], 2)
+
+        encoded_data = self._time_stage("apply_label_encoding", num_rows,
+                                        dataloader.apply_label_encoding,
+                                        customer_data, ['Country', 'Gender'])
+        # The lexicon backend scores a copy, as apply_sentiment_analysis
+        # overwrites the feedback column
+        lexicon_loader = DataLoader(dataset_path, sentiment_backend="lexicon")
+        self._time_stage("apply_sentiment_lexicon", num_rows,
+                         lexicon_loader.apply_sentiment_analysis,
+                         encoded_data.copy(), 'CustomerFeedback')
+        sentiment_data = self._time_stage("apply_sentiment_analysis",
+                                          num_rows,
+                                          dataloader.apply_sentiment_analysis,
+                                          encoded_data, 'CustomerFeedback')
+
+        reduced_data = sentiment_data.drop(
+            columns=['RowNumber', 'CustomerId', 'Surname'])
+        x_train, x_test, y_train, y_test = train_test_split(
+            reduced_data.drop(columns=['Exited']), reduced_data['Exited'],
+            test_size=0.3, random_state=42)
+
+        model = MachineLearningModel(x_train, x_test, y_train, y_test,
+                                     self.model_type,
+                                     FigureRenderer(headless=True))
+        self._time_stage("fit_and_predict", num_rows, model.fit_and_predict)
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Runs the benchmark from the command line
+
+    Returns:
+        * exit_code: (int) 1 if any stage regressed against the baseline,
+          loading a model for scoring imported a deferred library or the
+          lexicon sentiment backend disagreed with VADER
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="*", default=DEFAULT_SIZES,
+                        help="Pass no sizes to only measure startup")
+    parser.add_argument("--data-dir", default="benchmark_data")
+    parser.add_argument("--model-type", default="XGB")
+    parser.add_argument("--score-model-dir",
+                        default=os.path.join("models", "XGB"))
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    benchmark = Benchmark(args.sizes, args.data_dir, args.model_type,
+                          args.score_model_dir)
+    benchmark.run()
+    benchmark.save(args.output)
+
+    exit_code = 1 if benchmark.check_scoring_imports() else 0
+    if benchmark.check_sentiment_parity():
+        exit_code = 1
+    if args.baseline is not None and \
+            benchmark.compare_to_baseline(args.baseline, args.tolerance):
+        exit_code = 1
+
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,271 @@
+"""
+Command line entry point for the churn workflow. Each subcommand imports only
+the modules its own code path needs, so that, e.g., scoring new customers
+does not import the plotting or resampling libraries.
+
+Usage:
+    python cli.py analyze --dataset customer_data.xlsx --headless
+    python cli.py train --dataset customer_data.xlsx --model-type XGB
+    python cli.py compare --dataset customer_data.xlsx --ensemble
+    python cli.py score new_customers.csv --model-dir models/XGB \
+        --output scores.csv
+    python cli.py bench --sizes 10000 --output results.json
+
+Passing --startup-only before the subcommand exits once the subcommand is
+ready to run, which is how benchmark.py measures the startup time of each
+subcommand.
+"""
+import argparse
+import os
+import sys
+import time
+
+# Nodes of main.py's pipeline run by the analyze and train subcommands
+ANALYSIS_NODES = ["describe", "distributions", "breakdowns"]
+TRAINING_NODES = ["evaluate", "report"]
+
+# Number of customers read and scored at a time by the score subcommand
+SCORE_CHUNK_ROWS = 100_000
+
+
+def configure_main(args: argparse.Namespace):
+    """
+    Imports main.py and overrides its configuration with the command line
+    arguments
+
+    Returns:
+        * workflow: (module) The configured main module
+    """
+    import main as workflow
+
+    workflow.DATASET_PATH = args.dataset
+    workflow.CACHE_DIR = args.cache_dir
+    workflow.HEADLESS = args.headless
+    workflow.SENTIMENT_BACKEND = args.sentiment_backend
+    if args.trace_file is not None:
+        workflow.TRACER.enable()
+
+    return workflow
+
+
+def run_pipeline(workflow, args: argparse.Namespace,
+                 targets: list[str]) -> None:
+    """
+    Runs the given nodes of main.py's pipeline and writes the trace, if one
+    was requested
+    """
+    figure_renderer = workflow.create_renderer()
+    try:
+        workflow.build_pipeline(figure_renderer).run(targets)
+    finally:
+        figure_renderer.close()
+
+    if args.trace_file is not None:
+        workflow.TRACER.export_chrome_trace(args.trace_file)
+
+
+def analyze(args: argparse.Namespace) -> int:
+    """
+    Describes the customer data and draws the analysis figures
+    """
+    workflow = configure_main(args)
+    workflow.ANALYSIS_BACKEND = args.backend
+    if args.startup_only:
+        return 0
+
+    run_pipeline(workflow, args, ANALYSIS_NODES)
+
+    return 0
+
+
+def train(args: argparse.Namespace) -> int:
+    """
+    Trains, evaluates and saves a model, or updates the saved model from the
+    new and changed customers
+    """
+    workflow = configure_main(args)
+    workflow.MODEL_DIR = args.model_dir
+    workflow.MODEL_TYPE = args.model_type
+    workflow.RESAMPLING_STRATEGY = args.resampling
+    if args.startup_only:
+        return 0
+
+    if args.incremental:
+        workflow.update_model_incrementally()
+        if args.trace_file is not None:
+            workflow.TRACER.export_chrome_trace(args.trace_file)
+    else:
+        run_pipeline(workflow, args, TRAINING_NODES)
+
+    return 0
+
+
+def compare(args: argparse.Namespace) -> int:
+    """
+    Trains the configurations in main.COMPARISON_CONFIGS side by side and
+    writes the comparison table
+    """
+    workflow = configure_main(args)
+    workflow.COMPARE_MODELS = True
+    workflow.COMPARISON_ENSEMBLE = args.ensemble
+    workflow.COMPARISON_FILE = args.output
+    if args.startup_only:
+        return 0
+
+    run_pipeline(workflow, args, ["compare"])
+
+    return 0
+
+
+def score(args: argparse.Namespace) -> int:
+    """
+    Scores every customer in a dataset with a saved model and writes the
+    probability that each customer exits to CSV. The dataset is streamed so
+    only one chunk is held in memory at a time.
+    """
+    from data_loader import DataLoader
+    from scorer import DECISION_THRESHOLD, Scorer
+
+    scorer = Scorer(args.model_dir, args.lexicon_path)
+    if args.startup_only:
+        return 0
+
+    start_time = time.perf_counter()
+    num_rows = num_exited = 0
+
+    # Write to a temporary file first so a reader never sees partial scores
+    tmp_path = f"{args.output}.{os.getpid()}.tmp"
+    with scorer, open(tmp_path, "w", encoding="utf-8", newline="") as file:
+        dataloader = DataLoader(args.input)
+        for chunk in dataloader.iter_clean(args.chunk_rows):
+            y_proba = scorer.score(chunk)
+
+            scores = chunk[[args.id_col]] if args.id_col in chunk \
+                else chunk.iloc[:, :0]
+            scores = scores.assign(ExitProbability=y_proba,
+                                   Exited=(y_proba > DECISION_THRESHOLD)
+                                   .astype(int))
+            scores.to_csv(file, header=num_rows == 0, index=False)
+
+            num_rows += len(chunk)
+            num_exited += int(scores["Exited"].sum())
+    os.replace(tmp_path, args.output)
+
+    seconds = time.perf_counter() - start_time
+    print(f"Scored {num_rows} customers in {seconds:.2f}s "
+          f"({num_rows / max(seconds, 1e-9):.0f} rows/s), {num_exited} are "
+          f"predicted to exit. Scores written to {args.output}")
+
+    return 0
+
+
+def bench(args: argparse.Namespace) -> int:
+    """
+    Runs benchmark.py with the remaining arguments
+    """
+    import benchmark
+
+    if args.startup_only:
+        return 0
+
+    return benchmark.main(args.benchmark_args)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Returns:
+        * parser: (argparse.ArgumentParser) Parser of every subcommand
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--startup-only", action="store_true",
+                        help="Exit once the subcommand is ready to run")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    pipeline_parser = argparse.ArgumentParser(add_help=False)
+    pipeline_parser.add_argument("--dataset", default="customer_data.xlsx")
+    pipeline_parser.add_argument("--cache-dir", default=".churn_cache")
+    pipeline_parser.add_argument("--headless", action="store_true",
+                                 help="Save figures without showing them")
+    pipeline_parser.add_argument("--trace-file")
+    pipeline_parser.add_argument("--sentiment-backend", default="vader",
+                                 choices=["vader", "lexicon"])
+
+    analyze_parser = subparsers.add_parser(
+        "analyze", parents=[pipeline_parser],
+        help="Describe the data and draw the analysis figures")
+    analyze_parser.add_argument("--backend", default="pandas",
+                                choices=["pandas", "duckdb"])
+    analyze_parser.set_defaults(func=analyze)
+
+    train_parser = subparsers.add_parser(
+        "train", parents=[pipeline_parser],
+        help="Train, evaluate and save a model")
+    train_parser.add_argument("--model-dir", default="models")
+    train_parser.add_argument("--model-type", default="XGB",
+                              choices=["XGB", "XGBC", "RF"])
+    train_parser.add_argument("--resampling", default="none",
+                              choices=["none", "smote", "undersample",
+                                       "class_weight"])
+    train_parser.add_argument("--incremental", action="store_true",
+                              help="Update the saved model from the new and "
+                                   "changed customers")
+    train_parser.set_defaults(func=train)
+
+    compare_parser = subparsers.add_parser(
+        "compare", parents=[pipeline_parser],
+        help="Train the configurations in main.py side by side and compare "
+             "them")
+    compare_parser.add_argument("--ensemble", action="store_true",
+                                help="Add a soft-voting ensemble of the "
+                                     "configurations")
+    compare_parser.add_argument("--output", default="model_comparison.csv")
+    compare_parser.set_defaults(func=compare)
+
+    score_parser = subparsers.add_parser(
+        "score", help="Score a dataset with a saved model")
+    score_parser.add_argument("input",
+                              help="Excel, CSV or Parquet file to score")
+    score_parser.add_argument("--model-dir",
+                              default=os.path.join("models", "XGB"))
+    score_parser.add_argument("--output", default="scores.csv")
+    score_parser.add_argument("--id-col", default="CustomerId")
+    score_parser.add_argument("--chunk-rows", type=int,
+                              default=SCORE_CHUNK_ROWS)
+    score_parser.add_argument("--lexicon-path")
+    score_parser.set_defaults(func=score)
+
+    # The bench subcommand's arguments are passed on to benchmark.py
+    bench_parser = subparsers.add_parser(
+        "bench", help="Run the benchmark, see benchmark.py", add_help=False)
+    bench_parser.set_defaults(func=bench)
+
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Runs a subcommand from the command line
+
+    Returns:
+        * exit_code: (int) The subcommand's exit code
+    """
+    parser = build_parser()
+    args, extra_args = parser.parse_known_args(argv)
+    if args.command == "bench":
+        args.benchmark_args = extra_args
+    elif extra_args:
+        parser.error(f"unrecognized arguments: {' '.join(extra_args)}")
+
+    if args.command == "analyze" and args.backend != "pandas":
+        from backends import LAZY_EXTENSIONS
+
+        if os.path.splitext(args.dataset)[1].lower() not in LAZY_EXTENSIONS:
+            parser.error(f"the {args.backend} backend reads files of type "
+                         f"{LAZY_EXTENSIONS}, but the dataset is "
+                         f"{args.dataset}")
+
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
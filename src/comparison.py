@@ -0,0 +1,274 @@
+"""
+This module contains the ModelComparison class which trains several
+MachineLearningModel configurations side by side on the same train test split
+and reports their metrics and timings in a single table. The probabilities of
+the compared models can also be averaged into a soft-voting ensemble.
+"""
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from threadpoolctl import threadpool_limits
+
+from evaluation import StreamingMetrics
+from model import MachineLearningModel
+from resampling import Resampler
+
+# Name of the soft-voting ensemble in the comparison table
+ENSEMBLE_NAME = "ENSEMBLE"
+
+# Model types that can be compared and the parameter that sets the number of
+# threads of each
+THREAD_PARAMS = {
+    "RF": "n_jobs",
+    "XGB": "n_jobs",
+    "XGBC": "nthread",
+}
+
+# Metrics of StreamingMetrics.results reported in the comparison table
+METRICS = ("accuracy", "precision", "recall", "f1", "roc_auc", "pr_auc")
+
+# Matrices written once by ModelComparison.run and memory-mapped by workers
+SHARED_MATRICES = ("x_train", "x_test", "y_train", "y_test")
+
+# State shared by every task run in a process, set by _init_worker
+_WORKER_STATE = {}
+
+
+def _init_worker(data_dir: str, feature_names: list[str],
+                 n_threads: int) -> None:
+    """
+    Memory-maps the shared matrices read-only in a worker process and limits
+    the number of threads used by native libraries in the worker
+    """
+    _WORKER_STATE.clear()
+    _WORKER_STATE.update({
+        name: np.load(os.path.join(data_dir, f"{name}.npy"), mmap_mode="r")
+        for name in SHARED_MATRICES
+    })
+    _WORKER_STATE.update({
+        "feature_names": feature_names,
+        "n_threads": n_threads,
+        "thread_limits": threadpool_limits(limits=n_threads),
+    })
+
+
+def _feature_frame(name: str, columns: list[str]) -> pd.DataFrame:
+    """
+    Wraps a shared feature matrix in a dataframe. The full matrix is wrapped
+    without a copy, while a subset of the columns is copied.
+    """
+    matrix = _WORKER_STATE[name]
+    feature_names = _WORKER_STATE["feature_names"]
+    if columns != feature_names:
+        matrix = matrix[:, [feature_names.index(col) for col in columns]]
+
+    return pd.DataFrame(matrix, columns=columns, copy=False)
+
+
+def _train_config(config: dict) -> dict:
+    """
+    Trains one configuration on the shared training data and predicts the
+    probabilities of the shared test data
+
+    Returns:
+        * result: (dict) The configuration's name, timings, peak memory and
+          test probabilities
+    """
+    columns = [col for col in _WORKER_STATE["feature_names"]
+               if col not in config.get("drop_features", [])]
+    thread_param = THREAD_PARAMS[config["model_type"]]
+    params = {thread_param: _WORKER_STATE["n_threads"],
+              **config.get("params", {})}
+
+    x_test = _feature_frame("x_test", columns)
+    model = MachineLearningModel(
+        _feature_frame("x_train", columns), x_test,
+        _WORKER_STATE["y_train"], _WORKER_STATE["y_test"],
+        config["model_type"], params=params,
+        early_stopping_rounds=config.get("early_stopping_rounds"),
+        resampler=Resampler(config.get("resampling", "none")))
+    model.fit_and_predict()
+
+    start_time = time.perf_counter()
+    y_proba = model.predict_proba(x_test)
+    predict_seconds = time.perf_counter() - start_time
+
+    return {
+        "name": config["name"],
+        "train_seconds": model.training_report["seconds"],
+        "predict_seconds": predict_seconds,
+        "peak_rss_mb": model.training_report["peak_rss_mb"],
+        "y_proba": y_proba,
+    }
+
+
+class ModelComparison():
+    """
+    The ModelComparison trains a list of MachineLearningModel configurations
+    on one train test split and ranks them by their test metrics. Each
+    configuration is a dict with:
+        * name: (string) Name of the configuration in the table
+        * model_type: (string) "RF", "XGB" or "XGBC"
+        * resampling: (string) Optional Resampler strategy
+        * params: (dict) Optional model parameters
+        * early_stopping_rounds: (int) Optional, for "XGBC"
+        * drop_features: (list(string)) Optional features the configuration
+          is trained without, e.g., the sentiment columns
+        * weight: (float) Optional weight of the configuration's
+          probabilities in the ensemble. Defaults to 1.
+
+    The features are converted to float32 once and written to .npy files
+    that every worker process memory-maps read-only, so the configurations
+    share one copy of the data rather than one copy per worker. Only
+    configurations that drop features copy the remaining columns. Each
+    worker limits native libraries to threads_per_worker threads so that
+    the pool does not oversubscribe the CPU.
+
+    Every configuration is trained in a worker process of its own, so that
+    its peak memory does not include memory held by the caller or by a
+    configuration trained before it. Workers are forked from a server that
+    has already imported this module and the main module, so starting one
+    is cheap. As with any non-fork start method, the main module must guard
+    its entry point with if __name__ == "__main__".
+
+    Attributes:
+        * self.configs: (list(dict))
+        * self.ensemble: (bool)
+        * self.threshold: (float)
+        * self.n_workers: (int)
+        * self.threads_per_worker: (int)
+        * self.results: (pd.DataFrame or None)
+        * self.probabilities: (dict or None)
+
+    Methods:
+        * run
+        * save
+    """
+
+    def __init__(self, configs: list[dict], ensemble: bool = False,
+                 threshold: float = 0.5, n_workers: int | None = None,
+                 threads_per_worker: int = 1) -> None:
+        """
+        Init function for the ModelComparison class
+
+        Inputs:
+            * configs: (list(dict)) Configurations to compare
+            * ensemble: (bool) If True then the probabilities of every
+              configuration are averaged, weighted by their weight, into a
+              soft-voting ensemble that is added to the table
+            * threshold: (float) Probabilities above the threshold are
+              predicted as exited
+            * n_workers: (int) Number of configurations trained at a time.
+              Defaults to the number of CPUs divided by threads_per_worker,
+              and at most the number of configurations.
+            * threads_per_worker: (int) Number of threads used by each worker
+        """
+        names = [config["name"] for config in configs]
+        if len(set(names)) != len(names) or ENSEMBLE_NAME in names:
+            raise ValueError(f"Configuration names must be unique and not "
+                             f"{ENSEMBLE_NAME}")
+        for config in configs:
+            if config["model_type"] not in THREAD_PARAMS:
+                raise ValueError(f"Unknown model type "
+                                 f"{config['model_type']} in "
+                                 f"{config['name']}. The model type must be "
+                                 f"one of {list(THREAD_PARAMS)}")
+
+        self.configs = configs
+        self.ensemble = ensemble
+        self.threshold = threshold
+        self.threads_per_worker = threads_per_worker
+        self.n_workers = min(len(configs), n_workers or max(
+            1, (os.cpu_count() or 1) // threads_per_worker))
+
+        self.results = None
+        self.probabilities = None
+
+    def run(self, x_train: pd.DataFrame, x_test: pd.DataFrame,
+            y_train: pd.Series, y_test: pd.Series) -> pd.DataFrame:
+        """
+        Trains every configuration and builds the comparison table
+
+        Inputs:
+            * x_train: (pd.DataFrame) Training features. Every column must be
+              numeric.
+            * x_test: (pd.DataFrame) Test features
+            * y_train: (pd.Series) Training labels
+            * y_test: (pd.Series) Test labels
+
+        Returns:
+            * results: (pd.DataFrame) Metrics on the test data, training and
+              prediction times and peak memory of every configuration, best
+              F1 first. The test probabilities are stored in
+              self.probabilities.
+        """
+        feature_names = list(x_train.columns)
+        matrices = {
+            "x_train": np.ascontiguousarray(x_train, dtype=np.float32),
+            "x_test": np.ascontiguousarray(x_test[feature_names],
+                                           dtype=np.float32),
+            "y_train": np.asarray(y_train, dtype=np.int8),
+            "y_test": np.asarray(y_test, dtype=np.int8),
+        }
+
+        start_time = time.perf_counter()
+        with tempfile.TemporaryDirectory() as data_dir:
+            for name, matrix in matrices.items():
+                np.save(os.path.join(data_dir, f"{name}.npy"), matrix)
+            del matrices["x_train"], matrices["x_test"]
+            init_args = (data_dir, feature_names, self.threads_per_worker)
+
+            context = multiprocessing.get_context("forkserver")
+            context.set_forkserver_preload(["__main__", __name__])
+            with ProcessPoolExecutor(max_workers=self.n_workers,
+                                     mp_context=context,
+                                     initializer=_init_worker,
+                                     initargs=init_args,
+                                     max_tasks_per_child=1) as pool:
+                trained = list(pool.map(_train_config, self.configs))
+        seconds = time.perf_counter() - start_time
+
+        self.probabilities = {result["name"]: result.pop("y_proba")
+                              for result in trained}
+        if self.ensemble:
+            weights = np.array([config.get("weight", 1.0)
+                                for config in self.configs])
+            probabilities = np.stack(list(self.probabilities.values()))
+            self.probabilities[ENSEMBLE_NAME] = \
+                (weights @ probabilities / weights.sum()).astype(np.float32)
+            trained.append({"name": ENSEMBLE_NAME})
+
+        rows = []
+        model_types = {config["name"]: config["model_type"]
+                       for config in self.configs}
+        for result in trained:
+            metrics = StreamingMetrics(self.threshold).update(
+                matrices["y_test"], self.probabilities[result["name"]]) \
+                .results()
+            rows.append({"name": result["name"],
+                         "model_type": model_types.get(result["name"]),
+                         **{metric: metrics[metric] for metric in METRICS},
+                         **result})
+
+        self.results = pd.DataFrame(rows).sort_values(
+            "f1", ascending=False, kind="stable").reset_index(drop=True)
+
+        print(f"Compared {len(self.configs)} configurations in "
+              f"{seconds:.2f}s with {self.n_workers} workers\n")
+        print(f"{self.results.to_string(index=False)}\n")
+
+        return self.results
+
+    def save(self, path: str) -> None:
+        """
+        Writes the comparison table to CSV
+
+        Inputs:
+            * path: (string) File to write
+        """
+        self.results.to_csv(path, index=False)
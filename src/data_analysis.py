@@ -2,24 +2,47 @@
 This module contains the DataAnalysis class which allows a user to create a
 variety of plots based on inputted data. 
 """
-import math
-
-import matplotlib.pyplot as plt
 import pandas as pd
-import seaborn as sns
+
+from backends import DuckDBBackend, PandasBackend, as_backend
+from instrumentation import traced
+from rendering import FigureRenderer, draw_bar_counts, draw_group_box_plot
+
+# Above this number of rows group box plots are drawn from precomputed
+# quantiles rather than from the raw rows
+BOX_PLOT_QUANTILE_ROWS = 100_000
 
 
 class DataAnalysis():
     """
     This class allows a user to create graphical evaluations of input data. 
+    Methods that take a dataframe also accept a backend from
+    DataLoader.lazy, in which case the aggregations run in the backend's
+    query engine and only their results are loaded.
+
+    Attributes:
+        * self.renderer: (FigureRenderer)
 
     Methods:
         * compare_mean_against_exited
-        * compare_ratio_of_exited
+        * compare_splits_against_col
+        * compare_label_against_col
         * group_box_plot
     """
 
-    def compare_mean_against_exited(self, cust_data: pd.DataFrame,
+    def __init__(self, renderer: FigureRenderer | None = None) -> None:
+        """
+        Init function for the DataAnalysis class
+
+        Inputs:
+            * renderer: (FigureRenderer) Renderer used to draw figures. If
+              None then figures are shown interactively and not saved.
+        """
+        self.renderer = renderer if renderer is not None else FigureRenderer()
+
+    @traced("DataAnalysis.compare_mean_against_exited")
+    def compare_mean_against_exited(self,
+                                    cust_data: pd.DataFrame | DuckDBBackend,
                                     col: str) -> tuple[float, float, float]:
         """
         Takes a column name in the database and takes the mean of the value for
@@ -28,8 +51,8 @@ class DataAnalysis():
         categories.
 
         Inputs:     
-            * cust_data: (pd.DataFrame) Dataframe that will be 
-                analysed 
+            * cust_data: (pd.DataFrame or backend) Data that will
+                be analysed
             * col: (string) Column that will be analysed
 
         Returns:
@@ -38,15 +61,12 @@ class DataAnalysis():
             * left_mean: (flaot) The mean value for those that exited
         """
 
-        # Get the data for both those who left and those
-        # who stayed
-        customer_stayed = cust_data.loc[cust_data['Exited'] == 0]
-        customer_exited = cust_data.loc[cust_data['Exited'] == 1]
-
-        # Calculate the means for each of the three output categories
-        all_mean = cust_data[col].mean()
-        stayed_mean = customer_stayed[col].mean()
-        left_mean = customer_exited[col].mean()
+        # Calculate the means for each of the three output categories in one
+        # grouped pass
+        all_mean, label_means = as_backend(cust_data).group_means(col,
+                                                                  'Exited')
+        stayed_mean = label_means.get(0)
+        left_mean = label_means.get(1)
 
         # Output the results:
         print(f"\nColumn: {col}\nAll: {all_mean}\n"
@@ -54,6 +74,7 @@ class DataAnalysis():
 
         return all_mean, stayed_mean, left_mean
 
+    @traced("DataAnalysis.compare_splits_against_col")
     def compare_splits_against_col(self, splits: dict[str: pd.DataFrame],
                                    col: str, title: str, save_name: str) \
             -> pd.DataFrame:
@@ -77,45 +98,118 @@ class DataAnalysis():
         split1 = splits[split_names[0]]
         split2 = splits[split_names[1]]
 
-        # Calculate the number of occurrences for those that left, those that
-        # stayed and both
-        df_combined = pd.DataFrame()
-        df_combined[split_names[0]] = split1[col].value_counts()
-        df_combined[split_names[1]] = split2[col].value_counts()
-        df_combined['All'] = split1[col].value_counts() + \
-            split2[col].value_counts()
+        # Calculate the number of occurrences for those that left and those
+        # that stayed
+        df_combined = pd.concat([split1[col].value_counts(),
+                                 split2[col].value_counts()], axis=1,
+                                keys=split_names).fillna(0).astype(int) \
+            .sort_index()
 
         # Calculate ratio of those that left vs stayed
-        all_row_ratios = []
-        for _, row in df_combined.iterrows():
-            ratio1 = row[split_names[0]]/row['All']
-            ratio2 = row[split_names[1]]/row['All']
-            all_row_ratios.append([ratio1.round(2), ratio2.round(2)])
-
-        ratios_dataframe = pd.DataFrame(all_row_ratios)
+        ratios_dataframe = self._row_ratios(df_combined)
         print(f"Ratios: \n{ratios_dataframe}\n")
 
-        # Remove all data from bar chart
-        df_combined = df_combined.drop(columns="All")
+        self._plot_counts(df_combined, title, save_name)
 
-        # Output the results as a bar chart
-        df_combined.sort_index(inplace=True)
-        ax = df_combined.plot(kind='bar', color=['#00C43C', '#E95238'])
+        return df_combined
 
-        ax.set_title(title)
-        ax.set_ylabel("Num. Customers")
-        # print the result
-        print(df_combined)
+    @traced("DataAnalysis.compare_label_against_col")
+    def compare_label_against_col(self, df: pd.DataFrame | DuckDBBackend,
+                                  col: str, label_col: str = 'Exited',
+                                  label_names: dict | None = None,
+                                  mask: pd.Series | None = None,
+                                  filters: list[tuple] | None = None,
+                                  title: str | None = None,
+                                  save_name: str | None = None,
+                                  plot: bool = True) \
+            -> tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Counts the number of rows for each value of a column against each
+        value of a label column, along with the ratio of each label for every
+        value of the column. Unlike compare_splits_against_col this works
+        from a single dataframe in one grouped pass, so no split copies of the
+        data are made.
 
-        plt.tight_layout()
-        # Commenting out savefig for Docker Container
-        # plt.savefig("Figures/"+save_name)
-        plt.show()
+        Inputs:
+            * df: (pd.DataFrame or backend) Data that will be analysed
+            * col: (string) Column that will be analysed
+            * label_col: (string) Column containing the labels to split by
+            * label_names: (dict) Optional mapping of label value to the name
+              used in the output, e.g., {0: 'Stayed', 1: 'Exited'}
+            * mask: (pd.Series) Optional boolean mask selecting the rows to
+              include. Only supported for dataframes.
+            * filters: (list(tuple)) Optional filters selecting the rows to
+              include, e.g., [("Balance (EUR)", "==", 0)], which are pushed
+              down to the backend
+            * title: (string) Title of the figure
+            * save_name: (string) Name of figure to save
+            * plot: (bool) If False then nothing is printed or plotted and
+              only the numbers are returned
 
-        return df_combined
+        Returns:
+            * counts: (pd.DataFrame) Number of occurrences of each label
+              (columns) for each value of col (rows)
+            * ratios: (pd.DataFrame) The counts as a ratio of each row's total
+        """
+        if label_names is None:
+            label_names = {0: 'Stayed', 1: 'Exited'}
+
+        if mask is not None:
+            if not isinstance(df, pd.DataFrame):
+                raise TypeError("A mask can only be used with a dataframe, "
+                                "use filters instead")
+            data = PandasBackend(df.loc[mask, [col, label_col]])
+        else:
+            data = as_backend(df)
+
+        if filters is not None:
+            data = data.where(filters)
+
+        counts = data.label_counts(col, label_col)
+        counts = counts.rename(columns=label_names)
+        counts.columns.name = None
+
+        ratios = self._row_ratios(counts)
 
-    def group_box_plot(self, df: pd.DataFrame, cols_of_interest: list[str],
-                       num_cols: int):
+        if plot:
+            print(f"Ratios: \n{ratios}\n")
+            self._plot_counts(counts, title, save_name)
+
+        return counts, ratios
+
+    def _row_ratios(self, counts: pd.DataFrame) -> pd.DataFrame:
+        """
+        Divides each row of counts by the row's total
+
+        Inputs:
+            * counts: (pd.DataFrame) Counts for each split
+
+        Returns:
+            * ratios: (pd.DataFrame) Ratios rounded to two decimal places
+        """
+        return counts.div(counts.sum(axis=1), axis=0).round(2)
+
+    def _plot_counts(self, counts: pd.DataFrame, title: str,
+                     save_name: str) -> None:
+        """
+        Outputs the counts for each split as a bar chart
+
+        Inputs:
+            * counts: (pd.DataFrame) Counts for each split
+            * title: (string) Title of the figure
+            * save_name: (string) Name of figure to save
+        """
+        counts = counts.sort_index()
+
+        # print the result
+        print(counts)
+
+        self.renderer.render(draw_bar_counts, counts, title,
+                             save_name=save_name)
+
+    @traced("DataAnalysis.group_box_plot")
+    def group_box_plot(self, df: pd.DataFrame | DuckDBBackend,
+                       cols_of_interest: list[str], num_cols: int):
         """
         Takes a list of column names of interest and a dataframe
         that they are within. A group of boxplots are then made
@@ -123,7 +217,7 @@ class DataAnalysis():
         or not the user has exited from the program. 
 
         Inputs:
-            * df: (pd.DataFrame) Dataframe containing the 
+            * df: (pd.DataFrame or backend) Data containing the
                 cols_of_interest
             * cols_of_interest: (array(String)) An array 
                 containing the column names of interest
@@ -131,29 +225,16 @@ class DataAnalysis():
             * num_cols: (int) The number of columns that
                 will be in the final plot
         """
-        # For number of rows in subplot, divide the number
-        # of columns we are interested in by number of columns
-        # and then round up
-        num_rows = math.ceil(len(cols_of_interest) / num_cols)
-
-        _, axes = plt.subplots(num_rows, num_cols, sharex=True,
-                               figsize=(7, 10))
-
-        row, col = 0, 0
-        for column_name in cols_of_interest:
-
-            sns.boxplot(ax=axes[row, col], x='Exited', y=column_name, data=df,
-                        palette="Greens", hue='Exited', legend=False)
-
-            axes[row, col].set_title(f"{column_name} vs Exited")
-
-            # Move to next column, if last column then
-            # wrap to next row
-            col += 1
-            if col > num_cols-1:
-                col = 0
-                row += 1
-
-        plt.tight_layout()
-        # plt.savefig("Figures/group_box_plot.png")
-        plt.show()
+        backend = as_backend(df)
+
+        # Lazy backends always compute the statistics in their query engine
+        if isinstance(backend, PandasBackend) and \
+                backend.num_rows() <= BOX_PLOT_QUANTILE_ROWS:
+            data = backend.select(cols_of_interest + ['Exited'])
+        else:
+            data = {column_name: backend.box_plot_stats(column_name,
+                                                        'Exited')
+                    for column_name in cols_of_interest}
+
+        self.renderer.render(draw_group_box_plot, data, cols_of_interest,
+                             num_cols, save_name="group_box_plot.png")
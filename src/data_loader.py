@@ -1,15 +1,63 @@
 """
 This module contains the DataLoader class which allows a user to load in and
 clean an excel spreadsheet of data as well as apply sentiment analysis to
-certain classes. 
+certain classes. Cleaned spreadsheets can optionally be cached to disk in the
+Feather columnar format so that later loads memory-map the cache rather than
+re-parsing the spreadsheet, large datasets can be streamed in fixed-size
+chunks and loaded data can be converted to a compact schema.
+
+pyarrow and openpyxl are imported by the methods that use them, so that
+importing the module stays fast for code that only scores new customers.
 """
-import ssl
+import glob
+import hashlib
+import os
+from collections.abc import Iterator
 
-import nltk
 import numpy as np
 import pandas as pd
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
-from sklearn import preprocessing
+
+from backends import BACKENDS
+from encoder import CategoryEncoder
+from instrumentation import traced
+from sentiment import SentimentEngine
+
+# Value used to replace NaNs for each numpy dtype kind. String columns are
+# stored with the object kind.
+NAN_FILL_VALUES = {
+    "O": "",
+    "f": 0.0,
+    "i": 0,
+    "u": 0,
+    "b": False,
+}
+
+# Declared dtype of each column of the customer data. Streamed chunks are cast
+# to these dtypes rather than to those inferred from the first chunk, as a
+# chunk in which a text column is empty reads that column as float64.
+CUSTOMER_DTYPES = {
+    "RowNumber": "int64",
+    "CustomerId": "int64",
+    "Surname": "object",
+    "CreditScore": "int64",
+    "Country": "object",
+    "Gender": "object",
+    "Age": "int64",
+    "Tenure": "int64",
+    "CustomerFeedback": "object",
+    "Balance (EUR)": "float64",
+    "NumberOfProducts": "int64",
+    "HasCreditCard": "int64",
+    "IsActiveMember": "int64",
+    "EstimatedSalary": "float64",
+    "Exited": "int64",
+}
+
+# Free text columns are stored as Arrow backed strings in the compact schema.
+# Other string columns with at most CATEGORY_MAX_UNIQUE unique values are
+# stored as categoricals, and any with more are also treated as free text.
+FREE_TEXT_COLS = ["CustomerFeedback", "Surname"]
+CATEGORY_MAX_UNIQUE = 1_000
 
 
 class DataLoader():
@@ -20,73 +68,427 @@ class DataLoader():
     fields.
 
     Attributes:
-        * self.dataset_dir: (string)
+        * self.dataset_dir: (string or None)
+        * self.cache_dir: (string or None)
+        * self.label_encoder: (CategoryEncoder or None)
+        * self.compact: (bool)
+        * self.memory_report: (dict or None)
+        * self.sentiment_backend: (string)
 
     Methods:
         * load_and_clean
+        * read
+        * clean
+        * iter_clean
+        * lazy
+        * compact_schema
+        * source_key
+        * cache_path
         * apply_label_encoding
         * apply_sentiment_analysis
     """
 
-    def __init__(self, dataset_dir: str) -> None:
+    def __init__(self, dataset_dir: str | None,
+                 cache_dir: str | None = None,
+                 compact: bool = False,
+                 sentiment_backend: str = "vader") -> None:
         """
         Init function for the DataLoader class 
 
         Inputs:
-            * dataset_dir: (string) Directory location for the dataset
+            * dataset_dir: (string) Directory location for the dataset. If
+              None then the DataLoader only cleans and encodes dataframes it
+              is given, e.g., when scoring with a saved model.
+            * cache_dir: (string) Directory in which the cleaned dataset is
+              cached. If None then the spreadsheet is parsed on every load.
+            * compact: (bool) If True then load_and_clean converts the data to
+              the compact schema described in compact_schema
+            * sentiment_backend: (string) Backend of the SentimentEngine
+              created by apply_sentiment_analysis, see SENTIMENT_BACKENDS
         """
         self.dataset_dir = dataset_dir
+        self.cache_dir = cache_dir
+        self.compact = compact
+        self.sentiment_backend = sentiment_backend
+        self.memory_report = None
+        self.label_encoder = None
+        self._sentiment_engine = None
+
+    def _dataset_path(self) -> str:
+        """
+        Returns:
+            * dataset_path: (string) Location of the dataset, checked to be
+              given before the dataset is read
+        """
+        if self.dataset_dir is None:
+            raise ValueError("The DataLoader was created without a dataset, "
+                             "so it can only clean and encode the dataframes "
+                             "it is given")
+
+        return self.dataset_dir
+
+    def source_key(self) -> str:
+        """
+        Identifies the current state of the dataset from its absolute path,
+        modification time and size, so that editing the dataset changes the
+        key.
+
+        Returns:
+            * source_key: (string) Key of the dataset's current state
+        """
+        source_path = os.path.abspath(self._dataset_path())
+        source_stat = os.stat(source_path)
 
+        return f"{source_path}:{source_stat.st_mtime_ns}:{source_stat.st_size}"
+
+    def cache_path(self) -> str:
+        """
+        Builds the location of the cache file for the current state of the
+        dataset. The name is keyed on the absolute path of the spreadsheet as
+        well as its modification time and size, so editing the spreadsheet
+        results in a new cache path.
+
+        Returns:
+            * cache_path: (string) Path of the Feather cache file
+        """
+        source_path = os.path.abspath(self._dataset_path())
+
+        path_key = hashlib.sha1(source_path.encode()).hexdigest()[:12]
+        state_key = hashlib.sha1(
+            self.source_key().encode()).hexdigest()[:12]
+
+        stem = os.path.splitext(os.path.basename(source_path))[0]
+
+        return os.path.join(self.cache_dir,
+                            f"{stem}-{path_key}-{state_key}.feather")
+
+    @traced("DataLoader.load_and_clean")
     def load_and_clean(self) -> pd.DataFrame:
         """
-        Loads an excel spreadsheet from the global excel directory
+        Loads an excel spreadsheet from the global excel directory. If a cache
+        directory has been given then a valid cache is memory-mapped instead,
+        otherwise the spreadsheet is parsed and the cache is rebuilt. Numeric
+        columns without missing values are read-only views of the mapped
+        cache rather than copies.
 
         Returns:
             * clean_dataframe: (pd.DataFrame) Pandas dataframe of the given
               excel spreadsheet that has had all NaN values errors replaced.
         """
-        excel_dataframe = pd.read_excel(self.dataset_dir)
+        if self.cache_dir is None:
+            clean_dataframe = self._read_and_clean()
+        else:
+            cache_path = self.cache_path()
+
+            if os.path.exists(cache_path):
+                import pyarrow.feather as feather
+
+                # Splitting the blocks keeps each numeric column a view of
+                # the mapped file instead of copying the columns into one
+                # block per dtype
+                clean_dataframe = feather.read_table(
+                    cache_path, memory_map=True).to_pandas(
+                        split_blocks=True, self_destruct=True)
+            else:
+                clean_dataframe = self._read_and_clean()
+                self._write_cache(clean_dataframe, cache_path)
+
+        if self.compact:
+            clean_dataframe = self.compact_schema(clean_dataframe)
+
+        return clean_dataframe
+
+    @traced("DataLoader.compact_schema")
+    def compact_schema(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Converts a dataframe to a schema that uses less memory:
+            * Integer columns are downcast to the smallest integer type that
+              holds their values, e.g., flags such as Exited become int8 and
+              CreditScore becomes int16
+            * Free text columns in FREE_TEXT_COLS, e.g., CustomerFeedback,
+              and string columns with more than CATEGORY_MAX_UNIQUE unique
+              values become Arrow backed strings
+            * Other string columns, e.g., Country, become categoricals
+
+        Float columns are left unchanged. The memory usage before and after
+        the conversion is printed and kept in self.memory_report.
+
+        Inputs:
+            * df: (pd.DataFrame) The dataframe to convert
+
+        Returns:
+            * compact_dataframe: (pd.DataFrame) The converted dataframe
+        """
+        memory_before = df.memory_usage(deep=True).sum()
+
+        compact_columns = {}
+        for column in df.columns:
+            values = df[column]
+
+            if values.dtype.kind in "iu":
+                compact_columns[column] = pd.to_numeric(values,
+                                                        downcast="integer")
+            elif values.dtype == object:
+                if column in FREE_TEXT_COLS or \
+                        values.nunique() > CATEGORY_MAX_UNIQUE:
+                    compact_columns[column] = values.astype("string[pyarrow]")
+                else:
+                    compact_columns[column] = values.astype("category")
+            else:
+                compact_columns[column] = values
+
+        compact_dataframe = pd.DataFrame(compact_columns, index=df.index)
+
+        memory_after = compact_dataframe.memory_usage(deep=True).sum()
+        self.memory_report = {
+            "before_bytes": int(memory_before),
+            "after_bytes": int(memory_after),
+        }
+        print(f"Memory usage: {memory_before / 1e6:.2f} MB -> "
+              f"{memory_after / 1e6:.2f} MB\n")
+
+        return compact_dataframe
+
+    def _write_cache(self, df: pd.DataFrame, cache_path: str) -> None:
+        """
+        Writes the cleaned dataframe to the cache, removing any stale caches
+        that were built from an earlier version of the same spreadsheet. The
+        cache is left uncompressed so that it can be memory-mapped.
+
+        Inputs:
+            * df: (pd.DataFrame) The cleaned dataframe
+            * cache_path: (string) Path of the Feather cache file
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # Everything up to the final key identifies the source spreadsheet
+        source_prefix = cache_path.rsplit("-", 1)[0]
+        for stale_path in glob.glob(f"{glob.escape(source_prefix)}-*.feather"):
+            os.remove(stale_path)
+
+        # Write to a temporary file first so a reader never sees a partial
+        # cache
+        import pyarrow.feather as feather
+
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        feather.write_feather(df.reset_index(drop=True), tmp_path,
+                              compression="uncompressed")
+        os.replace(tmp_path, cache_path)
+
+    def _read_and_clean(self) -> pd.DataFrame:
+        """
+        Parses the dataset and replaces all NaN values
+
+        Returns:
+            * clean_dataframe: (pd.DataFrame) Cleaned dataframe
+        """
+        return self.clean(self.read())
+
+    @traced("DataLoader.read")
+    def read(self) -> pd.DataFrame:
+        """
+        Parses the dataset without cleaning it or using the cache. Excel
+        spreadsheets are the default, but CSV and Parquet files are also read
+        as they can hold more rows than a spreadsheet.
 
-        # Replaces all NaN values in an array with empty strings. This is okay
-        # for this use case where the only NaN values are in columns of type
-        # string. However a more robust solution would check the column type
-        # first then replace accordingly.
-        clean_dataframe = excel_dataframe.fillna("")
+        Returns:
+            * raw_dataframe: (pd.DataFrame) The dataset as it was read
+        """
+        dataset_path = self._dataset_path()
+        extension = os.path.splitext(dataset_path)[1].lower()
+        if extension == ".csv":
+            return pd.read_csv(dataset_path)
+        if extension == ".parquet":
+            return pd.read_parquet(dataset_path)
+
+        return pd.read_excel(dataset_path)
+
+    def iter_clean(self, chunk_rows: int = 100_000,
+                   dtypes: dict[str, str] | None = None) \
+            -> Iterator[pd.DataFrame]:
+        """
+        Streams the dataset in chunks of at most chunk_rows rows, cleaning each
+        chunk as it is read so that only one chunk is held in memory at a time.
+        Excel spreadsheets are read with openpyxl in read-only mode, CSV files
+        with the pandas chunked reader and Parquet files by record batch.
+
+        Every chunk is cast to the same dtypes so that chunks can be processed
+        independently or concatenated. Columns of the customer data are cast
+        to CUSTOMER_DTYPES. Any other column takes the dtype it has in the
+        first chunk in which it holds a value, so that a column that is empty
+        in the first chunk does not fix its dtype.
+
+        Inputs:
+            * chunk_rows: (int) Maximum number of rows in each chunk
+            * dtypes: (dict) Optional mapping of column name to dtype, which
+              overrides CUSTOMER_DTYPES
+
+        Returns:
+            * chunk: (Iterator[pd.DataFrame]) Cleaned chunks of the dataset,
+              indexed by their row position in the full dataset
+        """
+        dataset_path = self._dataset_path()
+        extension = os.path.splitext(dataset_path)[1].lower()
+        if extension in (".xlsx", ".xlsm"):
+            raw_chunks = self._iter_excel_chunks(chunk_rows)
+        elif extension == ".csv":
+            raw_chunks = pd.read_csv(dataset_path, chunksize=chunk_rows)
+        elif extension == ".parquet":
+            import pyarrow.parquet as pq
+
+            raw_chunks = (batch.to_pandas() for batch in
+                          pq.ParquetFile(dataset_path).iter_batches(
+                              batch_size=chunk_rows))
+        else:
+            raise ValueError(f"Cannot stream files of type {extension}")
+
+        dtypes = {**CUSTOMER_DTYPES, **({} if dtypes is None else dtypes)}
+
+        row_offset = 0
+        for raw_chunk in raw_chunks:
+            chunk = self.clean(raw_chunk, dtypes)
+            for column, has_value in raw_chunk.notna().any().items():
+                if column not in dtypes and has_value:
+                    dtypes[column] = chunk[column].dtype
+
+            chunk.index = pd.RangeIndex(row_offset, row_offset + len(chunk))
+            row_offset += len(chunk)
+
+            yield chunk
+
+    def lazy(self, backend: str = "duckdb",
+             derived_features: list[dict] | None = None, **kwargs):
+        """
+        Opens the dataset as a lazy backend that DataAnalysis can aggregate
+        without loading the dataset into memory. Only Parquet and CSV
+        datasets can be opened lazily. Missing values are replaced as the
+        file is read, with the same NAN_FILL_VALUES as clean.
+
+        Inputs:
+            * backend: (string) Name of the backend in backends.BACKENDS
+            * derived_features: (list(dict)) Optional feature specs, see
+              FeatureBuilder, that the backend computes on the fly
+            * kwargs: Further arguments of the backend, e.g., threads
+
+        Returns:
+            * backend: (DuckDBBackend) The lazy backend
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend}. The backend must "
+                             f"be one of {list(BACKENDS)}")
+
+        return BACKENDS[backend](self._dataset_path(),
+                                 derived_features=derived_features,
+                                 fill_values=NAN_FILL_VALUES, **kwargs)
+
+    def _iter_excel_chunks(self, chunk_rows: int) -> Iterator[pd.DataFrame]:
+        """
+        Reads the first worksheet of the excel spreadsheet row by row, grouping
+        rows into dataframes of at most chunk_rows rows. The first row is used
+        as the header.
+
+        Inputs:
+            * chunk_rows: (int) Maximum number of rows in each chunk
+
+        Returns:
+            * chunk: (Iterator[pd.DataFrame]) Uncleaned chunks of the sheet
+        """
+        import openpyxl
+
+        workbook = openpyxl.load_workbook(self._dataset_path(),
+                                          read_only=True, data_only=True)
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+
+            buffer = []
+            for row in rows:
+                buffer.append(row)
+                if len(buffer) == chunk_rows:
+                    yield pd.DataFrame.from_records(buffer, columns=header)
+                    buffer = []
+
+            if buffer:
+                yield pd.DataFrame.from_records(buffer, columns=header)
+        finally:
+            workbook.close()
+
+    @traced("DataLoader.clean")
+    def clean(self, df: pd.DataFrame,
+              dtypes: dict[str, str] | None = None) -> pd.DataFrame:
+        """
+        Replaces NaN values according to the type of each column, using the
+        values in NAN_FILL_VALUES, e.g., empty strings for string columns and
+        zeros for numerical columns. Only columns that contain NaN values are
+        filled.
+
+        Inputs:
+            * df: (pd.DataFrame) The dataframe to clean
+            * dtypes: (dict) Optional mapping of column name to the dtype the
+              column should be cast to after cleaning
+
+        Returns:
+            * clean_dataframe: (pd.DataFrame) Dataframe without NaN values
+        """
+        fill_values = {}
+        for column, has_nan in df.isna().any().items():
+            if not has_nan:
+                continue
+
+            # Fill using the kind of the target dtype where one is given, as
+            # an integer column containing NaNs is read in as floats
+            if dtypes is not None and column in dtypes:
+                kind = np.dtype(dtypes[column]).kind
+            else:
+                kind = df[column].dtype.kind
+            fill_values[column] = NAN_FILL_VALUES.get(kind, "")
+
+        clean_dataframe = df.fillna(fill_values) if fill_values else df
+
+        if dtypes is not None:
+            clean_dataframe = clean_dataframe.astype(
+                {column: dtype for column, dtype in dtypes.items()
+                 if column in clean_dataframe.columns})
 
         return clean_dataframe
 
+    @traced("DataLoader.apply_label_encoding")
     def apply_label_encoding(self, df: pd.DataFrame,
-                             cols_to_apply: list[str]) -> pd.DataFrame:
+                             cols_to_apply: list[str],
+                             encoder: CategoryEncoder | None = None) \
+            -> pd.DataFrame:
         """
         Takes a dataframe and a list of column headers that should be encoded
         from their string values to integers, e.g., ["France", "Germany"]
-        becomes [0,  1]
+        becomes [0,  1]. If no fitted encoder is given then a new one is
+        fitted on the dataframe and kept in self.label_encoder so that it can
+        be saved and reused to encode new data with the same codes.
 
         Inputs:
             * df: (pd.DataFrame) The dataframe containing the data
             * cols_to_apply: (list(string)) The columns to apply label encoding
               to
+            * encoder: (CategoryEncoder) Optional previously fitted encoder.
+              Values it has not seen are encoded as UNKNOWN_CODE.
 
         Returns:
             * df: (pd.DataFrame) The original dataframe but the columns
               contained in the cols_to_apply input have been converted from
               strings to integer encodings
         """
-        encoder = preprocessing.LabelEncoder()
-
-        # Create a dataframe that just contains the columns of interest
-        cols_of_interest = df[cols_to_apply]
-
-        # Apply label encoding
-        cols_of_interest = cols_of_interest.apply(encoder.fit_transform)
+        if encoder is None:
+            encoder = CategoryEncoder().fit(df, cols_to_apply)
 
-        # Merge the updated columns of interest back to the original dataset
-        df[cols_to_apply] = cols_of_interest
+        self.label_encoder = encoder
 
-        return df
+        return encoder.transform(df, cols_to_apply)
 
-    def apply_sentiment_analysis(self, df: pd.DataFrame,
-                                 col_name: str) -> tuple[pd.DataFrame, str]:
+    @traced("DataLoader.apply_sentiment_analysis")
+    def apply_sentiment_analysis(self, df: pd.DataFrame, col_name: str,
+                                 engine: SentimentEngine | None = None) \
+            -> pd.DataFrame:
         """
         Applies a VADER sentiment analyser to the given column. The compound
         score reported by VADER is interpreted as:
@@ -94,50 +496,32 @@ class DataLoader():
             * 0.05 < && < 0.05 = Review is neutral
             * < 0.05 = Review is negative
 
+        The compound score itself is kept in a new float column named
+        col_name + "Compound".
+
         Inputs:
             * df: (pd.DataFrame) The dataframe containing the data
             * col_name: (string) Column which sentiment analysis will be applied
               to. 
+            * engine: (SentimentEngine) Engine used to score the column. If
+              None then an engine with the default settings and
+              self.sentiment_backend is created on first use and reused for
+              later calls.
 
         Returns:
             * df: (pd.DataFrame) The same dataframe that was passed into the
               model but the col_name column has had sentiment analysis applied.
         """
-        # Download the Vader Lexicon
-        try:
-            _create_unverified_https_context = ssl._create_unverified_context
-        except AttributeError:
-            pass
-        else:
-            ssl._create_default_https_context = _create_unverified_https_context
-
-        nltk.download('vader_lexicon')
-
-        # Create VADER sentiment analyser
-        analyzer = SentimentIntensityAnalyzer()
-
-        # Extract column to apply sentiment analysis to
-        col_to_apply = df[col_name].to_numpy()
-
-        sentiments = np.zeros(len(col_to_apply))
-
-        # Apply sentiment analysis to each entry in the columns
-        for idx, text in enumerate(col_to_apply):
-            # Get the compound score and sort the combined
-            # probability into one of three columns
-            compound_score = analyzer.polarity_scores(text[0])["compound"]
-
-            if compound_score > 0.05:
-                sentiments[idx] = 1
-            elif compound_score < -0.05:
-                sentiments[idx] = -1
-            else:
-                sentiments[idx] = 0
+        if engine is None:
+            if self._sentiment_engine is None:
+                self._sentiment_engine = SentimentEngine(
+                    backend=self.sentiment_backend)
+            engine = self._sentiment_engine
 
-        # Change to format of Pandas DataFrame and overwrite original customer
-        # feedback
-        sentiments = np.transpose([sentiments])
+        compound_scores = engine.score(df[col_name])
 
-        df[col_name] = sentiments
+        # Overwrite the original customer feedback with its sentiment bucket
+        df[col_name] = engine.to_buckets(compound_scores)
+        df[f"{col_name}Compound"] = compound_scores.astype(np.float32)
 
         return df
@@ -0,0 +1,147 @@
+"""
+This module contains the CategoryEncoder class which converts string columns
+into integer codes using a mapping that is fitted once and can be saved and
+reloaded, so that new data is always encoded with the same codes.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+# Code given to any value that was not seen when the encoder was fitted. This
+# is the code pandas gives to values outside of a Categorical's categories.
+UNKNOWN_CODE = -1
+
+
+class CategoryEncoder():
+    """
+    The CategoryEncoder stores the sorted categories of each fitted column.
+    A category is encoded as its position in that list, which matches the
+    codes produced by sklearn's LabelEncoder, e.g., ["France", "Germany"]
+    becomes [0, 1]. Values that were not seen during fitting are encoded as
+    UNKNOWN_CODE.
+
+    Attributes:
+        * self.categories: (dict) Mapping of column name to its categories
+
+    Methods:
+        * fit
+        * transform
+        * fit_transform
+        * to_dict
+        * from_dict
+        * save
+        * load
+    """
+
+    def __init__(self, categories: dict[str, list] | None = None) -> None:
+        """
+        Init function for the CategoryEncoder class
+
+        Inputs:
+            * categories: (dict) Optional mapping of column name to its list
+              of categories, e.g., from a previously fitted encoder
+        """
+        self.categories = {} if categories is None else \
+            {col: list(cats) for col, cats in categories.items()}
+
+    def fit(self, df: pd.DataFrame, cols: list[str]) -> "CategoryEncoder":
+        """
+        Learns the sorted unique values of each column
+
+        Inputs:
+            * df: (pd.DataFrame) The dataframe containing the data
+            * cols: (list(string)) The columns to fit
+
+        Returns:
+            * self: (CategoryEncoder) The fitted encoder
+        """
+        for col in cols:
+            unique_values = np.asarray(df[col].dropna().unique())
+            self.categories[col] = np.sort(unique_values).tolist()
+
+        return self
+
+    def transform(self, df: pd.DataFrame,
+                  cols: list[str] | None = None) -> pd.DataFrame:
+        """
+        Replaces the values of the given columns with their integer codes
+
+        Inputs:
+            * df: (pd.DataFrame) The dataframe containing the data
+            * cols: (list(string)) The columns to encode. Defaults to every
+              fitted column.
+
+        Returns:
+            * df: (pd.DataFrame) The original dataframe with the columns
+              converted to integer codes
+        """
+        cols = list(self.categories) if cols is None else cols
+
+        for col in cols:
+            if col not in self.categories:
+                raise KeyError(f"The encoder has not been fitted on {col}")
+
+            # pd.Categorical looks up every value in one vectorised pass and
+            # gives unseen values a code of -1, which is UNKNOWN_CODE
+            df[col] = pd.Categorical(df[col],
+                                     categories=self.categories[col]).codes
+
+        return df
+
+    def fit_transform(self, df: pd.DataFrame,
+                      cols: list[str]) -> pd.DataFrame:
+        """
+        Fits the encoder on the given columns and then encodes them
+
+        Inputs:
+            * df: (pd.DataFrame) The dataframe containing the data
+            * cols: (list(string)) The columns to fit and encode
+
+        Returns:
+            * df: (pd.DataFrame) The original dataframe with the columns
+              converted to integer codes
+        """
+        return self.fit(df, cols).transform(df, cols)
+
+    def to_dict(self) -> dict:
+        """
+        Returns:
+            * state: (dict) JSON serialisable state of the encoder
+        """
+        return {"categories": self.categories}
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "CategoryEncoder":
+        """
+        Inputs:
+            * state: (dict) State returned by to_dict
+
+        Returns:
+            * encoder: (CategoryEncoder) The restored encoder
+        """
+        return cls(state["categories"])
+
+    def save(self, path: str) -> None:
+        """
+        Saves the encoder as JSON
+
+        Inputs:
+            * path: (string) File to write
+        """
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.to_dict(), file, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> "CategoryEncoder":
+        """
+        Loads an encoder saved with save
+
+        Inputs:
+            * path: (string) File to read
+
+        Returns:
+            * encoder: (CategoryEncoder) The restored encoder
+        """
+        with open(path, encoding="utf-8") as file:
+            return cls.from_dict(json.load(file))
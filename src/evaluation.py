@@ -0,0 +1,246 @@
+"""
+This module contains the StreamingMetrics class which accumulates binary
+classification metrics over chunks of predictions, so that scoring runs over
+millions of customers can be evaluated without keeping every prediction in
+memory.
+"""
+import numpy as np
+import pandas as pd
+
+# Number of equal-width bins the predicted probabilities are counted in.
+# Threshold sweeps and the ROC and PR curves are computed from these counts,
+# so they are exact up to a probability resolution of 1 / NUM_BINS.
+NUM_BINS = 2 ** 16
+
+# Thresholds reported by threshold_sweep by default
+DEFAULT_THRESHOLDS = np.round(np.arange(0.01, 1.0, 0.01), 2)
+
+
+def _safe_divide(numerator: np.ndarray | float,
+                 denominator: np.ndarray | float) -> np.ndarray:
+    """
+    Divides element-wise, giving 0 wherever the denominator is 0
+    """
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+
+    return np.divide(numerator, denominator,
+                     out=np.zeros(np.broadcast(numerator, denominator).shape),
+                     where=denominator != 0)
+
+
+class StreamingMetrics():
+    """
+    The StreamingMetrics accumulates, for each chunk of labels and predicted
+    probabilities:
+        * The exact confusion counts at the decision threshold, with a single
+          np.bincount over the combined label and prediction codes
+        * A histogram of the probabilities of each class over NUM_BINS bins,
+          also with a single np.bincount
+
+    Memory use is fixed by the number of bins rather than the number of rows.
+    The histogram is already sorted by probability, so one cumulative sum
+    over it gives the true and false positives at every threshold. Precision,
+    recall and F1 at any threshold, ROC-AUC and PR-AUC are all read from
+    these sums.
+
+    Attributes:
+        * self.threshold: (float)
+        * self.num_bins: (int)
+        * self.confusion: (np.ndarray) Counts of true negatives, false
+          positives, false negatives and true positives
+        * self.histogram: (np.ndarray) Counts per probability bin for stayed
+          (row 0) and exited (row 1) customers
+
+    Methods:
+        * update
+        * confusion_matrix
+        * roc_auc
+        * pr_auc
+        * threshold_sweep
+        * best_threshold
+        * results
+    """
+
+    def __init__(self, threshold: float = 0.5,
+                 num_bins: int = NUM_BINS) -> None:
+        """
+        Init function for the StreamingMetrics class
+
+        Inputs:
+            * threshold: (float) Probabilities above the threshold are
+              predicted as exited
+            * num_bins: (int) Number of probability bins
+        """
+        self.threshold = threshold
+        self.num_bins = num_bins
+        self.confusion = np.zeros(4, dtype=np.int64)
+        self.histogram = np.zeros((2, num_bins), dtype=np.int64)
+
+    def update(self, y_true: np.ndarray | pd.Series,
+               y_proba: np.ndarray) -> "StreamingMetrics":
+        """
+        Adds a chunk of predictions to the metrics
+
+        Inputs:
+            * y_true: (np.ndarray or pd.Series) Labels of 0 (stayed) or 1
+              (exited)
+            * y_proba: (np.ndarray) Predicted probability of exiting
+
+        Returns:
+            * self: (StreamingMetrics) The updated metrics
+        """
+        y_true = np.asarray(y_true).astype(np.int64, copy=False)
+        y_proba = np.asarray(y_proba)
+        if len(y_true) != len(y_proba):
+            raise ValueError("y_true and y_proba must have the same length")
+
+        y_pred = y_proba > self.threshold
+        self.confusion += np.bincount(2 * y_true + y_pred, minlength=4)
+
+        bins = np.clip((y_proba * self.num_bins).astype(np.int64), 0,
+                       self.num_bins - 1)
+        self.histogram += np.bincount(
+            y_true * self.num_bins + bins,
+            minlength=2 * self.num_bins).reshape(2, self.num_bins)
+
+        return self
+
+    def confusion_matrix(self, normalize: bool = False) -> np.ndarray:
+        """
+        Inputs:
+            * normalize: (bool) If True then each row is divided by the
+              number of customers with that label
+
+        Returns:
+            * matrix: (np.ndarray) Confusion matrix at the threshold, with
+              the true labels as rows, in the layout of sklearn's
+              confusion_matrix
+        """
+        matrix = self.confusion.reshape(2, 2)
+        if normalize:
+            return _safe_divide(matrix, matrix.sum(axis=1, keepdims=True))
+
+        return matrix.copy()
+
+    def roc_auc(self) -> float:
+        """
+        Returns:
+            * roc_auc: (float) Area under the ROC curve
+        """
+        tps, fps = self._cumulative_counts()
+        tpr = _safe_divide(np.concatenate([[0], tps]), tps[-1])
+        fpr = _safe_divide(np.concatenate([[0], fps]), fps[-1])
+
+        return float(np.trapz(tpr, fpr))
+
+    def pr_auc(self) -> float:
+        """
+        Returns:
+            * pr_auc: (float) Area under the precision-recall curve, computed
+              as the average precision like sklearn's
+              average_precision_score
+        """
+        tps, fps = self._cumulative_counts()
+        precision = _safe_divide(tps, tps + fps)
+        recall = _safe_divide(tps, tps[-1])
+
+        return float(np.sum(np.diff(recall, prepend=0) * precision))
+
+    def threshold_sweep(self, thresholds: np.ndarray | None = None) \
+            -> pd.DataFrame:
+        """
+        Computes the metrics at many thresholds from one cumulative sum over
+        the probability histogram. A customer is counted as exited at a
+        threshold when their probability is at or above it, to within
+        1 / num_bins.
+
+        Inputs:
+            * thresholds: (np.ndarray) Thresholds to report. Defaults to
+              DEFAULT_THRESHOLDS.
+
+        Returns:
+            * sweep: (pd.DataFrame) The confusion counts, precision, recall,
+              F1 and accuracy at each threshold
+        """
+        thresholds = DEFAULT_THRESHOLDS if thresholds is None \
+            else np.asarray(thresholds, dtype=np.float64)
+
+        # Counts of customers in or above each bin, with a trailing zero for
+        # thresholds above every bin
+        above = np.zeros((2, self.num_bins + 1), dtype=np.int64)
+        above[:, :-1] = self.histogram[:, ::-1].cumsum(axis=1)[:, ::-1]
+
+        first_bins = np.clip(np.ceil(thresholds * self.num_bins)
+                             .astype(np.int64), 0, self.num_bins)
+        tp = above[1, first_bins]
+        fp = above[0, first_bins]
+        fn = above[1, 0] - tp
+        tn = above[0, 0] - fp
+
+        precision = _safe_divide(tp, tp + fp)
+        recall = _safe_divide(tp, tp + fn)
+
+        return pd.DataFrame({
+            "threshold": thresholds,
+            "tp": tp,
+            "fp": fp,
+            "tn": tn,
+            "fn": fn,
+            "precision": precision,
+            "recall": recall,
+            "f1": _safe_divide(2 * precision * recall, precision + recall),
+            "accuracy": _safe_divide(tp + tn, above[:, 0].sum()),
+        })
+
+    def best_threshold(self, metric: str = "f1",
+                       thresholds: np.ndarray | None = None) -> float:
+        """
+        Inputs:
+            * metric: (string) Column of threshold_sweep to maximise
+            * thresholds: (np.ndarray) Thresholds to choose from
+
+        Returns:
+            * threshold: (float) Threshold with the highest metric
+        """
+        sweep = self.threshold_sweep(thresholds)
+
+        return float(sweep["threshold"].iloc[sweep[metric].argmax()])
+
+    def results(self) -> dict:
+        """
+        Returns:
+            * results: (dict) Number of rows, confusion counts, accuracy,
+              precision, recall and F1 of the exited class at the
+              threshold, along with the ROC-AUC and PR-AUC
+        """
+        tn, fp, fn, tp = self.confusion.tolist()
+        precision = float(_safe_divide(tp, tp + fp))
+        recall = float(_safe_divide(tp, tp + fn))
+
+        return {
+            "threshold": self.threshold,
+            "rows": tn + fp + fn + tp,
+            "tp": tp,
+            "fp": fp,
+            "tn": tn,
+            "fn": fn,
+            "accuracy": float(_safe_divide(tp + tn, tn + fp + fn + tp)),
+            "precision": precision,
+            "recall": recall,
+            "f1": float(_safe_divide(2 * precision * recall,
+                                     precision + recall)),
+            "roc_auc": self.roc_auc(),
+            "pr_auc": self.pr_auc(),
+        }
+
+    def _cumulative_counts(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns:
+            * tps: (np.ndarray) Exited customers at or above each bin, from
+              the highest bin down
+            * fps: (np.ndarray) Stayed customers at or above each bin, from
+              the highest bin down
+        """
+        return (self.histogram[1, ::-1].cumsum(),
+                self.histogram[0, ::-1].cumsum())
@@ -0,0 +1,313 @@
+"""
+This module contains the FeatureBuilder class which computes derived features
+of the customer data, e.g., whether a customer's balance is zero or which age
+band they fall in. Features are declared as specs in DERIVED_FEATURES and are
+computed column by column with NumPy into a single preallocated float32
+matrix, which can be cached on disk per dataset so that analysis and training
+reuse it.
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from hashing import content_hash
+from instrumentation import traced
+
+# Derived features in the order of the matrix columns. Each spec names the
+# feature, the kind of computation and the columns it is computed from, which
+# can be columns of the data or features declared earlier in the list:
+#     * flag: 1 where the column compares to value with op, else 0
+#     * round: the column rounded to the given number of decimals
+#     * bin: index of the bin the column falls in, given the bin edges
+#     * ratio: the first column divided by the second, 0 where the second
+#       is 0
+#     * product: the product of the columns
+DERIVED_FEATURES = [
+    {"name": "ZeroBalance", "kind": "flag", "cols": ["Balance (EUR)"],
+     "op": "eq", "value": 0},
+    {"name": "SalaryBand", "kind": "round", "cols": ["EstimatedSalary"],
+     "decimals": -4},
+    {"name": "AgeBand", "kind": "bin", "cols": ["Age"],
+     "edges": [30, 40, 50, 60, 70]},
+    {"name": "LongTenure", "kind": "flag", "cols": ["Tenure"],
+     "op": "ge", "value": 10},
+    {"name": "BalanceSalaryRatio", "kind": "ratio",
+     "cols": ["Balance (EUR)", "EstimatedSalary"]},
+    {"name": "ProductsActive", "kind": "product",
+     "cols": ["NumberOfProducts", "IsActiveMember"]},
+    {"name": "ZeroBalanceActive", "kind": "product",
+     "cols": ["ZeroBalance", "IsActiveMember"]},
+]
+
+COMPARISONS = {
+    "eq": np.equal,
+    "ne": np.not_equal,
+    "gt": np.greater,
+    "ge": np.greater_equal,
+    "lt": np.less,
+    "le": np.less_equal,
+}
+
+
+def _flag(sources: list[np.ndarray], out: np.ndarray, op: str,
+          value: float) -> None:
+    np.copyto(out, COMPARISONS[op](sources[0], value), casting="unsafe")
+
+
+def _round(sources: list[np.ndarray], out: np.ndarray,
+           decimals: int) -> None:
+    np.copyto(out, np.round(sources[0], decimals), casting="same_kind")
+
+
+def _bin(sources: list[np.ndarray], out: np.ndarray,
+         edges: list[float]) -> None:
+    np.copyto(out, np.digitize(sources[0], edges), casting="unsafe")
+
+
+def _ratio(sources: list[np.ndarray], out: np.ndarray) -> None:
+    out[:] = 0
+    np.divide(sources[0], sources[1], out=out, where=sources[1] != 0,
+              casting="same_kind")
+
+
+def _product(sources: list[np.ndarray], out: np.ndarray) -> None:
+    np.copyto(out, sources[0], casting="same_kind")
+    for source in sources[1:]:
+        np.multiply(out, source, out=out, casting="same_kind")
+
+
+# SQL operator of each comparison, used by sql_expressions
+SQL_COMPARISONS = {
+    "eq": "=",
+    "ne": "<>",
+    "gt": ">",
+    "ge": ">=",
+    "lt": "<",
+    "le": "<=",
+}
+
+
+def quote_identifier(name: str) -> str:
+    """
+    Quotes a column name for use in SQL, e.g., Balance (EUR)
+    """
+    return '"' + name.replace('"', '""') + '"'
+
+
+# Keys shared by every spec. The other keys of a spec are passed to the
+# function of its kind as keyword arguments.
+SPEC_KEYS = ("name", "kind", "cols")
+
+# Function computing each kind of feature into its column of the matrix
+FEATURE_KINDS = {
+    "flag": _flag,
+    "round": _round,
+    "bin": _bin,
+    "ratio": _ratio,
+    "product": _product,
+}
+
+
+class FeatureBuilder():
+    """
+    The FeatureBuilder computes the features declared by a list of specs,
+    see DERIVED_FEATURES. Each feature is written straight into its column
+    of a preallocated column-major float32 matrix, and later features can
+    read the columns of earlier ones.
+
+    When a cache directory is given, build stores the matrix as a .npy file
+    keyed on the content of the columns the features are computed from and
+    on the specs, and later calls memory-map it instead of recomputing it.
+
+    Attributes:
+        * self.specs: (list(dict))
+        * self.cache_dir: (string or None)
+        * self.feature_names: (list(string))
+        * self.source_cols: (list(string))
+
+    Methods:
+        * transform
+        * build
+        * to_frame
+        * append_features
+        * sql_expressions
+        * cache_path
+    """
+
+    def __init__(self, specs: list[dict] | None = None,
+                 cache_dir: str | None = None) -> None:
+        """
+        Init function for the FeatureBuilder class
+
+        Inputs:
+            * specs: (list(dict)) Feature specs. Defaults to
+              DERIVED_FEATURES.
+            * cache_dir: (string) Directory in which built matrices are
+              cached. If None then build always computes the matrix.
+        """
+        self.specs = DERIVED_FEATURES if specs is None else specs
+        self.cache_dir = cache_dir
+        self.feature_names = [spec["name"] for spec in self.specs]
+
+        for spec in self.specs:
+            if spec["kind"] not in FEATURE_KINDS:
+                raise ValueError(f"Unknown feature kind {spec['kind']}")
+
+        # Columns of the data the features are computed from
+        self.source_cols = []
+        for spec in self.specs:
+            for col in spec["cols"]:
+                if col not in self.feature_names and \
+                        col not in self.source_cols:
+                    self.source_cols.append(col)
+
+    @traced("FeatureBuilder.transform")
+    def transform(self, df: pd.DataFrame,
+                  out: np.ndarray | None = None) -> np.ndarray:
+        """
+        Computes every feature in one pass over the specs
+
+        Inputs:
+            * df: (pd.DataFrame) Cleaned customer data
+            * out: (np.ndarray) Optional float32 matrix of shape (rows,
+              features) the features are written to
+
+        Returns:
+            * features: (np.ndarray) float32 feature matrix
+        """
+        if out is None:
+            out = np.empty((len(df), len(self.specs)), dtype=np.float32,
+                           order="F")
+
+        columns = {}
+        for idx, spec in enumerate(self.specs):
+            sources = []
+            for col in spec["cols"]:
+                if col not in columns:
+                    columns[col] = df[col].to_numpy(dtype=np.float64)
+                sources.append(columns[col])
+
+            params = {key: value for key, value in spec.items()
+                      if key not in SPEC_KEYS}
+            FEATURE_KINDS[spec["kind"]](sources, out[:, idx], **params)
+            columns[spec["name"]] = out[:, idx]
+
+        return out
+
+    def cache_path(self, df: pd.DataFrame) -> str:
+        """
+        Builds the location of the cached matrix for a dataset. The name is
+        keyed on the content of the source columns and on the specs, so
+        changing either results in a new cache path.
+
+        Inputs:
+            * df: (pd.DataFrame) Cleaned customer data
+
+        Returns:
+            * cache_path: (string) Path of the .npy cache file
+        """
+        data_key = content_hash(df[self.source_cols])[:16]
+        spec_key = hashlib.sha1(json.dumps(self.specs, sort_keys=True)
+                                .encode()).hexdigest()[:12]
+
+        return os.path.join(self.cache_dir,
+                            f"features-{data_key}-{spec_key}.npy")
+
+    @traced("FeatureBuilder.build")
+    def build(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        Computes the feature matrix, or memory-maps it from the cache
+
+        Inputs:
+            * df: (pd.DataFrame) Cleaned customer data
+
+        Returns:
+            * features: (np.ndarray) float32 feature matrix, read-only when
+              loaded from the cache
+        """
+        if self.cache_dir is None:
+            return self.transform(df)
+
+        cache_path = self.cache_path(df)
+        if os.path.exists(cache_path):
+            return np.load(cache_path, mmap_mode="r")
+
+        features = self.transform(df)
+
+        # Write to a temporary file first so a reader never sees a partial
+        # cache. The name must end in .npy or np.save appends it.
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{cache_path[:-4]}.{os.getpid()}.tmp.npy"
+        np.save(tmp_path, features)
+        os.replace(tmp_path, cache_path)
+
+        return features
+
+    def to_frame(self, features: np.ndarray,
+                 index: pd.Index | None = None) -> pd.DataFrame:
+        """
+        Wraps a feature matrix in a dataframe with one column per feature
+
+        Inputs:
+            * features: (np.ndarray) Matrix from transform or build
+            * index: (pd.Index) Optional index of the rows
+
+        Returns:
+            * feature_frame: (pd.DataFrame) The features
+        """
+        return pd.DataFrame(features, index=index,
+                            columns=self.feature_names, copy=False)
+
+    def append_features(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Computes the features and adds them as columns to a copy of the
+        dataframe
+
+        Inputs:
+            * df: (pd.DataFrame) Cleaned customer data
+
+        Returns:
+            * df: (pd.DataFrame) The data with a column per feature
+        """
+        return pd.concat([df, self.to_frame(self.transform(df), df.index)],
+                         axis=1)
+
+    def sql_expressions(self) -> dict[str, str]:
+        """
+        Translates the specs into SQL expressions so that the features can be
+        computed by a query engine, see DuckDBBackend. Features computed from
+        earlier features have the earlier expressions inlined.
+
+        Returns:
+            * expressions: (dict) Mapping of feature name to a SQL expression
+              over the source columns
+        """
+        expressions = {}
+        for spec in self.specs:
+            sources = [f"({expressions[col]})" if col in expressions
+                       else quote_identifier(col) for col in spec["cols"]]
+
+            if spec["kind"] == "flag":
+                expression = (f"CAST({sources[0]} "
+                              f"{SQL_COMPARISONS[spec['op']]} "
+                              f"{float(spec['value'])} AS FLOAT)")
+            elif spec["kind"] == "round":
+                expression = f"round({sources[0]}, {int(spec['decimals'])})"
+            elif spec["kind"] == "bin":
+                # Counting the edges at or below the value matches
+                # np.digitize with increasing edges
+                expression = " + ".join(
+                    f"CAST({sources[0]} >= {float(edge)} AS FLOAT)"
+                    for edge in spec["edges"])
+            elif spec["kind"] == "ratio":
+                expression = (f"CASE WHEN {sources[1]} = 0 THEN 0 "
+                              f"ELSE {sources[0]} / {sources[1]} END")
+            else:
+                expression = " * ".join(sources)
+
+            expressions[spec["name"]] = f"CAST({expression} AS FLOAT)"
+
+        return expressions
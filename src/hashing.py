@@ -0,0 +1,41 @@
+"""
+This module contains content_hash which hashes dataframes, arrays and other
+values from their content. It is used to key cached pipeline outputs and
+cached feature matrices.
+"""
+import hashlib
+import pickle
+
+import numpy as np
+import pandas as pd
+
+
+def content_hash(value) -> str:
+    """
+    Hashes the content of a value. Dataframes, series and arrays are
+    hashed from their values, tuples and lists from their items and anything
+    else from its pickled bytes.
+
+    Inputs:
+        * value: Value to hash, e.g., a pipeline node output
+
+    Returns:
+        * digest: (string) Hex digest of the content
+    """
+    digest = hashlib.sha1()
+
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        digest.update(pd.util.hash_pandas_object(value).to_numpy().tobytes())
+        if isinstance(value, pd.DataFrame):
+            digest.update(repr(list(zip(value.columns, value.dtypes)))
+                          .encode())
+    elif isinstance(value, np.ndarray):
+        digest.update(str((value.dtype, value.shape)).encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (tuple, list)):
+        for item in value:
+            digest.update(content_hash(item).encode())
+    else:
+        digest.update(pickle.dumps(value))
+
+    return digest.hexdigest()
@@ -0,0 +1,346 @@
+"""
+This module contains the IncrementalTrainer class which updates a saved model
+from a new full extract of the customer data. Customers are matched to the
+previous extract by their id and only those that are new or have changed are
+preprocessed and used to extend the model. The updated model can be compared
+against a full retrain to decide when a full rebuild is needed.
+"""
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow.feather as feather
+
+from data_loader import DataLoader
+from encoder import CategoryEncoder
+from features import FeatureBuilder
+from instrumentation import traced
+from model import METADATA_FILE, MachineLearningModel
+
+# File name of the preprocessed snapshot stored next to the saved model
+SNAPSHOT_FILE = "snapshot.feather"
+
+# Snapshot column holding the hash of each customer's cleaned row
+ROW_HASH_COL = "RowHash"
+
+# Percentage of customers held out for testing. Customers are assigned to the
+# test set by a hash of their id, so that a customer stays in the same split
+# in every extract and the updated model never trains on test customers.
+TEST_PERCENT = 30
+
+# Number of boosting rounds, or Random Forest trees, added by each update
+INCREMENTAL_ESTIMATORS = 20
+
+# A full rebuild is recommended once the updated model's test accuracy is more
+# than this far below the accuracy of a full retrain
+MAX_ACCURACY_DRIFT = 0.01
+
+
+class IncrementalTrainer():
+    """
+    The IncrementalTrainer keeps a snapshot of the preprocessed features of
+    every customer next to the saved model, along with a hash of each
+    customer's cleaned row. Given a new extract it:
+        * Finds the new and changed customers by comparing row hashes
+        * Encodes and scores the sentiment of only those customers, reusing
+          the snapshot's features for everyone else
+        * Continues training the saved model on the new and changed
+          customers in the training split
+        * Optionally trains a model from scratch on the full extract and
+          reports how far the updated model's accuracy has drifted from it
+
+    If there is no saved model or snapshot then the model is trained from
+    scratch.
+
+    Attributes:
+        * self.model_dir: (string)
+        * self.model_type: (string)
+        * self.cols_to_encode: (list(string))
+        * self.sentiment_col: (string)
+        * self.drop_cols: (list(string))
+        * self.id_col: (string)
+        * self.label_col: (string)
+        * self.n_estimators: (int)
+        * self.compare_full: (bool)
+        * self.dataloader: (DataLoader)
+        * self.feature_builder: (FeatureBuilder or None)
+        * self.report: (dict or None)
+
+    Methods:
+        * update
+        * snapshot_path
+    """
+
+    def __init__(self, model_dir: str, model_type: str,
+                 cols_to_encode: list[str], sentiment_col: str,
+                 drop_cols: list[str], id_col: str = "CustomerId",
+                 label_col: str = "Exited",
+                 n_estimators: int = INCREMENTAL_ESTIMATORS,
+                 compare_full: bool = True,
+                 dataloader: DataLoader | None = None,
+                 feature_builder: FeatureBuilder | None = None) -> None:
+        """
+        Init function for the IncrementalTrainer class
+
+        Inputs:
+            * model_dir: (string) Directory of the saved model and snapshot
+            * model_type: (string) Type of MachineLearningModel trained when
+              training from scratch
+            * cols_to_encode: (list(string)) Columns that are label encoded
+            * sentiment_col: (string) Column sentiment analysis is applied to
+            * drop_cols: (list(string)) Columns that are not used as features
+            * id_col: (string) Column that identifies a customer
+            * label_col: (string) Column holding the label
+            * n_estimators: (int) Number of boosting rounds, or trees, added
+              by each update
+            * compare_full: (bool) If True then each update also trains a
+              model from scratch to measure the drift in accuracy
+            * dataloader: (DataLoader) Loader used to apply the label
+              encoding and sentiment analysis. Its dataset is not read, so it
+              may be created without one.
+            * feature_builder: (FeatureBuilder) Optional builder of derived
+              features that are added to the model's features
+        """
+        self.model_dir = model_dir
+        self.model_type = model_type
+        self.cols_to_encode = cols_to_encode
+        self.sentiment_col = sentiment_col
+        self.drop_cols = drop_cols
+        self.id_col = id_col
+        self.label_col = label_col
+        self.n_estimators = n_estimators
+        self.compare_full = compare_full
+        self.dataloader = DataLoader(None) if dataloader is None \
+            else dataloader
+        self.feature_builder = feature_builder
+        self.report = None
+
+    def snapshot_path(self) -> str:
+        """
+        Returns:
+            * snapshot_path: (string) Path of the preprocessed snapshot
+        """
+        return os.path.join(self.model_dir, SNAPSHOT_FILE)
+
+    @traced("IncrementalTrainer.update")
+    def update(self, customer_data: pd.DataFrame,
+               rebuild: bool = False) -> dict:
+        """
+        Updates the saved model and snapshot from a full extract of the
+        cleaned customer data
+
+        Inputs:
+            * customer_data: (pd.DataFrame) Cleaned customer data, e.g., from
+              DataLoader.load_and_clean
+            * rebuild: (bool) If True then the encoding and model are rebuilt
+              from scratch even if a snapshot exists
+
+        Returns:
+            * report: (dict) Number of new, changed and removed customers,
+              training times, test accuracies and whether a full rebuild is
+              recommended
+        """
+        ids = customer_data[self.id_col].to_numpy()
+        if pd.Index(ids).has_duplicates:
+            raise ValueError(f"The {self.id_col} column must be unique")
+
+        row_hashes = pd.util.hash_pandas_object(customer_data,
+                                                index=False).to_numpy()
+        labels = customer_data[self.label_col]
+        test_mask = pd.util.hash_array(ids) % 100 < TEST_PERCENT
+
+        snapshot = None if rebuild else self._load_snapshot()
+
+        start_time = time.perf_counter()
+        if snapshot is None:
+            print("Training from scratch\n")
+            encoder = CategoryEncoder().fit(customer_data,
+                                            self.cols_to_encode)
+            features = self._preprocess(customer_data, encoder)
+            model = self._train_from_scratch(features, labels, test_mask)
+            num_new, num_changed, num_removed = len(ids), 0, 0
+            trained_rows = int((~test_mask).sum())
+        else:
+            model = MachineLearningModel.load(self.model_dir)
+            encoder = CategoryEncoder.from_dict(
+                model.preprocessing["label_encoder"])
+
+            # Match every customer to their row in the previous snapshot
+            positions = pd.Index(snapshot[self.id_col]).get_indexer(ids)
+            is_new = positions < 0
+            is_changed = ~is_new & (
+                snapshot[ROW_HASH_COL].to_numpy()[positions] != row_hashes)
+            is_delta = is_new | is_changed
+
+            features = self._merge_features(customer_data, snapshot,
+                                            positions, is_delta, encoder)
+
+            train_delta = is_delta & ~test_mask
+            if train_delta.any():
+                model.continue_training(features[train_delta],
+                                        labels[train_delta],
+                                        self.n_estimators)
+
+            num_new = int(is_new.sum())
+            num_changed = int(is_changed.sum())
+            num_removed = len(snapshot) - (len(ids) - num_new)
+            trained_rows = int(train_delta.sum())
+        seconds = time.perf_counter() - start_time
+
+        x_test, y_test = features[test_mask], labels[test_mask]
+        accuracy = float((model.predict(x_test) == y_test).mean())
+
+        self.report = {
+            "rows": len(ids),
+            "new": num_new,
+            "changed": num_changed,
+            "removed": num_removed,
+            "trained_rows": trained_rows,
+            "seconds": seconds,
+            "accuracy": accuracy,
+            "full_seconds": None,
+            "full_accuracy": None,
+            "accuracy_drift": None,
+            "rebuild_recommended": None,
+        }
+
+        if self.compare_full and snapshot is not None:
+            start_time = time.perf_counter()
+            full_model = self._train_from_scratch(features, labels,
+                                                  test_mask)
+            self.report["full_seconds"] = time.perf_counter() - start_time
+            self.report["full_accuracy"] = float(
+                (full_model.predict(x_test) == y_test).mean())
+            self.report["accuracy_drift"] = \
+                self.report["full_accuracy"] - accuracy
+            self.report["rebuild_recommended"] = \
+                self.report["accuracy_drift"] > MAX_ACCURACY_DRIFT
+
+        preprocessing = {
+            "label_encoder": encoder.to_dict(),
+            "sentiment_col": self.sentiment_col,
+            "sentiment_backend": self.dataloader.sentiment_backend,
+            "drop_cols": self.drop_cols,
+            "derived_features": None if self.feature_builder is None
+            else self.feature_builder.specs,
+        }
+        model.save(self.model_dir, preprocessing)
+        self._save_snapshot(features, ids, row_hashes)
+
+        self._print_report()
+
+        return self.report
+
+    def _load_snapshot(self) -> pd.DataFrame | None:
+        """
+        Returns:
+            * snapshot: (pd.DataFrame or None) The previous snapshot, or None
+              if there is no saved model or snapshot
+        """
+        if not os.path.exists(self.snapshot_path()) or \
+                not os.path.exists(os.path.join(self.model_dir,
+                                                METADATA_FILE)):
+            return None
+
+        return feather.read_table(self.snapshot_path(),
+                                  memory_map=True).to_pandas()
+
+    def _preprocess(self, rows: pd.DataFrame,
+                    encoder: CategoryEncoder) -> pd.DataFrame:
+        """
+        Encodes and scores the sentiment of a copy of the given rows, adds
+        the derived features and removes every column that is not a feature
+
+        Returns:
+            * features: (pd.DataFrame) Feature columns of the rows
+        """
+        features = self.dataloader.apply_label_encoding(
+            rows.copy(), self.cols_to_encode, encoder)
+        features = self.dataloader.apply_sentiment_analysis(
+            features, self.sentiment_col)
+        if self.feature_builder is not None:
+            features = self.feature_builder.append_features(features)
+
+        return features.drop(columns=[*self.drop_cols, self.label_col])
+
+    def _merge_features(self, customer_data: pd.DataFrame,
+                        snapshot: pd.DataFrame, positions: np.ndarray,
+                        is_delta: np.ndarray,
+                        encoder: CategoryEncoder) -> pd.DataFrame:
+        """
+        Builds the features of every customer from the snapshot, for
+        unchanged customers, and by preprocessing the new and changed
+        customers
+
+        Inputs:
+            * customer_data: (pd.DataFrame) Cleaned customer data
+            * snapshot: (pd.DataFrame) The previous snapshot
+            * positions: (np.ndarray) Row of each customer in the snapshot
+            * is_delta: (np.ndarray) Mask of the new and changed customers
+            * encoder: (CategoryEncoder) The saved model's encoder
+
+        Returns:
+            * features: (pd.DataFrame) Features in the order of
+              customer_data
+        """
+        delta_features = self._preprocess(customer_data[is_delta], encoder)
+
+        unchanged_features = snapshot[delta_features.columns].iloc[
+            positions[~is_delta]]
+        unchanged_features.index = customer_data.index[~is_delta]
+
+        return pd.concat([unchanged_features, delta_features]).reindex(
+            customer_data.index)
+
+    def _train_from_scratch(self, features: pd.DataFrame,
+                            labels: pd.Series,
+                            test_mask: np.ndarray) -> MachineLearningModel:
+        """
+        Trains a new model on every customer in the training split
+
+        Returns:
+            * model: (MachineLearningModel) The fitted model
+        """
+        model = MachineLearningModel(features[~test_mask],
+                                     features[test_mask],
+                                     labels[~test_mask], labels[test_mask],
+                                     self.model_type)
+        model.fit_and_predict()
+
+        return model
+
+    def _save_snapshot(self, features: pd.DataFrame, ids: np.ndarray,
+                       row_hashes: np.ndarray) -> None:
+        """
+        Writes the features, id and row hash of every customer
+        """
+        snapshot = features.reset_index(drop=True)
+        snapshot[self.id_col] = ids
+        snapshot[ROW_HASH_COL] = row_hashes
+
+        # Write to a temporary file first so a reader never sees a partial
+        # snapshot
+        tmp_path = f"{self.snapshot_path()}.{os.getpid()}.tmp"
+        feather.write_feather(snapshot, tmp_path)
+        os.replace(tmp_path, self.snapshot_path())
+
+    def _print_report(self) -> None:
+        """
+        Prints the report of the last update
+        """
+        report = self.report
+        print(f"Updated model from {report['rows']} customers: "
+              f"{report['new']} new, {report['changed']} changed, "
+              f"{report['removed']} removed. Trained on "
+              f"{report['trained_rows']} rows in {report['seconds']:.2f}s, "
+              f"test accuracy {report['accuracy']:.4f}\n")
+
+        if report["full_accuracy"] is not None:
+            print(f"Full retrain: {report['full_seconds']:.2f}s, test "
+                  f"accuracy {report['full_accuracy']:.4f}, drift "
+                  f"{report['accuracy_drift']:+.4f}\n")
+            if report["rebuild_recommended"]:
+                print("The updated model has drifted by more than "
+                      f"{MAX_ACCURACY_DRIFT}, a full rebuild is "
+                      "recommended\n")
@@ -0,0 +1,358 @@
+"""
+This module contains the Tracer class which records timing spans for the
+stages of the churn pipeline, along with the number of rows each stage
+processed and how much memory it allocated. Tracing is disabled by default
+and costs a single attribute check per stage until it is enabled. The
+PeakRSSSampler measures the peak resident memory of a single stage.
+
+Usage:
+    TRACER.enable(profile_stage="DataLoader.apply_sentiment_analysis")
+    ... run the pipeline ...
+    TRACER.export_chrome_trace("trace.json")
+"""
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import resource
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+# Shared context manager returned by span while tracing is disabled. Rows set
+# on the dict it yields are discarded.
+_NULL_SPAN = contextlib.nullcontext({"rows": None})
+
+# Interval in seconds at which PeakRSSSampler samples the resident set size
+RSS_SAMPLE_INTERVAL = 0.01
+
+
+def current_rss_mb() -> float:
+    """
+    Returns:
+        * rss_mb: (float) Current resident set size of the process in MB
+    """
+    try:
+        with open("/proc/self/statm", encoding="utf-8") as statm:
+            resident_pages = int(statm.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError):
+        # Fall back to the peak for the whole process where /proc is missing
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class PeakRSSSampler():
+    """
+    Context manager that samples the resident set size in a background thread
+    to find the peak memory used while a stage runs. Unlike ru_maxrss, the
+    peak only covers the time spent inside the context.
+
+    Attributes:
+        * self.start_mb: (float)
+        * self.peak_mb: (float)
+    """
+
+    def __init__(self) -> None:
+        self.start_mb = 0.0
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def __enter__(self) -> "PeakRSSSampler":
+        self.start_mb = self.peak_mb = current_rss_mb()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+    def _sample(self) -> None:
+        while not self._stop.wait(RSS_SAMPLE_INTERVAL):
+            self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+
+class Tracer():
+    """
+    The Tracer collects one event per completed span. Each event holds the
+    name of the stage, its start time and duration, the number of rows it
+    processed when known and, when memory tracking is enabled, the change in
+    traced memory and the peak memory allocated within the span.
+
+    tracemalloc traces the whole process, so memory cannot be attributed to
+    spans that run at the same time on different threads, e.g., pipeline
+    nodes run by more than one worker. The memory fields of a span that
+    overlaps a span on another thread are recorded as None.
+
+    One stage can also be profiled with cProfile, or pyinstrument when it is
+    installed, and its profile written to a file.
+
+    Attributes:
+        * self.enabled: (bool)
+        * self.track_memory: (bool)
+        * self.events: (list(dict))
+
+    Methods:
+        * enable
+        * disable
+        * span
+        * export_jsonl
+        * export_chrome_trace
+    """
+
+    def __init__(self) -> None:
+        """
+        Init function for the Tracer class
+        """
+        self.enabled = False
+        self.track_memory = False
+        self.events = []
+        self._profile_stage = None
+        self._profile_path = None
+        self._profiler = "cprofile"
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._open_frames = {}
+        self._origin = time.perf_counter()
+
+    def enable(self, track_memory: bool = True,
+               profile_stage: str | None = None,
+               profile_path: str | None = None,
+               profiler: str = "cprofile") -> None:
+        """
+        Starts recording spans
+
+        Inputs:
+            * track_memory: (bool) If True then memory is traced with
+              tracemalloc, which slows down allocation heavy stages
+            * profile_stage: (string) Optional name of a stage to profile
+            * profile_path: (string) File the profile is written to.
+              Defaults to the stage name with a .prof or .html extension.
+            * profiler: (string) "cprofile" or "pyinstrument"
+        """
+        if profiler not in ("cprofile", "pyinstrument"):
+            raise ValueError("The profiler must be cprofile or pyinstrument")
+
+        self.enabled = True
+        self.track_memory = track_memory
+        self._profile_stage = profile_stage
+        self._profiler = profiler
+        self._profile_path = profile_path
+        if profile_stage is not None and profile_path is None:
+            extension = ".prof" if profiler == "cprofile" else ".html"
+            self._profile_path = f"{profile_stage}{extension}"
+
+        if track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def disable(self) -> None:
+        """
+        Stops recording spans. Recorded events are kept.
+        """
+        self.enabled = False
+        if self.track_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.track_memory = False
+
+    def span(self, name: str, rows: int | None = None):
+        """
+        Creates a context manager that records a span around a stage
+
+        Inputs:
+            * name: (string) Name of the stage, e.g., "DataLoader.load"
+            * rows: (int) Optional number of rows processed by the stage
+
+        Returns:
+            * span: (context manager) Yields a dict in which the stage can
+              set the number of rows it processed under "rows"
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+
+        return self._record_span(name, rows)
+
+    @contextlib.contextmanager
+    def _record_span(self, name: str, rows: int | None):
+        """
+        Records a span, see span
+        """
+        stack = self._stack()
+        frame = {"rows": rows, "peak": 0, "tid": threading.get_ident(),
+                 "concurrent": False}
+
+        # Spans open on other threads share the tracemalloc peak with this
+        # span, so none of their memory figures can be trusted
+        with self._lock:
+            for open_frame in self._open_frames.values():
+                if open_frame["tid"] != frame["tid"]:
+                    open_frame["concurrent"] = frame["concurrent"] = True
+            self._open_frames[id(frame)] = frame
+
+        memory_start = 0
+        if self.track_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            # Keep the parent's peak before resetting it for this span
+            if stack:
+                stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+            tracemalloc.reset_peak()
+            memory_start = current
+
+        stack.append(frame)
+        profiler = self._start_profiler(name)
+        start_time = time.perf_counter()
+        try:
+            yield frame
+        finally:
+            duration = time.perf_counter() - start_time
+            self._stop_profiler(profiler)
+            stack.pop()
+            with self._lock:
+                del self._open_frames[id(frame)]
+
+            event = {
+                "name": name,
+                "start": start_time - self._origin,
+                "duration": duration,
+                "rows": frame["rows"],
+                "depth": len(stack),
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+            }
+            if self.track_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                frame["peak"] = max(frame["peak"], peak)
+                if stack:
+                    stack[-1]["peak"] = max(stack[-1]["peak"], frame["peak"])
+                event["memory_delta_bytes"] = None if frame["concurrent"] \
+                    else current - memory_start
+                event["memory_peak_bytes"] = None if frame["concurrent"] \
+                    else frame["peak"] - memory_start
+
+            self.events.append(event)
+
+    def export_jsonl(self, path: str) -> None:
+        """
+        Writes one JSON object per span
+
+        Inputs:
+            * path: (string) File to write
+        """
+        with open(path, "w", encoding="utf-8") as file:
+            for event in self.events:
+                file.write(json.dumps(event) + "\n")
+
+    def export_chrome_trace(self, path: str) -> None:
+        """
+        Writes the spans in the Chrome trace event format, which can be
+        opened in chrome://tracing or Perfetto
+
+        Inputs:
+            * path: (string) File to write
+        """
+        trace_events = [{
+            "name": event["name"],
+            "ph": "X",
+            "ts": event["start"] * 1e6,
+            "dur": event["duration"] * 1e6,
+            "pid": event["pid"],
+            "tid": event["tid"],
+            "args": {key: value for key, value in event.items()
+                     if key.startswith(("rows", "memory"))},
+        } for event in self.events]
+
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({"traceEvents": trace_events,
+                       "displayTimeUnit": "ms"}, file)
+
+    def _stack(self) -> list[dict]:
+        """
+        Returns:
+            * stack: (list(dict)) Open spans of the current thread
+        """
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def _start_profiler(self, name: str):
+        """
+        Starts profiling if the span is the stage being profiled
+        """
+        if name != self._profile_stage:
+            return None
+
+        if self._profiler == "pyinstrument":
+            # pyinstrument is optional, so only import it when it is used
+            from pyinstrument import Profiler
+            profiler = Profiler()
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        return profiler
+
+    def _stop_profiler(self, profiler) -> None:
+        """
+        Stops a profiler started by _start_profiler and writes its profile
+        """
+        if profiler is None:
+            return
+
+        if self._profiler == "pyinstrument":
+            profiler.stop()
+            with open(self._profile_path, "w", encoding="utf-8") as file:
+                file.write(profiler.output_html())
+        else:
+            profiler.disable()
+            profiler.dump_stats(self._profile_path)
+
+
+# Tracer shared by every module in the pipeline
+TRACER = Tracer()
+
+
+def _count_rows(value) -> int | None:
+    """
+    Returns:
+        * rows: (int or None) Length of a dataframe, series or array
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray)):
+        return len(value)
+    return None
+
+
+def traced(name: str):
+    """
+    Decorator that records a span named name each time the decorated
+    function is called. The number of rows is taken from the first
+    dataframe, series or array argument, or from the result if there is
+    none.
+
+    Inputs:
+        * name: (string) Name of the stage
+
+    Returns:
+        * decorator: (callable) The decorator
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not TRACER.enabled:
+                return func(*args, **kwargs)
+
+            rows = next((count for count in map(_count_rows, args)
+                         if count is not None), None)
+            with TRACER.span(name, rows) as span:
+                result = func(*args, **kwargs)
+                if span["rows"] is None:
+                    span["rows"] = _count_rows(result)
+            return result
+
+        return wrapper
+
+    return decorator
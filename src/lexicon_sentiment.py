@@ -0,0 +1,318 @@
+"""
+This module contains the LexiconSentimentAnalyzer class which computes VADER
+compound scores for a whole column of text at once with pandas string methods
+and NumPy, instead of running the VADER analyser on one text at a time. It
+reads the VADER lexicon directly and does not import NLTK.
+"""
+import re
+import string
+
+import numpy as np
+import pandas as pd
+
+# Constants of the VADER rules, see nltk.sentiment.vader.VaderConstants. They
+# are copied here so that the lexicon backend does not import NLTK.
+B_INCR = 0.293
+B_DECR = -0.293
+C_INCR = 0.733
+N_SCALAR = -0.74
+NORMALIZE_ALPHA = 15
+
+# Words that negate the sentiment of the words that follow them. Any word
+# containing "n't" also negates.
+NEGATE = {
+    "aint", "arent", "cannot", "cant", "couldnt", "darent", "didnt",
+    "doesnt", "ain't", "aren't", "can't", "couldn't", "daren't", "didn't",
+    "doesn't", "dont", "hadnt", "hasnt", "havent", "isnt", "mightnt",
+    "mustnt", "neither", "don't", "hadn't", "hasn't", "haven't", "isn't",
+    "mightn't", "mustn't", "neednt", "needn't", "never", "none", "nope",
+    "nor", "not", "nothing", "nowhere", "oughtnt", "shant", "shouldnt",
+    "uhuh", "wasnt", "werent", "oughtn't", "shan't", "shouldn't", "uh-uh",
+    "wasn't", "weren't", "without", "wont", "wouldnt", "won't", "wouldn't",
+    "rarely", "seldom", "despite",
+}
+
+# Words that increase or decrease the sentiment of the words that follow them
+BOOSTER_INCR = {
+    "absolutely", "amazingly", "awfully", "completely", "considerably",
+    "decidedly", "deeply", "effing", "enormously", "entirely", "especially",
+    "exceptionally", "extremely", "fabulously", "flippin", "flipping",
+    "frickin", "fricking", "friggin", "frigging", "fucking", "fully",
+    "greatly", "hella", "highly", "hugely", "incredibly", "intensely",
+    "majorly", "more", "most", "particularly", "purely", "quite", "really",
+    "remarkably", "so", "substantially", "thoroughly", "totally",
+    "tremendously", "uber", "unbelievably", "unusually", "utterly", "very",
+}
+BOOSTER_DECR = {
+    "almost", "barely", "hardly", "kind-of", "kinda", "kindof", "less",
+    "little", "marginally", "occasionally", "partly", "scarcely", "slightly",
+    "somewhat", "sort-of", "sorta", "sortof",
+}
+BOOSTER_BIGRAMS = {("kind", "of"), ("sort", "of"), ("just", "enough")}
+
+# Punctuation stripped from the start or end of a word, see
+# nltk.sentiment.vader.SentiText
+PUNC_LIST = [".", "!", "?", ",", ";", ":", "-", "'", '"', "!!", "!!!", "??",
+             "???", "?!?", "!?!", "?!?!", "!?!?"]
+_PUNC = "|".join(re.escape(punc) for punc in PUNC_LIST)
+_WORD = f"[^{re.escape(string.punctuation)}]{{2,}}"
+LEADING_PUNC_PATTERN = re.compile(f"^(?:{_PUNC})({_WORD})$")
+TRAILING_PUNC_PATTERN = re.compile(f"^({_WORD})(?:{_PUNC})$")
+
+# Words compared case sensitively by the VADER rules
+CASED_WORDS = ["never", "so", "this", "kind", "sort", "just", "of", "enough"]
+
+# Number of texts tokenised at a time, which bounds the memory used by the
+# token arrays
+CHUNK_TEXTS = 100_000
+
+
+class LexiconSentimentAnalyzer():
+    """
+    The LexiconSentimentAnalyzer reproduces the VADER compound score with
+    array operations over every token of a batch of texts. The texts are
+    split into one flat array of tokens, the tokens are looked up in a hash
+    index of the lexicon, booster and negation words, and the VADER rules
+    are applied by comparing each token with the tokens one to three places
+    before it in the same text. The valences are then summed per text with a
+    segment reduction and normalised into the compound score.
+
+    The capitalisation, booster, negation, "never so", "least", "kind of" and
+    "but" rules and the punctuation emphasis are applied as VADER applies
+    them, including VADER's use of the first occurrence of a repeated word as
+    its context. VADER's handful of special case idioms, e.g., "the bomb",
+    are not applied, so texts containing them may score differently.
+
+    Attributes:
+        * self.lexicon_path: (string)
+        * self.lexicon_size: (int)
+
+    Methods:
+        * compound_scores
+    """
+
+    def __init__(self, lexicon_path: str) -> None:
+        """
+        Init function for the LexiconSentimentAnalyzer class
+
+        Inputs:
+            * lexicon_path: (string) Path to a vader_lexicon.txt file
+        """
+        self.lexicon_path = lexicon_path
+
+        # Parse the lexicon the way VADER does, the last entry of a repeated
+        # word wins
+        lexicon = {}
+        with open(lexicon_path, encoding="utf-8") as file:
+            for line in file.read().split("\n"):
+                if line.strip():
+                    word, measure = line.strip().split("\t")[0:2]
+                    lexicon[word] = float(measure)
+        self.lexicon_size = len(lexicon)
+
+        # One hash index over every word a rule looks up, with one row per
+        # word in each lookup table and a final row for unknown words
+        vocabulary = sorted(lexicon.keys() | NEGATE | BOOSTER_INCR
+                            | BOOSTER_DECR | {"least", "at", "very", "but",
+                                              "kind", "of"})
+        self._vocabulary = pd.Index(vocabulary)
+        self._unknown = len(vocabulary)
+
+        words = pd.Series([*vocabulary, ""])
+        self._valences = words.map(lexicon).to_numpy(dtype=np.float64)
+        self._in_lexicon = ~np.isnan(self._valences)
+        self._boosters = np.select(
+            [words.isin(BOOSTER_INCR), words.isin(BOOSTER_DECR)],
+            [B_INCR, B_DECR], default=0.0)
+        self._negations = words.isin(NEGATE).to_numpy()
+        self._word_flags = {word: (words == word).to_numpy()
+                            for word in ["least", "at", "very", "but",
+                                         "kind", "of"]}
+
+        self._cased_words = pd.Index(CASED_WORDS)
+
+    def compound_scores(self, texts: list[str] | np.ndarray) -> np.ndarray:
+        """
+        Computes the VADER compound score of every text
+
+        Inputs:
+            * texts: (list(string) or np.ndarray) Texts to score
+
+        Returns:
+            * compound_scores: (np.ndarray) float64 compound score per text
+        """
+        texts = pd.Series(texts, dtype=object)
+        if len(texts) <= CHUNK_TEXTS:
+            return self._score_chunk(texts)
+
+        return np.concatenate([
+            self._score_chunk(texts.iloc[start:start + CHUNK_TEXTS]
+                              .reset_index(drop=True))
+            for start in range(0, len(texts), CHUNK_TEXTS)])
+
+    def _score_chunk(self, texts: pd.Series) -> np.ndarray:
+        """
+        Computes the compound scores of a chunk of texts with a RangeIndex
+        """
+        num_texts = len(texts)
+
+        # Split every text into one flat array of tokens, keeping the index
+        # of the text each token came from. Each distinct token is processed
+        # once: single characters are dropped, one leading or trailing
+        # punctuation mark is stripped and the resulting words are looked up
+        # in the hash index.
+        tokens = texts.str.split().explode()
+        token_ids, distinct_tokens = pd.factorize(tokens)
+        distinct_tokens = pd.Series(distinct_tokens, dtype=object)
+        keep = np.append(distinct_tokens.str.len().to_numpy() > 1, False)
+        keep = keep[token_ids]
+        text_ids = tokens.index.to_numpy(dtype=np.int64)[keep]
+        num_tokens = len(text_ids)
+
+        compound_scores = np.zeros(num_texts, dtype=np.float64)
+        if num_tokens == 0:
+            return compound_scores
+
+        stripped = distinct_tokens \
+            .str.replace(LEADING_PUNC_PATTERN, r"\1", regex=True) \
+            .str.replace(TRAILING_PUNC_PATTERN, r"\1", regex=True)
+        stripped_ids, words = pd.factorize(stripped)
+        word_ids = stripped_ids[token_ids[keep]]
+
+        words = pd.Series(words, dtype=object)
+        lower = words.str.lower()
+        codes = self._vocabulary.get_indexer(lower)
+        codes[codes < 0] = self._unknown
+        negated = (self._negations[codes] |
+                   lower.str.contains("n't", regex=False).to_numpy())[word_ids]
+        is_upper = words.str.isupper().to_numpy()[word_ids]
+        cased_codes = self._cased_words.get_indexer(words)[word_ids]
+        codes = codes[word_ids]
+
+        # Position of each token within its text
+        text_lengths = np.bincount(text_ids, minlength=num_texts)
+        text_starts = np.cumsum(text_lengths) - text_lengths
+        positions = np.arange(num_tokens) - text_starts[text_ids]
+
+        num_upper = np.bincount(text_ids, weights=is_upper.astype(float),
+                                minlength=num_texts)
+        is_cap_diff = ((num_upper > 0) & (num_upper < text_lengths))[text_ids]
+        capitalised = is_upper & is_cap_diff
+
+        in_lexicon = self._in_lexicon[codes]
+        boosters = self._boosters[codes]
+        is_never = cased_codes == CASED_WORDS.index("never")
+        is_so_this = np.isin(cased_codes, [CASED_WORDS.index("so"),
+                                           CASED_WORDS.index("this")])
+        is_bigram_start = {word: cased_codes == CASED_WORDS.index(word)
+                           for word in ["kind", "sort", "just"]}
+        is_bigram_end = {word: cased_codes == CASED_WORDS.index(word)
+                         for word in ["of", "enough"]}
+        is_bigram = np.zeros(num_tokens, dtype=bool)
+        for first, second in BOOSTER_BIGRAMS:
+            is_bigram[:-1] |= is_bigram_start[first][:-1] & \
+                is_bigram_end[second][1:]
+        is_bigram &= positions < text_lengths[text_ids] - 1
+
+        def before(values: np.ndarray, offset: int) -> np.ndarray:
+            """
+            Value of the token offset places before each token, only valid
+            where the token's position is at least offset
+            """
+            shifted = np.zeros_like(values)
+            shifted[offset:] = values[:-offset]
+            return shifted
+
+        # Valence of each sentiment laden word, emphasised by capitals
+        valences = np.where(in_lexicon, self._valences[codes], 0.0)
+        valences += np.where(in_lexicon & capitalised,
+                             np.where(valences > 0, C_INCR, -C_INCR), 0.0)
+
+        # Boosters and negations among the three preceding words, VADER's
+        # sentiment_valence and _never_check
+        for offset, damping in [(1, 1.0), (2, 0.95), (3, 0.9)]:
+            applies = in_lexicon & (positions >= offset) & \
+                ~before(in_lexicon, offset)
+
+            scalars = np.where(valences < 0, -1.0, 1.0) * \
+                before(boosters, offset)
+            scalars += np.where(before(capitalised, offset) &
+                                (before(boosters, offset) != 0),
+                                np.where(valences > 0, C_INCR, -C_INCR), 0.0)
+            valences = np.where(applies, valences + scalars * damping,
+                                valences)
+
+            if offset == 1:
+                multipliers = np.where(before(negated, 1), N_SCALAR, 1.0)
+            elif offset == 2:
+                multipliers = np.select(
+                    [before(is_never, 2) & before(is_so_this, 1),
+                     before(negated, 2)], [1.5, N_SCALAR], default=1.0)
+            else:
+                multipliers = np.select(
+                    [before(is_never, 3) & before(is_so_this, 2) |
+                     before(is_so_this, 1), before(negated, 3)],
+                    [1.25, N_SCALAR], default=1.0)
+            valences = np.where(applies, valences * multipliers, valences)
+
+            # Booster bigrams such as "kind of", VADER's _idioms_check
+            if offset == 3:
+                valences = np.where(
+                    applies & (before(is_bigram, 3) | before(is_bigram, 2)),
+                    valences + B_DECR, valences)
+
+        # "least" negates the following word unless it follows "at" or "very"
+        flags = self._word_flags
+        after_least = in_lexicon & (positions >= 1) & \
+            before(flags["least"][codes] & ~in_lexicon, 1)
+        at_least = (positions >= 2) & \
+            before(flags["at"][codes] | flags["very"][codes], 2)
+        valences = np.where(after_least & ~at_least, valences * N_SCALAR,
+                            valences)
+
+        # Booster words, and "kind" followed by "of", carry no sentiment
+        kind_of = flags["kind"][codes]
+        kind_of[:-1] &= flags["of"][codes][1:]
+        kind_of[-1] = False
+        kind_of &= positions < text_lengths[text_ids] - 1
+        valences[(boosters != 0) | kind_of] = 0.0
+
+        # VADER scores a repeated word in the context of its first occurrence
+        # within the text
+        _, first_index, inverse = np.unique(
+            text_ids * len(words) + word_ids,
+            return_index=True, return_inverse=True)
+        valences = valences[first_index[inverse]]
+
+        # Words before the first "but" are halved and words after it are
+        # increased by half
+        is_but = flags["but"][codes]
+        but_positions = np.full(num_texts, num_tokens)
+        np.minimum.at(but_positions, text_ids[is_but], positions[is_but])
+        but_positions = but_positions[text_ids]
+        has_but = but_positions < num_tokens
+        valences *= np.select([has_but & (positions < but_positions),
+                               has_but & (positions > but_positions)],
+                              [0.5, 1.5], default=1.0)
+
+        # Sum the valences of each text and add the punctuation emphasis. The
+        # marks are counted once per distinct token, including the dropped
+        # single characters, and summed per text.
+        sums = np.bincount(text_ids, weights=valences, minlength=num_texts)
+        all_text_ids = tokens.index.to_numpy(dtype=np.int64)[token_ids >= 0]
+        all_token_ids = token_ids[token_ids >= 0]
+        exclamations, questions = (
+            np.bincount(all_text_ids, minlength=num_texts, weights=(
+                distinct_tokens.str.count(pattern).to_numpy(dtype=float)
+                [all_token_ids]))
+            for pattern in ["!", r"\?"])
+        questions = np.select([questions > 3, questions > 1],
+                              [0.96, questions * 0.18], default=0.0)
+        sums += np.sign(sums) * (np.minimum(exclamations, 4) * 0.292 +
+                                 questions)
+
+        compound_scores = np.round(
+            sums / np.sqrt(sums * sums + NORMALIZE_ALPHA), 4)
+        compound_scores[text_lengths == 0] = 0.0
+
+        return compound_scores
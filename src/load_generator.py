@@ -0,0 +1,150 @@
+"""
+This module sends concurrent single customer scoring requests to a running
+ScoringServer and reports the latency and throughput seen by the clients,
+along with the metrics reported by the server.
+
+Usage:
+    python scoring_server.py --model-dir models/XGB &
+    python load_generator.py --requests 10000 --concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+from scoring_server import read_http_message
+from synthetic_data import generate_customer_data
+
+# Columns of the customer data that are not sent with a request
+EXCLUDED_FIELDS = ["Exited"]
+
+
+def build_requests(num_records: int, seed: int = 42) -> list[bytes]:
+    """
+    Builds one JSON body per synthetic customer
+
+    Inputs:
+        * num_records: (int) Number of distinct customers
+        * seed: (int) Seed for the synthetic data
+
+    Returns:
+        * bodies: (list(bytes)) Encoded JSON records
+    """
+    customer_data = generate_customer_data(num_records, seed) \
+        .drop(columns=EXCLUDED_FIELDS)
+    customer_data = customer_data.astype(object).where(
+        customer_data.notna(), None)
+
+    return [json.dumps(record).encode()
+            for record in customer_data.to_dict(orient="records")]
+
+
+async def http_request(reader: asyncio.StreamReader,
+                       writer: asyncio.StreamWriter, method: str, path: str,
+                       host: str, body: bytes = b"") -> tuple[int, bytes]:
+    """
+    Sends a request on a keep-alive connection and reads its response
+
+    Returns:
+        * status: (int) HTTP status code
+        * body: (bytes) Response body
+    """
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: {host}\r\n"
+                 f"Content-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1")
+                 + body)
+    await writer.drain()
+
+    start_line, _, response_body = await read_http_message(reader)
+
+    return int(start_line.split()[1]), response_body
+
+
+async def run_load(host: str, port: int, bodies: list[bytes],
+                   num_requests: int, concurrency: int) -> dict:
+    """
+    Sends num_requests scoring requests over concurrency connections, each
+    sending its next request as soon as the previous one is answered
+
+    Returns:
+        * report: (dict) Client side latency percentiles, throughput and
+          error count, along with the server's metrics
+    """
+    latencies = []
+    errors = 0
+    next_request = 0
+
+    async def client() -> None:
+        nonlocal errors, next_request
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            while next_request < num_requests:
+                body = bodies[next_request % len(bodies)]
+                next_request += 1
+
+                start_time = time.perf_counter()
+                status, _ = await http_request(reader, writer, "POST",
+                                               "/score", host, body)
+                latencies.append(time.perf_counter() - start_time)
+                if status != 200:
+                    errors += 1
+        finally:
+            writer.close()
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    seconds = time.perf_counter() - start_time
+
+    reader, writer = await asyncio.open_connection(host, port)
+    _, metrics_body = await http_request(reader, writer, "GET", "/metrics",
+                                         host)
+    writer.close()
+
+    p50_ms, p99_ms = (np.percentile(latencies, [50, 99]) * 1e3).tolist()
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": seconds,
+        "requests_per_second": len(latencies) / seconds,
+        "p50_ms": p50_ms,
+        "p99_ms": p99_ms,
+        "server": json.loads(metrics_body),
+    }
+
+
+def main(argv: list[str] | None = None) -> dict:
+    """
+    Runs the load generator from the command line
+
+    Returns:
+        * report: (dict) See run_load
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--requests", type=int, default=10_000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--distinct-records", type=int, default=1_000)
+    args = parser.parse_args(argv)
+
+    bodies = build_requests(args.distinct_records)
+    report = asyncio.run(run_load(args.host, args.port, bodies,
+                                  args.requests, args.concurrency))
+
+    server = report["server"]
+    print(f"Client: {report['requests']} requests in "
+          f"{report['seconds']:.2f}s ({report['requests_per_second']:.0f} "
+          f"req/s), p50 {report['p50_ms']:.2f} ms, p99 "
+          f"{report['p99_ms']:.2f} ms, {report['errors']} errors")
+    print(f"Server: p50 {server['p50_ms']:.2f} ms, p99 "
+          f"{server['p99_ms']:.2f} ms, mean batch size "
+          f"{server['mean_batch_size']:.1f}")
+
+    return report
+
+
+if __name__ == "__main__":
+    main()
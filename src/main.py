@@ -1,25 +1,131 @@
 """
 Main file for running data analysis on the churn data as well as training and
-evaluating a model on the churn data. 
+evaluating a model on the churn data.
+
+Each stage is a node of a Pipeline with declared inputs. The cleaned data is
+loaded once and shared by the analysis and training branches, which run
+concurrently when figures are rendered headlessly. Nodes whose inputs have not
+changed since the last run are loaded from the cache instead of being rerun.
+
+The modelling libraries are imported by the training functions, so that
+running only the analysis, e.g., with cli.py analyze, does not import them.
 """
-from sklearn.model_selection import train_test_split
+import copy
+import functools
+import os
+from typing import TYPE_CHECKING
 
+import pandas as pd
+
+from backends import LAZY_EXTENSIONS, PandasBackend
 from data_analysis import DataAnalysis
 from data_loader import DataLoader
-from model import MachineLearningModel
-
-
-def perform_data_analysis():
+from encoder import CategoryEncoder
+from features import FeatureBuilder
+from instrumentation import TRACER
+from pipeline import Pipeline
+from rendering import FigureRenderer
+
+if TYPE_CHECKING:
+    from backends import DuckDBBackend
+    from model import MachineLearningModel
+
+# Location of the customer data
+DATASET_PATH = "customer_data.xlsx"
+
+# Location of the cached pipeline outputs shared between runs
+CACHE_DIR = ".churn_cache"
+
+# Location of the fitted preprocessing state and models
+MODEL_DIR = "models"
+
+# When HEADLESS is True figures are rendered with the Agg backend in
+# FIGURE_WORKERS processes and saved to FIGURES_DIR instead of being shown,
+# and up to PIPELINE_WORKERS pipeline nodes run at the same time. Interactive
+# runs only show figures. FIGURES_DIR is kept apart from the Figures directory
+# of the README so runs do not overwrite its images.
+FIGURES_DIR = "figures_output"
+HEADLESS = False
+FIGURE_WORKERS = 4
+PIPELINE_WORKERS = 4
+
+# Backend the analysis aggregations run on. "pandas" uses the cleaned data in
+# memory, while "duckdb" runs them as queries over the dataset file, which
+# must then be a Parquet or CSV file, without loading it. The duckdb backend
+# also extracts the ids of the train and test splits.
+ANALYSIS_BACKEND = "pandas"
+
+# Type of model to train and strategy used to correct the imbalance between
+# stayed and exited customers
+MODEL_TYPE = "XGB"
+RESAMPLING_STRATEGY = "none"
+
+# Columns encoded as integers, scored for sentiment and dropped before
+# training
+COLS_TO_ENCODE = ['Country', 'Gender']
+SENTIMENT_COL = 'CustomerFeedback'
+
+# Backend that computes the sentiment compound scores, "vader" or the faster
+# vectorised "lexicon" backend, see SentimentEngine. The backend is saved with
+# the model so that new customers are scored the same way.
+SENTIMENT_BACKEND = "vader"
+DROP_COLS = ['RowNumber', 'CustomerId', 'Surname']
+
+# Column identifying each customer and percentage of customers in the test
+# split
+ID_COL = 'CustomerId'
+TEST_PERCENT = 30
+
+# If True then the configurations in COMPARISON_CONFIGS are also trained side
+# by side on the same split and compared in COMPARISON_FILE, see
+# ModelComparison. The non-SENTIMENT configurations are trained without the
+# sentiment columns.
+COMPARE_MODELS = False
+COMPARISON_ENSEMBLE = True
+COMPARISON_FILE = "model_comparison.csv"
+SENTIMENT_FEATURES = [SENTIMENT_COL, f"{SENTIMENT_COL}Compound"]
+COMPARISON_CONFIGS = [
+    {"name": "RF", "model_type": "RF", "drop_features": SENTIMENT_FEATURES},
+    {"name": "XGB", "model_type": "XGB",
+     "drop_features": SENTIMENT_FEATURES},
+    {"name": "SMOTE_RF", "model_type": "RF", "resampling": "smote",
+     "drop_features": SENTIMENT_FEATURES},
+    {"name": "SMOTE_XGB", "model_type": "XGB", "resampling": "smote",
+     "drop_features": SENTIMENT_FEATURES},
+    {"name": "SENTIMENT_RF", "model_type": "RF"},
+    {"name": "SENTIMENT_XGB", "model_type": "XGB"},
+]
+
+# If True then the saved model is updated from the new and changed customers
+# in the dataset, instead of running the full pipeline. The first update
+# trains the model from scratch.
+INCREMENTAL_UPDATE = False
+
+# If set then every stage is traced and the trace is written to this file in
+# the Chrome trace format. PROFILE_STAGE optionally names a stage, e.g.,
+# "DataLoader.apply_sentiment_analysis", to profile with cProfile.
+TRACE_FILE = None
+PROFILE_STAGE = None
+
+
+def create_renderer() -> FigureRenderer:
     """
-    This function loads in the churn customer data and creates a DataAnalysis
-    object for gaining insights to the data. 
+    Creates the renderer used for every figure in a run
     """
-    # Load and clean the data
-    dataloader = DataLoader("customer_data.xlsx")
-    customer_data = dataloader.load_and_clean()
+    if HEADLESS:
+        return FigureRenderer(FIGURES_DIR, headless=True,
+                              n_workers=FIGURE_WORKERS)
+
+    return FigureRenderer()
 
-    data_analysis = DataAnalysis()
 
+def describe_data(analysis_data: PandasBackend) -> None:
+    """
+    Outputs descriptions of the numerical and categorical customer data
+
+    Inputs:
+        * analysis_data: (PandasBackend or DuckDBBackend) The customer data
+    """
     # Split the data up into categorical and numerical data
     numerical_cols = ['CreditScore', 'Age', 'Tenure', 'Balance (EUR)',
                       'NumberOfProducts', 'HasCreditCard', 'IsActiveMember',
@@ -27,133 +133,396 @@ def perform_data_analysis():
 
     categorical_cols = ['Surname', 'Country', 'Gender', 'CustomerFeedback']
 
-    customer_cat = customer_data[categorical_cols]
+    customer_cat = analysis_data.describe(categorical_cols, categorical=True)
 
-    customer_num = customer_data[numerical_cols]
+    customer_num = analysis_data.describe(numerical_cols)
 
     # Output descriptions for both the numerical and categorical data
     print(f"Numerical Customer Data Description: \
-                    \n{customer_num.describe()}\n")
+                    \n{customer_num}\n")
     print(f"Categorical Customer Data Description: \
-                    \n{customer_cat.describe(exclude=['int64', 'float64'])}\n")
+                    \n{customer_cat}\n")
 
     # Get ratio of ground truth labels
     print(f"Ratio of exited vs stayed in data: \
-          \n{customer_data['Exited'].value_counts()}\n")
+          \n{analysis_data.value_counts('Exited')}\n")
 
-    # Create a group box plot for numerical data, showing the mean and data
-    # distribution
+
+def combine_analysis_data(customer_data: pd.DataFrame,
+                          derived_features: pd.DataFrame) -> PandasBackend:
+    """
+    Combines the cleaned data and derived features into the in-memory backend
+    the analysis runs on
+    """
+    return PandasBackend(pd.concat([customer_data, derived_features],
+                                   axis=1))
+
+
+def plot_distributions(data_analysis: DataAnalysis,
+                       analysis_data: PandasBackend) -> None:
+    """
+    Creates a group box plot for numerical data, showing the mean and data
+    distribution
+
+    Inputs:
+        * data_analysis: (DataAnalysis) Analysis used to draw the figure
+        * analysis_data: (PandasBackend or DuckDBBackend) The customer data
+    """
     cols_of_interest = ['CreditScore', 'Age', 'Tenure', 'Balance (EUR)',
                         'EstimatedSalary']
 
-    data_analysis.group_box_plot(customer_data, cols_of_interest, num_cols=2)
+    data_analysis.group_box_plot(analysis_data, cols_of_interest, num_cols=2)
 
-    # The following plots compare the customers who exited vs those that stayed
-    # against a chosen column
 
+def plot_breakdowns(data_analysis: DataAnalysis,
+                    analysis_data: PandasBackend) -> None:
+    """
+    Compares the customers who exited vs those that stayed against a chosen
+    column. Derived columns are taken from the derived features and rows are
+    selected with filters, so the data is never modified or copied.
+
+    Inputs:
+        * data_analysis: (DataAnalysis) Analysis used to draw the figures
+        * analysis_data: (PandasBackend or DuckDBBackend) The customer data
+          with the derived features
+    """
     # Plot ratio of exited customers based on estimated salaries (rounded to
     # nearest 10,000)
-    customer_data['EstimatedSalary'] = customer_data['EstimatedSalary']. \
-        round(decimals=-4)
-    customer_stayed_split = customer_data.loc[customer_data['Exited'] == 0]
-    customer_exited_split = customer_data.loc[customer_data['Exited'] == 1]
-    splits = {
-        'Stayed': customer_stayed_split,
-        'Exited': customer_exited_split
-    }
     title = "Retention Against Estimated Salary To Nearest Ten Thousand"
     save_name = "estimated_salary.png"
-    data_analysis.compare_splits_against_col(splits, "EstimatedSalary", title,
-                                             save_name)
+    data_analysis.compare_label_against_col(analysis_data, "SalaryBand",
+                                            title=title, save_name=save_name)
 
     # Plot the ratio of exited customers based on year of service
     title = "Retention of Customers Based on Time With Service"
     save_name = "tenure.png"
-    data_analysis.compare_splits_against_col(
-        splits, "Tenure", title, save_name)
-
-    # Plot the ratio of exited customers based on whether their balance is >0 or
-    # not. The balance of all customers with a balance >0 is set to 1
-    customer_data['Balance (EUR)'].values[customer_data['Balance (EUR)'].values
-                                          > 0] = 1
-    customer_stayed_split = customer_data.loc[customer_data['Exited'] == 0]
-    customer_exited_split = customer_data.loc[customer_data['Exited'] == 1]
-    splits = {
-        'Stayed': customer_stayed_split,
-        'Exited': customer_exited_split
-    }
+    data_analysis.compare_label_against_col(analysis_data, "Tenure",
+                                            title=title, save_name=save_name)
+
+    # Plot the ratio of exited customers based on whether their balance is 0
+    # (1) or >0 (0)
     title = "Retention of Customers With a Balance of 0 or >0"
     save_name = "binary_balance.png"
-    data_analysis.compare_splits_against_col(splits, "Balance (EUR)", title,
-                                             save_name)
+    data_analysis.compare_label_against_col(analysis_data, "ZeroBalance",
+                                            title=title, save_name=save_name)
 
     # Plot the ratio of exited customers with a balance of 0 based on whether
     # they are active or not
-    customer_stayed_split = customer_data[(customer_data['Balance (EUR)'] == 0)
-                                          & (customer_data['Exited'] == 0)]
-    customer_exited_split = customer_data[(customer_data['Balance (EUR)'] == 0)
-                                          & (customer_data['Exited'] == 1)]
-    splits = {
-        'Stayed': customer_stayed_split,
-        'Exited': customer_exited_split
-    }
     title = "Retention of Active Customers With a Balance of 0"
     save_name = "zero_balance_active.png"
-    data_analysis.compare_splits_against_col(splits, "IsActiveMember", title,
-                                             save_name)
+    data_analysis.compare_label_against_col(
+        analysis_data, "IsActiveMember",
+        filters=[("ZeroBalance", "==", 1)], title=title,
+        save_name=save_name)
 
     # Output mean age for those that have and have not left the company
-    data_analysis.compare_mean_against_exited(customer_data, 'Age')
+    data_analysis.compare_mean_against_exited(analysis_data, 'Age')
 
 
-def perform_model_training():
+def build_features(feature_builder: FeatureBuilder,
+                   customer_data: pd.DataFrame) -> pd.DataFrame:
     """
-    This function loads in the churn customer data and creates a
-    MachineLearningModel object in order to train a classifier on the data and
-    evaluate its results. 
+    Builds the derived features shared by the analysis and training, reusing
+    the cached feature matrix when the data is unchanged
     """
-    # Load and clean the data
-    dataloader = DataLoader("customer_data.xlsx")
-    customer_data = dataloader.load_and_clean()
+    return feature_builder.to_frame(feature_builder.build(customer_data),
+                                    customer_data.index)
 
-    # Encode string type columns that can be easily done so
-    cols_to_encode = ['Country', 'Gender']
-    encoded_data = dataloader.apply_label_encoding(customer_data,
-                                                   cols_to_encode)
 
-    sentiment_data = dataloader.apply_sentiment_analysis(encoded_data,
-                                                         ['CustomerFeedback'])
+def label_encoded_cols() -> list[str]:
+    """
+    Returns:
+        * cols: (list(string)) Columns of COLS_TO_ENCODE that are label
+          encoded before training. XGBC models treat the string columns as
+          native categorical features, so they are left as strings.
+    """
+    return [] if MODEL_TYPE == "XGBC" else COLS_TO_ENCODE
+
+
+def fit_encoder(customer_data: pd.DataFrame) -> CategoryEncoder:
+    """
+    Fits the encoding of the string type columns that can be easily encoded
+    """
+    return CategoryEncoder().fit(customer_data, label_encoded_cols())
+
+
+def encode_data(dataloader: DataLoader, customer_data: pd.DataFrame,
+                encoder: CategoryEncoder) -> pd.DataFrame:
+    """
+    Encodes a copy of the customer data with the fitted encoder
+    """
+    return dataloader.apply_label_encoding(customer_data.copy(),
+                                           label_encoded_cols(), encoder)
+
+
+def score_sentiment(dataloader: DataLoader,
+                    encoded_data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Applies sentiment analysis to a copy of the customer feedback
+    """
+    return dataloader.apply_sentiment_analysis(encoded_data.copy(),
+                                               SENTIMENT_COL)
+
+
+def split_ids(analysis_data: "DuckDBBackend") -> tuple:
+    """
+    Extracts the ids of the customers in the train and test splits with a
+    query over the dataset, which only reads the id column
+
+    Returns:
+        * split_ids: (tuple) Train ids and test ids
+    """
+    train, test = analysis_data.split(ID_COL, TEST_PERCENT, [ID_COL])
+
+    return train[ID_COL].to_numpy(), test[ID_COL].to_numpy()
+
+
+def split_data(sentiment_data: pd.DataFrame,
+               derived_features: pd.DataFrame,
+               ids: tuple | None = None) -> tuple:
+    """
+    Creates train test splits from the preprocessed customer data and the
+    derived features
+
+    Inputs:
+        * sentiment_data: (pd.DataFrame) The preprocessed customer data
+        * derived_features: (pd.DataFrame) The derived features
+        * ids: (tuple) Optional train and test ids from split_ids. If None
+          then the customers are split at random.
+
+    Returns:
+        * splits: (tuple) x_train, x_test, y_train and y_test
+    """
+    from sklearn.model_selection import train_test_split
 
     # Remove columns that cannot be easily converted to a type the model can
     # extract meaningful information from
-    drop_cols = ['RowNumber', 'CustomerId', 'Surname']
-    reduced_data = sentiment_data.drop(columns=drop_cols)
+    reduced_data = pd.concat([sentiment_data.drop(columns=DROP_COLS),
+                              derived_features], axis=1)
 
     # Separated labels from input data
     x = reduced_data.drop(columns=['Exited'])
     y = reduced_data['Exited']
 
-    # Create train test splits
-    x_train, x_test, y_train, y_test =  \
-        train_test_split(x, y, test_size=0.3, random_state=42)
+    if ids is None:
+        return tuple(train_test_split(x, y, test_size=TEST_PERCENT / 100,
+                                      random_state=42))
+
+    train_ids, test_ids = ids
+    in_train = sentiment_data[ID_COL].isin(train_ids).to_numpy()
+    in_test = sentiment_data[ID_COL].isin(test_ids).to_numpy()
+
+    return x[in_train], x[in_test], y[in_train], y[in_test]
+
+
+def train_model(splits: tuple) -> "MachineLearningModel":
+    """
+    Trains a MachineLearningModel of MODEL_TYPE on the training split
+
+    Returns:
+        * machine_learning_model: (MachineLearningModel) The fitted model
+    """
+    from model import MachineLearningModel
+    from resampling import Resampler
+
+    x_train, x_test, y_train, y_test = splits
+
+    # Correct the class imbalance of the training data. The strategy can be
+    # "none", "smote", "undersample" or "class_weight"
+    resampler = Resampler(RESAMPLING_STRATEGY)
 
-    # Apply SMOTE
-    # oversample = SMOTE(k_neighbors=5)
-    # x_smote, y_smote = oversample.fit_resample(x_train, y_train)
-    # x_train, y_train = x_smote, y_smote
-    # print (y_train.value_counts())
-    model_type = "XGB"
     machine_learning_model = MachineLearningModel(x_train, x_test, y_train,
-                                                  y_test, model_type)
+                                                  y_test, MODEL_TYPE,
+                                                  resampler=resampler)
+    machine_learning_model.fit_and_predict()
+
+    return machine_learning_model
 
-    y_preds = machine_learning_model.fit_and_predict()
 
-    print(f"Performance of {model_type} classifier model: ")
+def evaluate_model(renderer: FigureRenderer,
+                   machine_learning_model: "MachineLearningModel",
+                   splits: tuple) -> None:
+    """
+    Outputs the performance of the trained model on the test split
+    """
+    _, x_test, _, y_test = splits
+
+    # Draw with this run's renderer without modifying the shared model
+    machine_learning_model = copy.copy(machine_learning_model)
+    machine_learning_model.renderer = renderer
+
+    y_preds = machine_learning_model.predict(x_test)
+
+    print(f"Performance of {MODEL_TYPE} classifier model: ")
     machine_learning_model.evaluate(y_preds, y_test)
 
 
+def compare_models(splits: tuple) -> "pd.DataFrame":
+    """
+    Trains every configuration in COMPARISON_CONFIGS on the split and writes
+    the comparison table to COMPARISON_FILE
+
+    Returns:
+        * results: (pd.DataFrame) The comparison table
+    """
+    from comparison import ModelComparison
+
+    # The compared models need numeric features, so encode any string
+    # columns that were left for XGBC
+    x_train, x_test, y_train, y_test = splits
+    string_cols = [col for col in COLS_TO_ENCODE
+                   if col not in label_encoded_cols()]
+    if string_cols:
+        encoder = CategoryEncoder().fit(x_train, string_cols)
+        x_train = encoder.transform(x_train.copy(), string_cols)
+        x_test = encoder.transform(x_test.copy(), string_cols)
+
+    comparison = ModelComparison(COMPARISON_CONFIGS,
+                                 ensemble=COMPARISON_ENSEMBLE)
+    results = comparison.run(x_train, x_test, y_train, y_test)
+    comparison.save(COMPARISON_FILE)
+
+    return results
+
+
+def save_model(feature_builder: FeatureBuilder,
+               machine_learning_model: "MachineLearningModel",
+               encoder: CategoryEncoder) -> None:
+    """
+    Saves the model with the fitted encoding and the derived feature specs so
+    that new customers can be scored with the same features without
+    retraining
+    """
+    preprocessing = {
+        "label_encoder": encoder.to_dict(),
+        "sentiment_col": SENTIMENT_COL,
+        "sentiment_backend": SENTIMENT_BACKEND,
+        "drop_cols": DROP_COLS,
+        "derived_features": feature_builder.specs,
+    }
+    machine_learning_model.save(os.path.join(MODEL_DIR, MODEL_TYPE),
+                                preprocessing)
+
+
+def update_model_incrementally() -> dict:
+    """
+    Updates the saved model from the new and changed customers in the dataset
+    and reports its accuracy drift against a full retrain
+
+    Returns:
+        * report: (dict) The IncrementalTrainer's report
+    """
+    from incremental import IncrementalTrainer
+
+    dataloader = DataLoader(DATASET_PATH, CACHE_DIR,
+                            sentiment_backend=SENTIMENT_BACKEND)
+    customer_data = dataloader.load_and_clean()
+
+    trainer = IncrementalTrainer(os.path.join(MODEL_DIR, MODEL_TYPE),
+                                 MODEL_TYPE, label_encoded_cols(),
+                                 SENTIMENT_COL, DROP_COLS,
+                                 dataloader=dataloader,
+                                 feature_builder=FeatureBuilder())
+
+    return trainer.update(customer_data)
+
+
+def build_pipeline(renderer: FigureRenderer) -> Pipeline:
+    """
+    Builds the pipeline of analysis and training nodes
+
+    Inputs:
+        * renderer: (FigureRenderer) Renderer used to draw figures
+
+    Returns:
+        * pipeline: (Pipeline) The pipeline, ready to run
+    """
+    if ANALYSIS_BACKEND != "pandas" and \
+            os.path.splitext(DATASET_PATH)[1].lower() not in LAZY_EXTENSIONS:
+        raise ValueError(f"The {ANALYSIS_BACKEND} analysis backend reads "
+                         f"files of type {LAZY_EXTENSIONS}, but the dataset "
+                         f"is {DATASET_PATH}. Convert it to Parquet or use "
+                         f"the pandas backend.")
+
+    dataloader = DataLoader(DATASET_PATH, CACHE_DIR,
+                            sentiment_backend=SENTIMENT_BACKEND)
+    data_analysis = DataAnalysis(renderer)
+    feature_builder = FeatureBuilder(cache_dir=os.path.join(CACHE_DIR,
+                                                            "features"))
+
+    # Nodes can only run concurrently when figures are drawn in worker
+    # processes, as pyplot is not thread safe
+    n_workers = PIPELINE_WORKERS if HEADLESS and FIGURE_WORKERS > 1 else 1
+    pipeline = Pipeline(os.path.join(CACHE_DIR, "pipeline"), n_workers)
+
+    # The cleaned dataset is cached by the DataLoader itself as Feather and
+    # memory-mapped on later runs
+    pipeline.add("clean", dataloader.load_and_clean, cache=False)
+
+    # The feature matrix is cached by the FeatureBuilder itself and
+    # memory-mapped on later runs
+    pipeline.add("features", functools.partial(build_features,
+                                               feature_builder),
+                 ["clean"], cache=False)
+
+    # Analysis branch. These nodes only print and plot so they always run. A
+    # lazy backend queries the dataset file, so the analysis never loads it.
+    if ANALYSIS_BACKEND == "pandas":
+        pipeline.add("analysis_data", combine_analysis_data,
+                     ["clean", "features"], cache=False)
+    else:
+        pipeline.add("analysis_data",
+                     functools.partial(dataloader.lazy, ANALYSIS_BACKEND,
+                                       feature_builder.specs), cache=False)
+    pipeline.add("describe", describe_data, ["analysis_data"], cache=False)
+    pipeline.add("distributions",
+                 functools.partial(plot_distributions, data_analysis),
+                 ["analysis_data"], cache=False)
+    pipeline.add("breakdowns",
+                 functools.partial(plot_breakdowns, data_analysis),
+                 ["analysis_data"], cache=False)
+
+    # Training branch
+    pipeline.add("encoder", fit_encoder, ["clean"],
+                 fingerprint=lambda: repr(label_encoded_cols()))
+    pipeline.add("encode", functools.partial(encode_data, dataloader),
+                 ["clean", "encoder"])
+    pipeline.add("sentiment", functools.partial(score_sentiment, dataloader),
+                 ["encode"],
+                 fingerprint=lambda: f"{SENTIMENT_COL}:{SENTIMENT_BACKEND}")
+    if ANALYSIS_BACKEND == "pandas":
+        pipeline.add("split", split_data, ["sentiment", "features"],
+                     fingerprint=lambda: repr(DROP_COLS))
+    else:
+        pipeline.add("split_ids", split_ids, ["analysis_data"], cache=False)
+        pipeline.add("split", split_data,
+                     ["sentiment", "features", "split_ids"],
+                     fingerprint=lambda: repr(DROP_COLS))
+    pipeline.add("train", train_model, ["split"],
+                 fingerprint=lambda: f"{MODEL_TYPE}:{RESAMPLING_STRATEGY}")
+    pipeline.add("evaluate", functools.partial(evaluate_model, renderer),
+                 ["train", "split"], cache=False)
+    pipeline.add("report", functools.partial(save_model, feature_builder),
+                 ["train", "encoder"], cache=False)
+    if COMPARE_MODELS:
+        pipeline.add("compare", compare_models, ["split"], cache=False)
+
+    return pipeline
+
+
 if __name__ == "__main__":
 
-    perform_data_analysis()
+    if TRACE_FILE is not None:
+        TRACER.enable(profile_stage=PROFILE_STAGE)
+
+    if INCREMENTAL_UPDATE:
+        update_model_incrementally()
+    else:
+        figure_renderer = create_renderer()
+
+        build_pipeline(figure_renderer).run()
+
+        figure_renderer.close()
 
-    perform_model_training()
+    if TRACE_FILE is not None:
+        TRACER.export_chrome_trace(TRACE_FILE)
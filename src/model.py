@@ -1,15 +1,47 @@
 """
 This module contains the MachineLearningModel class that allows a user to make
 predictions with a desired classification model and evaluate the results. 
+Fitted models can be saved together with their preprocessing state and loaded
+again for scoring without retraining. scikit-learn is only imported when a
+model is trained or evaluated, as scoring a saved model does not need it, and
+XGBoost only when an XGBoost model is created or loaded.
 """
-import matplotlib.pyplot as plt
+import json
+import os
+import time
+from collections.abc import Iterable, Iterator
+from typing import TYPE_CHECKING
+
+import joblib
 import pandas as pd
 import numpy as np
-import seaborn as sns
-import xgboost as xgb
-from imblearn.over_sampling import SMOTE
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import classification_report, confusion_matrix
+
+from encoder import CategoryEncoder
+from evaluation import StreamingMetrics
+from instrumentation import TRACER, PeakRSSSampler, traced
+from resampling import Resampler
+
+# The plotting libraries are only imported when a figure is drawn, and
+# XGBoost when an XGBoost model is used, so that scoring processes do not pay
+# for importing them
+if TYPE_CHECKING:
+    import xgboost as xgb
+
+    from rendering import FigureRenderer
+
+# Version of the layout written by MachineLearningModel.save
+ARTIFACT_VERSION = 1
+
+# File names used within a saved model directory
+METADATA_FILE = "metadata.json"
+MODEL_FILES = {
+    "RF": "model.joblib",
+    "XGB": "model.ubj",
+    "XGBC": "model.ubj",
+}
+
+# Share of the training data held out for early stopping of "XGBC" models
+VALIDATION_FRACTION = 0.1
 
 
 class MachineLearningModel():
@@ -19,6 +51,11 @@ class MachineLearningModel():
     can then evaluate this model by creating a confusion matrix and
     classification report against the predictions made by the model. 
 
+    The "XGBC" model type trains a native XGBoost classifier with the
+    histogram method from a QuantileDMatrix. String and categorical columns,
+    e.g., Country and Gender, are passed to XGBoost as categorical features
+    rather than label codes.
+
     Attributes:
         * self.x_train: (pd.DataFrame) 
         * self.x_test: (pd.DataFrame)  
@@ -26,16 +63,34 @@ class MachineLearningModel():
         * self.y_test: (pd.DataFrame)  
         * self.model_type: (string) 
         * model_type: (string) 
-        * self.model: (RandomForestClassifier or xgb.XGBRegressor)
+        * self.model: (RandomForestClassifier, xgb.XGBRegressor or
+          xgb.Booster)
+        * self.feature_names: (list(string))
+        * self.category_encoder: (CategoryEncoder or None)
+        * self.training_report: (dict or None)
+        * self.resampler: (Resampler)
+        * self.preprocessing: (dict)
+        * self.renderer: (FigureRenderer or None)
 
     Methods:
         * fit_and_predict
+        * continue_training
+        * predict_proba
+        * predict
+        * predict_batches
+        * save
+        * load
         * evaluate
+        * evaluate_batches
     """
 
     def __init__(self, x_train: pd.DataFrame, x_test: pd.DataFrame,
                  y_train: pd.DataFrame, y_test: pd.DataFrame,
-                 model_type: str) -> None:
+                 model_type: str,
+                 renderer: "FigureRenderer | None" = None,
+                 params: dict | None = None,
+                 early_stopping_rounds: int | None = None,
+                 resampler: Resampler | None = None) -> None:
         """
         Init function for the class
 
@@ -53,22 +108,65 @@ class MachineLearningModel():
                 options are:
                     - "RF" for RandomForestClassifier
                     - "XGB" for XGBoost
+                    - "XGBC" for a native XGBoost classifier
+            * renderer: (FigureRenderer) Renderer used to draw
+                figures. If None then figures are shown
+                interactively and not saved.
+            * params: (dict) Optional model parameters, e.g.,
+                HyperparameterSearch.best_params, that override the
+                defaults of the chosen model type. For "XGBC"
+                these are xgb.train parameters, where n_estimators
+                sets the number of boosting rounds and nthread the
+                number of threads.
+            * early_stopping_rounds: (int) For "XGBC", stop
+                boosting once the loss on a held out validation
+                set has not improved for this many rounds
+            * resampler: (Resampler) Stage used to correct the
+                class imbalance of the training data. Defaults to
+                no resampling.
         """
+        self.renderer = renderer
+        self.preprocessing = {}
         self.x_train = x_train
         self.x_test = x_test
         self.y_train = y_train
         self.y_test = y_test
         self.model_type = model_type
-        # Set model to chosen type
-        if model_type == "RF":
-            self.model = RandomForestClassifier(random_state=42)
+        self.feature_names = list(x_train.columns)
+        self.category_encoder = None
+        self.training_report = None
+        self.early_stopping_rounds = early_stopping_rounds
+        self.resampler = resampler if resampler is not None else Resampler()
+        # Set model to chosen type. Class weights from the resampler can be
+        # overridden by the given params
+        params = {**self.resampler.model_params(model_type, y_train),
+                  **({} if params is None else params)}
+        self.params = params
+        if model_type == "XGBC":
+            # The booster is created by xgb.train in fit_and_predict
+            self.model = None
+            categorical_cols = [
+                col for col in self.feature_names
+                if x_train[col].dtype == object or
+                isinstance(x_train[col].dtype, pd.CategoricalDtype)]
+            self.category_encoder = CategoryEncoder().fit(x_train,
+                                                          categorical_cols)
+        elif model_type == "RF":
+            from sklearn.ensemble import RandomForestClassifier
+
+            self.model = RandomForestClassifier(**{"random_state": 42,
+                                                   **params})
         elif model_type == "XGB":
-            self.model = xgb.XGBRegressor(objective="binary:logistic")
+            import xgboost as xgb
+
+            self.model = xgb.XGBRegressor(**{"objective": "binary:logistic",
+                                             **params})
         else:
             self.model = None
             print("No model chosen! The selected model \
-                    must be either RF or XGB.")
+                    must be either RF, XGB or XGBC.")
 
+    @traced("MachineLearningModel.fit_and_predict")
     def fit_and_predict(self) -> list[int]:
         """
         Trains the chosen model type on the training data and returns
@@ -77,19 +175,419 @@ class MachineLearningModel():
         Returns:
             * y_pred: (array(int))
         """
-        self.model.fit(self.x_train, self.y_train)
+        start_time = time.perf_counter()
+
+        features, labels = self._training_data(self.x_train, self.y_train)
+
+        with TRACER.span("MachineLearningModel.train", len(labels)), \
+                PeakRSSSampler() as sampler:
+            if self.model_type == "XGBC":
+                self._train_booster(features, labels)
+            else:
+                self.model.fit(features, labels)
+
+        self._report_training(start_time, sampler)
+
+        return self.predict(self.x_test)
+
+    @traced("MachineLearningModel.continue_training")
+    def continue_training(self, x_train: pd.DataFrame,
+                          y_train: pd.DataFrame,
+                          n_estimators: int = 20) -> None:
+        """
+        Adds trees fitted on new training data, e.g., the customers that are
+        new or changed since the model was trained, to an already fitted
+        model without refitting its existing trees. XGBoost models continue
+        boosting from their current trees, so the new trees correct the
+        model's errors on the new data. Random Forests are warm-started and
+        grow the extra trees on the new data only.
 
-        y_pred = self.model.predict(self.x_test)
+        An XGBC model that stopped early first drops the trees after its
+        best round, as predictions never used them, and then adds exactly
+        n_estimators rounds without early stopping, so that every tree of
+        the continued model is used.
+
+        Inputs:
+            * x_train: (pd.DataFrame) New training data with the
+                columns the model was trained on
+            * y_train: (pd.DataFrame) Labels for the new training
+                data
+            * n_estimators: (int) Number of boosting rounds, or
+                trees, to add
+        """
+        start_time = time.perf_counter()
+
+        features, labels = self._training_data(x_train, y_train)
+
+        with TRACER.span("MachineLearningModel.train", len(labels)), \
+                PeakRSSSampler() as sampler:
+            if self.model_type == "XGBC":
+                num_trees = int(self.model.attr("best_iteration") or -1) + 1
+                booster = self.model[:num_trees] if num_trees else self.model
+                self._train_booster(features, labels, n_estimators, booster,
+                                    early_stopping=False)
+            elif self.model_type == "XGB":
+                self.model.set_params(n_estimators=n_estimators)
+                self.model.fit(features, labels,
+                               xgb_model=self.model.get_booster())
+            else:
+                self.model.set_params(
+                    warm_start=True,
+                    n_estimators=self.model.n_estimators + n_estimators)
+                self.model.fit(features, labels)
+
+        self._report_training(start_time, sampler)
+
+    def _training_data(self, x_train: pd.DataFrame,
+                       y_train: pd.DataFrame) -> tuple:
+        """
+        Converts training data into the float32 matrix layout that is used
+        for prediction and corrects its class imbalance with the resampler
+
+        Returns:
+            * features: (np.ndarray) float32 training features
+            * labels: (np.ndarray) Training labels
+        """
+        features = self._feature_matrix(x_train)
+
+        categorical_features = None
+        if self.category_encoder is not None:
+            categorical_features = [
+                idx for idx, col in enumerate(self.feature_names)
+                if col in self.category_encoder.categories]
+
+        return self.resampler.fit_resample(features, np.asarray(y_train),
+                                           categorical_features)
+
+    def _report_training(self, start_time: float,
+                         sampler: PeakRSSSampler) -> None:
+        """
+        Records and prints the time and peak memory used to train the model.
+        The peak is sampled while the model is fitted, so earlier stages of
+        the process do not count towards it, and rss_increase_mb is the
+        memory training added on top of what the process already held.
+        """
+        self.training_report = {
+            "seconds": time.perf_counter() - start_time,
+            "peak_rss_mb": sampler.peak_mb,
+            "rss_increase_mb": sampler.peak_mb - sampler.start_mb,
+        }
+        print(f"Trained {self.model_type} in "
+              f"{self.training_report['seconds']:.2f}s, peak memory "
+              f"{self.training_report['peak_rss_mb']:.0f} MB "
+              f"(+{self.training_report['rss_increase_mb']:.0f} MB)\n")
+
+    def _train_booster(self, features: np.ndarray, labels: np.ndarray,
+                       num_boost_round: int | None = None,
+                       xgb_model: "xgb.Booster | None" = None,
+                       early_stopping: bool = True) -> None:
+        """
+        Trains a native XGBoost classifier with the histogram method. The
+        training data is quantised once into a QuantileDMatrix and, when
+        early stopping is enabled, a stratified share of it is held out as a
+        validation set.
+
+        Inputs:
+            * features: (np.ndarray) float32 training features
+            * labels: (np.ndarray) Training labels
+            * num_boost_round: (int) Number of boosting rounds. Defaults
+                to the n_estimators parameter.
+            * xgb_model: (xgb.Booster) Optional fitted booster that
+                boosting continues from
+            * early_stopping: (bool) If False then early_stopping_rounds
+                is ignored and every round is trained on all of the data
+        """
+        import xgboost as xgb
+
+        params = dict(self.params)
+        num_boost_round = params.pop("n_estimators", 100) \
+            if num_boost_round is None else num_boost_round
+        params.pop("n_estimators", None)
+        params = {"objective": "binary:logistic", "tree_method": "hist",
+                  **params}
+        feature_types = ["c" if col in self.category_encoder.categories
+                         else "q" for col in self.feature_names]
+        early_stopping_rounds = self.early_stopping_rounds \
+            if early_stopping else None
+
+        evals = []
+        if early_stopping_rounds is not None:
+            from sklearn.model_selection import train_test_split
+
+            features, valid_features, labels, valid_labels = \
+                train_test_split(features, labels,
+                                 test_size=VALIDATION_FRACTION,
+                                 stratify=labels, random_state=42)
+
+        dtrain = xgb.QuantileDMatrix(features, label=labels,
+                                     feature_names=self.feature_names,
+                                     feature_types=feature_types,
+                                     enable_categorical=True,
+                                     nthread=params.get("nthread"))
+
+        if early_stopping_rounds is not None:
+            # Bin the validation set with the training set's quantiles
+            dvalid = xgb.QuantileDMatrix(valid_features, label=valid_labels,
+                                         ref=dtrain,
+                                         feature_names=self.feature_names,
+                                         feature_types=feature_types,
+                                         enable_categorical=True,
+                                         nthread=params.get("nthread"))
+            evals = [(dvalid, "valid")]
+
+        self.model = xgb.train(
+            params, dtrain, num_boost_round=num_boost_round, evals=evals,
+            early_stopping_rounds=early_stopping_rounds,
+            verbose_eval=False, xgb_model=xgb_model)
+
+    @traced("MachineLearningModel.predict_proba")
+    def predict_proba(self, x: pd.DataFrame | np.ndarray,
+                      out: np.ndarray | None = None) -> np.ndarray:
+        """
+        Predicts the probability that each customer exits using the fitted
+        model. XGBoost models predict directly from a float32 NumPy array
+        without building a DMatrix.
+
+        Inputs:
+            * x: (pd.DataFrame or np.ndarray) Input data. Dataframes are
+                reordered to the columns the model was trained on,
+                arrays must already be in that order.
+            * out: (np.ndarray) Optional float32 array the
+                probabilities are written to
+
+        Returns:
+            * y_proba: (np.ndarray) float32 probability of exiting
+        """
+        features = self._feature_matrix(x)
 
-        # If XGB classifier is used then convert predictions around 0.5 decision
-        # boundary
         if self.model_type == "XGB":
-            y_pred[y_pred > 0.5] = 1
-            y_pred[y_pred <= 0.5] = 0
+            y_proba = self.model.get_booster().inplace_predict(features)
+        elif self.model_type == "XGBC":
+            # Only use the trees up to the best round when stopped early
+            num_trees = int(self.model.attr("best_iteration") or -1) + 1
+            y_proba = self.model.inplace_predict(
+                features, iteration_range=(0, num_trees))
+        else:
+            y_proba = self.model.predict_proba(features)[:, 1]
+
+        if out is None:
+            return y_proba.astype(np.float32, copy=False)
+
+        out[:] = y_proba
+        return out
+
+    def predict(self, x: pd.DataFrame | np.ndarray,
+                threshold: float = 0.5) -> np.ndarray:
+        """
+        Predicts whether each customer stays (0) or exits (1)
+
+        Inputs:
+            * x: (pd.DataFrame or np.ndarray) Input data
+            * threshold: (float) Probabilities above the threshold
+                are predicted as exited
 
-        return y_pred
+        Returns:
+            * y_pred: (np.ndarray) int8 prediction per customer
+        """
+        return (self.predict_proba(x) > threshold).astype(np.int8)
 
-    def evaluate(self, y_preds: list[int], y_test: list[int]):
+    def predict_batches(self, batches: Iterable[pd.DataFrame | np.ndarray],
+                        threshold: float | None = 0.5) -> Iterator[np.ndarray]:
+        """
+        Scores an iterable of input batches, e.g., the chunks produced by
+        DataLoader.iter_clean after preprocessing, with steady memory use.
+        The input and output buffers are allocated for the largest batch
+        seen so far and reused for every later batch.
+
+        As the buffers are reused, each yielded array is only valid until
+        the next batch is requested and must be copied to be kept.
+
+        Inputs:
+            * batches: (Iterable) Batches of input data
+            * threshold: (float) Probabilities above the threshold
+                are predicted as exited. If None then the
+                probabilities are yielded instead.
+
+        Returns:
+            * y_batch: (Iterator[np.ndarray]) Predictions, or
+                probabilities, for each batch
+        """
+        features_buffer = np.empty((0, len(self.feature_names)),
+                                   dtype=np.float32)
+        proba_buffer = np.empty(0, dtype=np.float32)
+        pred_buffer = np.empty(0, dtype=np.int8)
+
+        for batch in batches:
+            num_rows = len(batch)
+            if num_rows > len(proba_buffer):
+                features_buffer = np.empty((num_rows,
+                                            len(self.feature_names)),
+                                           dtype=np.float32)
+                proba_buffer = np.empty(num_rows, dtype=np.float32)
+                pred_buffer = np.empty(num_rows, dtype=np.int8)
+
+            features = self._feature_matrix(batch,
+                                            features_buffer[:num_rows])
+            y_proba = self.predict_proba(features, proba_buffer[:num_rows])
+
+            if threshold is None:
+                yield y_proba
+            else:
+                y_pred = pred_buffer[:num_rows]
+                np.greater(y_proba, threshold, out=y_pred, casting="unsafe")
+                yield y_pred
+
+    def save(self, model_dir: str,
+             preprocessing: dict | None = None) -> None:
+        """
+        Saves the fitted model, the order of its feature columns and the
+        preprocessing state needed to turn raw customer data into those
+        features into a single directory. XGBoost models are saved in their
+        native UBJSON format and Random Forests with joblib.
+
+        Inputs:
+            * model_dir: (string) Directory the artifact is written
+                to
+            * preprocessing: (dict) JSON serialisable preprocessing
+                state, e.g., {"label_encoder": encoder.to_dict()}.
+                Defaults to self.preprocessing.
+        """
+        if preprocessing is not None:
+            self.preprocessing = preprocessing
+
+        os.makedirs(model_dir, exist_ok=True)
+
+        # Write to a temporary file and move it into place, so that a model
+        # memory-mapped from the previous file, e.g., one loaded and then
+        # updated, keeps reading the old file. The temporary name keeps the
+        # extension XGBoost picks its format from.
+        model_file = MODEL_FILES[self.model_type]
+        model_path = os.path.join(model_dir, model_file)
+        tmp_path = os.path.join(model_dir, f".{os.getpid()}.{model_file}")
+        if self.model_type in ("XGB", "XGBC"):
+            self.model.save_model(tmp_path)
+        else:
+            joblib.dump(self.model, tmp_path)
+        os.replace(tmp_path, model_path)
+
+        metadata = {
+            "version": ARTIFACT_VERSION,
+            "model_type": self.model_type,
+            "feature_names": self.feature_names,
+            "categories": None if self.category_encoder is None
+            else self.category_encoder.to_dict(),
+            "preprocessing": self.preprocessing,
+        }
+        with open(os.path.join(model_dir, METADATA_FILE), "w",
+                  encoding="utf-8") as file:
+            json.dump(metadata, file, indent=2)
+
+    @classmethod
+    def load(cls, model_dir: str) -> "MachineLearningModel":
+        """
+        Loads a model saved with save. The loaded model has no training or
+        test data and can only be used for prediction. Random Forests are
+        memory-mapped rather than read into memory.
+
+        Inputs:
+            * model_dir: (string) Directory the artifact was saved
+                to
+
+        Returns:
+            * model: (MachineLearningModel) The fitted model
+        """
+        with open(os.path.join(model_dir, METADATA_FILE),
+                  encoding="utf-8") as file:
+            metadata = json.load(file)
+
+        if metadata["version"] != ARTIFACT_VERSION:
+            raise ValueError(f"Unsupported model artifact version "
+                             f"{metadata['version']}")
+
+        model_type = metadata["model_type"]
+        model_path = os.path.join(model_dir, MODEL_FILES[model_type])
+
+        # Bypass __init__ as there is no training data to pass to it
+        loaded_model = cls.__new__(cls)
+        loaded_model.x_train = loaded_model.x_test = None
+        loaded_model.y_train = loaded_model.y_test = None
+        loaded_model.renderer = None
+        loaded_model.model_type = model_type
+        loaded_model.feature_names = metadata["feature_names"]
+        loaded_model.preprocessing = metadata["preprocessing"]
+        loaded_model.params = {}
+        loaded_model.resampler = Resampler()
+        loaded_model.early_stopping_rounds = None
+        loaded_model.training_report = None
+        loaded_model.category_encoder = None
+        if metadata.get("categories") is not None:
+            loaded_model.category_encoder = CategoryEncoder.from_dict(
+                metadata["categories"])
+
+        if model_type == "XGB":
+            import xgboost as xgb
+
+            loaded_model.model = xgb.XGBRegressor()
+            loaded_model.model.load_model(model_path)
+        elif model_type == "XGBC":
+            import xgboost as xgb
+
+            loaded_model.model = xgb.Booster()
+            loaded_model.model.load_model(model_path)
+        else:
+            loaded_model.model = joblib.load(model_path, mmap_mode="r")
+
+        return loaded_model
+
+    def _feature_matrix(self, x: pd.DataFrame | np.ndarray,
+                        out: np.ndarray | None = None) -> np.ndarray:
+        """
+        Converts input data into a float32 matrix with the columns in the
+        order the model was trained on
+
+        Inputs:
+            * x: (pd.DataFrame or np.ndarray) Input data
+            * out: (np.ndarray) Optional float32 matrix the
+                features are copied into
+
+        Returns:
+            * features: (np.ndarray) float32 feature matrix
+        """
+        if isinstance(x, pd.DataFrame):
+            categorical_cols = {} if self.category_encoder is None \
+                else self.category_encoder.categories
+            if out is None and not categorical_cols:
+                # Selecting the columns copies them, so skip it when they are
+                # already in order, e.g., for a memory-mapped float32 matrix
+                if list(x.columns) != self.feature_names:
+                    x = x[self.feature_names]
+                return x.to_numpy(dtype=np.float32)
+
+            if out is None:
+                out = np.empty((len(x), len(self.feature_names)),
+                               dtype=np.float32)
+
+            # Copy column by column so no intermediate matrix is created
+            for idx, column in enumerate(self.feature_names):
+                if column in categorical_cols:
+                    # Categories are passed to XGBoost by their code, with
+                    # unseen categories treated as missing
+                    codes = pd.Categorical(
+                        x[column], categories=categorical_cols[column]).codes
+                    out[:, idx] = np.where(codes >= 0, codes, np.nan)
+                else:
+                    out[:, idx] = x[column].to_numpy()
+            return out
+
+        if out is None:
+            return np.asarray(x, dtype=np.float32)
+
+        out[:] = x
+        return out
+
+    @traced("MachineLearningModel.evaluate")
+    def evaluate(self, y_preds: list[int], y_test: list[int],
+                 plot: bool = True):
         """
         Plots of a confusion matrix with a given set of predictions and outputs
         the classification report to the terminal.
@@ -100,25 +598,84 @@ class MachineLearningModel():
                 (1)
             * y_test: (array(int)) Ground truth
                 labels for each of the predictions
+            * plot: (bool) If False then only the classification
+                report is output
         """
-        matrix = confusion_matrix(self.y_test, y_preds)
-        matrix = matrix.astype('float') / matrix.sum(axis=1)[:, np.newaxis]
-
-        # Build the plot
-        plt.figure(figsize=(16, 7))
-        sns.heatmap(matrix, annot=True, annot_kws={'size': 10},
-                    cmap=plt.cm.Greens, linewidths=0.2)
+        from sklearn.metrics import classification_report, confusion_matrix
 
-        # Add labels to the plot
-        class_names = ['Stayed', 'Exited']
-        tick_marks = np.arange(len(class_names))+0.5
-        plt.xticks(tick_marks, class_names, rotation=0)
-        plt.yticks(tick_marks, class_names, rotation=0)
-        plt.xlabel('Predicted label')
-        plt.ylabel('True label')
-        plt.title(f'Confusion Matrix for {self.model_type}')
-        plt.savefig(f'./Figures/conf_matrix_SENTIMENT_{self.model_type}')
-        plt.show()
+        if plot:
+            matrix = confusion_matrix(y_test, y_preds)
+            matrix = matrix.astype('float') / \
+                matrix.sum(axis=1)[:, np.newaxis]
+            self._plot_confusion_matrix(matrix)
 
         # Output the classification report
         print(classification_report(y_test, y_preds))
+
+    @traced("MachineLearningModel.evaluate_batches")
+    def evaluate_batches(self,
+                         batches: Iterable[tuple[pd.DataFrame | np.ndarray,
+                                                 np.ndarray | pd.Series]],
+                         threshold: float = 0.5,
+                         plot: bool = False) -> StreamingMetrics:
+        """
+        Evaluates the model over an iterable of (input data, labels)
+        batches without keeping the predictions in memory. Each batch is
+        scored with predict_batches and added to a StreamingMetrics, which
+        can afterwards be used for threshold sweeps.
+
+        Inputs:
+            * batches: (Iterable) Batches of input data and their
+                labels
+            * threshold: (float) Probabilities above the threshold
+                are predicted as exited
+            * plot: (bool) If True then the confusion matrix is
+                plotted
+
+        Returns:
+            * metrics: (StreamingMetrics) The accumulated metrics
+        """
+        metrics = StreamingMetrics(threshold)
+
+        # predict_batches takes the next batch of input data before
+        # yielding its probabilities, so the labels of the batch being
+        # scored are always the most recently queued
+        labels = []
+
+        def input_batches():
+            for x, y in batches:
+                labels.append(y)
+                yield x
+
+        for y_proba in self.predict_batches(input_batches(), threshold=None):
+            metrics.update(labels.pop(), y_proba)
+
+        results = metrics.results()
+        print(f"Evaluated {self.model_type} on {results['rows']} rows: "
+              f"accuracy {results['accuracy']:.4f}, precision "
+              f"{results['precision']:.4f}, recall {results['recall']:.4f}, "
+              f"F1 {results['f1']:.4f}, ROC-AUC {results['roc_auc']:.4f}, "
+              f"PR-AUC {results['pr_auc']:.4f}\n")
+
+        if plot:
+            self._plot_confusion_matrix(metrics.confusion_matrix(
+                normalize=True))
+
+        return metrics
+
+    def _plot_confusion_matrix(self, matrix: np.ndarray) -> None:
+        """
+        Plots a confusion matrix normalised by the number of customers with
+        each label
+        """
+        # Build the plot
+        from rendering import FigureRenderer, draw_confusion_matrix
+
+        if self.renderer is None:
+            self.renderer = FigureRenderer()
+
+        class_names = ['Stayed', 'Exited']
+        self.renderer.render(
+            draw_confusion_matrix, matrix, class_names,
+            f'Confusion Matrix for {self.model_type}',
+            save_name=f'conf_matrix_SENTIMENT_{self.model_type}.png')
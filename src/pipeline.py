@@ -0,0 +1,283 @@
+"""
+This module contains the Pipeline class which runs the stages of the churn
+workflow as a graph of nodes with declared inputs. Independent nodes run
+concurrently and nodes whose code and inputs have not changed since the
+previous run are skipped by reloading their cached output.
+"""
+import glob
+import hashlib
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import joblib
+
+from hashing import content_hash
+from instrumentation import TRACER
+
+
+def source_hash(source_dir: str | None = None) -> str:
+    """
+    Hashes the source of every module of the project, so that editing any
+    module invalidates every cached output. Changes that the source does not
+    show, e.g., a library upgrade, are covered by each node's version and
+    fingerprint.
+
+    Inputs:
+        * source_dir: (string) Directory of the project's modules. Defaults
+          to the directory of this module.
+
+    Returns:
+        * digest: (string) Hex digest of the project's source
+    """
+    if source_dir is None:
+        source_dir = os.path.dirname(os.path.abspath(__file__))
+
+    digest = hashlib.sha1()
+    for path in sorted(glob.glob(os.path.join(glob.escape(source_dir),
+                                              "*.py"))):
+        with open(path, "rb") as file:
+            digest.update(os.path.basename(path).encode())
+            digest.update(hashlib.sha1(file.read()).digest())
+
+    return digest.hexdigest()
+
+
+class PipelineNode():
+    """
+    A single stage of a Pipeline. The node's function is called with the
+    outputs of its input nodes, in the order the inputs are declared, and
+    must not modify them as they are shared with every other node that uses
+    them.
+
+    Attributes:
+        * self.name: (string)
+        * self.func: (callable)
+        * self.inputs: (list(string))
+        * self.cache: (bool)
+        * self.fingerprint: (callable or None)
+        * self.version: (string)
+    """
+
+    def __init__(self, name: str, func, inputs: list[str] | None = None,
+                 cache: bool = True, fingerprint=None,
+                 version: str = "1") -> None:
+        """
+        Init function for the PipelineNode class
+
+        Inputs:
+            * name: (string) Unique name of the node
+            * func: (callable) Function computing the node's output
+            * inputs: (list(string)) Names of the nodes whose outputs are
+              passed to func
+            * cache: (bool) If False then the node always runs, e.g., for
+              nodes that print or plot results
+            * fingerprint: (callable) Optional function returning a string
+              that identifies external state read by the node, e.g., the
+              modification time of a source file or a setting overridden
+              from the command line
+            * version: (string) Version of the node's output. Change it to
+              invalidate the cached output for a reason that neither the
+              project's source nor the fingerprint shows, e.g., an upgrade
+              of a library the node uses.
+        """
+        self.name = name
+        self.func = func
+        self.inputs = [] if inputs is None else inputs
+        self.cache = cache
+        self.fingerprint = fingerprint
+        self.version = version
+
+
+class Pipeline():
+    """
+    The Pipeline runs a graph of PipelineNodes. A node starts once all of its
+    inputs are available, so independent branches, e.g., data analysis and
+    model training, run concurrently in a thread pool. Intermediate outputs
+    are computed once and shared between every node that uses them.
+
+    When a cache directory is given, each cacheable node's output is stored
+    under a key built from the project's source, the node's version and
+    fingerprint and the content hashes of its inputs. Later runs reload the
+    output instead of running the node while that key is unchanged.
+
+    Attributes:
+        * self.nodes: (dict) Mapping of node name to PipelineNode
+        * self.cache_dir: (string or None)
+        * self.n_workers: (int)
+        * self.skipped: (list(string)) Nodes loaded from the cache in the
+          last run
+
+    Methods:
+        * add
+        * run
+    """
+
+    def __init__(self, cache_dir: str | None = None,
+                 n_workers: int = 1) -> None:
+        """
+        Init function for the Pipeline class
+
+        Inputs:
+            * cache_dir: (string) Directory node outputs are cached in. If
+              None then every node runs on every call to run.
+            * n_workers: (int) Maximum number of nodes run at the same time.
+              Nodes that plot interactively require a single worker.
+        """
+        self.nodes = {}
+        self.cache_dir = cache_dir
+        self.n_workers = n_workers
+        self.skipped = []
+
+    def add(self, name: str, func, inputs: list[str] | None = None,
+            cache: bool = True, fingerprint=None,
+            version: str = "1") -> "Pipeline":
+        """
+        Adds a node to the pipeline, see PipelineNode for the inputs
+
+        Returns:
+            * self: (Pipeline) The pipeline, so calls can be chained
+        """
+        if name in self.nodes:
+            raise ValueError(f"The pipeline already has a node named {name}")
+
+        self.nodes[name] = PipelineNode(name, func, inputs, cache,
+                                        fingerprint, version)
+        return self
+
+    def run(self, targets: list[str] | None = None) -> dict:
+        """
+        Runs the nodes needed to compute the targets
+
+        Inputs:
+            * targets: (list(string)) Nodes to compute. Defaults to every
+              node.
+
+        Returns:
+            * results: (dict) Mapping of node name to output for every node
+              that was run or loaded
+        """
+        required = self._required_nodes(
+            list(self.nodes) if targets is None else targets)
+
+        # Only outputs read by a cached node need their content hashed, which
+        # also lets uncached nodes return outputs that cannot be pickled,
+        # e.g., open database connections
+        hashed = set()
+        if self.cache_dir is not None:
+            for name in required:
+                if self.nodes[name].cache:
+                    hashed.update(self.nodes[name].inputs)
+
+        source_digest = source_hash() if self.cache_dir is not None \
+            else None
+
+        results = {}
+        hashes = {}
+        self.skipped = []
+        waiting = set(required)
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.n_workers) as pool:
+            while waiting or running:
+                ready = [name for name in waiting
+                         if all(dep in results for dep in
+                                self.nodes[name].inputs)]
+                for name in sorted(ready):
+                    waiting.remove(name)
+                    node = self.nodes[name]
+                    running[pool.submit(
+                        self._execute, node,
+                        [results[dep] for dep in node.inputs],
+                        [hashes[dep] for dep in node.inputs],
+                        source_digest, name in hashed)] = name
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    results[name], hashes[name] = future.result()
+
+        return results
+
+    def _required_nodes(self, targets: list[str]) -> set[str]:
+        """
+        Finds every node the targets depend on and checks that the graph has
+        no missing inputs or cycles
+
+        Returns:
+            * required: (set(string)) Names of the nodes to run
+        """
+        required = set()
+        visiting = set()
+
+        def visit(name: str) -> None:
+            if name not in self.nodes:
+                raise KeyError(f"The pipeline has no node named {name}")
+            if name in visiting:
+                raise ValueError(f"The pipeline has a cycle through {name}")
+            if name in required:
+                return
+
+            visiting.add(name)
+            for dep in self.nodes[name].inputs:
+                visit(dep)
+            visiting.remove(name)
+            required.add(name)
+
+        for target in targets:
+            visit(target)
+
+        return required
+
+    def _execute(self, node: PipelineNode, inputs: list,
+                 input_hashes: list[str | None],
+                 source_digest: str | None,
+                 hash_output: bool = True) -> tuple:
+        """
+        Runs a node, or loads its output from the cache when its key is
+        unchanged
+
+        Inputs:
+            * node: (PipelineNode) The node to run
+            * inputs: (list) Outputs of the node's inputs
+            * input_hashes: (list(string)) Content hashes of the inputs
+            * source_digest: (string) source_hash of the project, taken
+              once per run
+            * hash_output: (bool) If False then the output of an uncached
+              node is not hashed
+
+        Returns:
+            * output: The node's output
+            * output_hash: (string or None) Content hash of the output
+        """
+        if self.cache_dir is None or not node.cache:
+            with TRACER.span(f"Pipeline.{node.name}"):
+                output = node.func(*inputs)
+            return output, content_hash(output) if hash_output else None
+
+        key_parts = [node.name, node.version, source_digest, *input_hashes]
+        if node.fingerprint is not None:
+            key_parts.append(node.fingerprint())
+        key = hashlib.sha1("\0".join(key_parts).encode()).hexdigest()[:16]
+        cache_path = os.path.join(self.cache_dir, f"{node.name}-{key}.joblib")
+
+        if os.path.exists(cache_path):
+            self.skipped.append(node.name)
+            print(f"Skipping {node.name}, its inputs are unchanged\n")
+            return joblib.load(cache_path)
+
+        with TRACER.span(f"Pipeline.{node.name}"):
+            output = node.func(*inputs)
+        output_hash = content_hash(output)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for stale_path in glob.glob(os.path.join(
+                glob.escape(self.cache_dir), f"{glob.escape(node.name)}-*")):
+            os.remove(stale_path)
+
+        # Write to a temporary file first so a reader never sees a partial
+        # cache
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        joblib.dump((output, output_hash), tmp_path)
+        os.replace(tmp_path, cache_path)
+
+        return output, output_hash
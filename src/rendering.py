@@ -0,0 +1,232 @@
+"""
+This module contains the FigureRenderer class which draws the figures created
+by DataAnalysis and MachineLearningModel. Figures can either be shown
+interactively or rendered headlessly with the Agg backend, optionally in a
+pool of worker processes, and saved to an output directory.
+"""
+import math
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import matplotlib
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import seaborn as sns
+
+
+def draw_bar_counts(counts: pd.DataFrame, title: str) -> None:
+    """
+    Draws the counts of each split as a bar chart
+
+    Inputs:
+        * counts: (pd.DataFrame) Counts with one column per split
+        * title: (string) Title of the figure
+    """
+    ax = counts.plot(kind='bar', color=['#00C43C', '#E95238'])
+
+    ax.set_title(title)
+    ax.set_ylabel("Num. Customers")
+
+    plt.tight_layout()
+
+
+def draw_group_box_plot(data: pd.DataFrame | dict[str, list[dict]],
+                        cols_of_interest: list[str], num_cols: int,
+                        label_col: str = 'Exited') -> None:
+    """
+    Draws a grid of box plots, one for each column of interest against the
+    label column. The box plots are either drawn by seaborn from the raw rows
+    or by matplotlib from precomputed box statistics.
+
+    Inputs:
+        * data: (pd.DataFrame or dict) Either the rows containing the
+          cols_of_interest and label_col, or a mapping of each column of
+          interest to a list of matplotlib bxp statistics, one per label
+        * cols_of_interest: (array(String)) The columns to plot
+        * num_cols: (int) The number of columns that will be in the final plot
+        * label_col: (string) Column the box plots are split by
+    """
+    # For number of rows in subplot, divide the number
+    # of columns we are interested in by number of columns
+    # and then round up
+    num_rows = math.ceil(len(cols_of_interest) / num_cols)
+
+    _, axes = plt.subplots(num_rows, num_cols, sharex=True, figsize=(7, 10),
+                           squeeze=False)
+
+    for idx, column_name in enumerate(cols_of_interest):
+        ax = axes[idx // num_cols, idx % num_cols]
+
+        if isinstance(data, pd.DataFrame):
+            sns.boxplot(ax=ax, x=label_col, y=column_name, data=data,
+                        palette="Greens", hue=label_col, legend=False)
+        else:
+            box_stats = data[column_name]
+            boxes = ax.bxp(box_stats, showfliers=False, patch_artist=True,
+                           widths=0.8)['boxes']
+            for box, colour in zip(boxes, sns.color_palette(
+                    "Greens", len(box_stats))):
+                box.set_facecolor(colour)
+            ax.set_xlabel(label_col)
+            ax.set_ylabel(column_name)
+
+        ax.set_title(f"{column_name} vs {label_col}")
+
+    plt.tight_layout()
+
+
+def draw_confusion_matrix(matrix: np.ndarray, class_names: list[str],
+                          title: str) -> None:
+    """
+    Draws a normalised confusion matrix as a heatmap
+
+    Inputs:
+        * matrix: (np.ndarray) Normalised confusion matrix
+        * class_names: (list(string)) Name of each class
+        * title: (string) Title of the figure
+    """
+    plt.figure(figsize=(16, 7))
+    sns.heatmap(matrix, annot=True, annot_kws={'size': 10},
+                cmap=plt.cm.Greens, linewidths=0.2)
+
+    # Add labels to the plot
+    tick_marks = np.arange(len(class_names))+0.5
+    plt.xticks(tick_marks, class_names, rotation=0)
+    plt.yticks(tick_marks, class_names, rotation=0)
+    plt.xlabel('Predicted label')
+    plt.ylabel('True label')
+    plt.title(title)
+
+
+def _init_worker() -> None:
+    """
+    Switches each worker process to the non-interactive Agg backend
+    """
+    matplotlib.use("Agg")
+
+
+def _render_figure(draw_func, args: tuple, save_path: str | None,
+                   show: bool) -> str | None:
+    """
+    Draws a figure, then saves and/or shows it before closing it
+
+    Returns:
+        * save_path: (string or None) Where the figure was saved
+    """
+    draw_func(*args)
+
+    if save_path is not None:
+        plt.savefig(save_path)
+    if show:
+        plt.show()
+    plt.close('all')
+
+    return save_path
+
+
+class FigureRenderer():
+    """
+    The FigureRenderer draws figures from the module level draw functions.
+    Interactive renderers show each figure as it is drawn. Headless renderers
+    use the Agg backend and only save figures, which allows them to be drawn
+    concurrently in a pool of worker processes.
+
+    Attributes:
+        * self.output_dir: (string or None)
+        * self.headless: (bool)
+        * self.n_workers: (int)
+
+    Methods:
+        * render
+        * wait
+        * close
+    """
+
+    def __init__(self, output_dir: str | None = None, headless: bool = False,
+                 n_workers: int = 1) -> None:
+        """
+        Init function for the FigureRenderer class
+
+        Inputs:
+            * output_dir: (string) Directory figures are saved to. If None
+              then figures are not saved.
+            * headless: (bool) If True then figures are rendered with the Agg
+              backend and never shown
+            * n_workers: (int) Number of processes used to render figures.
+              Values above 1 require headless rendering.
+        """
+        if n_workers > 1 and not headless:
+            raise ValueError("Figures can only be rendered in parallel when "
+                             "headless is True")
+
+        self.output_dir = output_dir
+        self.headless = headless
+        self.n_workers = n_workers
+
+        if headless:
+            matplotlib.use("Agg")
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+
+        self._pool = None
+        self._futures = []
+
+    def render(self, draw_func, *args,
+               save_name: str | None = None) -> Future | None:
+        """
+        Renders a figure with the given draw function. When rendering in
+        parallel the figure is drawn in a worker process and a future is
+        returned, otherwise the figure is drawn before returning.
+
+        Inputs:
+            * draw_func: (callable) Module level function that draws the
+              figure with pyplot
+            * args: Arguments passed to draw_func. These must be picklable
+              when rendering in parallel.
+            * save_name: (string) File name the figure is saved as within
+              the output directory
+
+        Returns:
+            * future: (Future or None) Future holding the saved path when
+              rendering in parallel
+        """
+        save_path = None
+        if self.output_dir is not None and save_name is not None:
+            save_path = os.path.join(self.output_dir, save_name)
+
+        if self.n_workers == 1:
+            _render_figure(draw_func, args, save_path, not self.headless)
+            return None
+
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.n_workers,
+                                             initializer=_init_worker)
+
+        future = self._pool.submit(_render_figure, draw_func, args, save_path,
+                                   False)
+        self._futures.append(future)
+
+        return future
+
+    def wait(self) -> list[str]:
+        """
+        Waits for every figure submitted to the worker pool to be rendered
+
+        Returns:
+            * saved_paths: (list(string)) Paths of the figures that were
+              saved
+        """
+        saved_paths = [future.result() for future in self._futures]
+        self._futures = []
+
+        return [path for path in saved_paths if path is not None]
+
+    def close(self) -> None:
+        """
+        Waits for outstanding figures and shuts down the worker pool
+        """
+        self.wait()
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
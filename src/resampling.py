@@ -0,0 +1,129 @@
+"""
+This module contains the Resampler class which corrects the class imbalance
+between customers that stayed and exited before a model is trained, either by
+resampling the training data or by weighting the classes in the model.
+"""
+import numpy as np
+
+# Strategies supported by the Resampler
+STRATEGIES = ("none", "smote", "undersample", "class_weight")
+
+
+class Resampler():
+    """
+    The Resampler applies one of the following strategies to the training
+    data:
+        * "none" leaves the data unchanged
+        * "smote" oversamples the minority class with SMOTE, or SMOTENC when
+          there are categorical features
+        * "undersample" randomly drops majority class rows
+        * "class_weight" leaves the data unchanged and instead weights the
+          classes in the model through model_params
+
+    SMOTE works on the data in float32 and searches for neighbours with
+    every CPU. The "none" and "class_weight" strategies never copy the data.
+
+    Attributes:
+        * self.strategy: (string)
+        * self.k_neighbors: (int)
+        * self.n_jobs: (int)
+        * self.random_state: (int)
+
+    Methods:
+        * fit_resample
+        * model_params
+    """
+
+    def __init__(self, strategy: str = "none", k_neighbors: int = 5,
+                 n_jobs: int = -1, random_state: int = 42) -> None:
+        """
+        Init function for the Resampler class
+
+        Inputs:
+            * strategy: (string) One of STRATEGIES
+            * k_neighbors: (int) Number of neighbours used by SMOTE
+            * n_jobs: (int) Number of threads used to search for neighbours,
+              -1 uses every CPU
+            * random_state: (int) Seed for the resampling
+        """
+        if strategy not in STRATEGIES:
+            raise ValueError(f"The resampling strategy must be one of "
+                             f"{', '.join(STRATEGIES)}.")
+
+        self.strategy = strategy
+        self.k_neighbors = k_neighbors
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+
+    def fit_resample(self, x: np.ndarray, y: np.ndarray,
+                     categorical_features: list[int] | None = None) \
+            -> tuple[np.ndarray, np.ndarray]:
+        """
+        Resamples the training data
+
+        Inputs:
+            * x: (np.ndarray) Training features
+            * y: (np.ndarray) Training labels
+            * categorical_features: (list(int)) Indices of the categorical
+              features, which SMOTE copies from a neighbour rather than
+              interpolating
+
+        Returns:
+            * x: (np.ndarray) Resampled training features
+            * y: (np.ndarray) Resampled training labels
+        """
+        if self.strategy in ("none", "class_weight"):
+            return x, y
+
+        # imbalanced-learn is slow to import, so only import it when the
+        # data is resampled
+        from imblearn.over_sampling import SMOTE, SMOTENC
+        from imblearn.under_sampling import RandomUnderSampler
+        from sklearn.neighbors import NearestNeighbors
+
+        if self.strategy == "undersample":
+            sampler = RandomUnderSampler(random_state=self.random_state)
+        else:
+            # SMOTE keeps the dtype of its input, so resample in float32
+            x = np.asarray(x, dtype=np.float32)
+            neighbours = NearestNeighbors(n_neighbors=self.k_neighbors + 1,
+                                          n_jobs=self.n_jobs)
+            if categorical_features:
+                sampler = SMOTENC(categorical_features,
+                                  k_neighbors=neighbours,
+                                  random_state=self.random_state)
+            else:
+                sampler = SMOTE(k_neighbors=neighbours,
+                                random_state=self.random_state)
+
+        x, y = sampler.fit_resample(x, np.asarray(y))
+        print(f"Class distribution after resampling: "
+              f"{dict(enumerate(np.bincount(y).tolist()))}\n")
+
+        return x, y
+
+    def model_params(self, model_type: str, y: np.ndarray) -> dict:
+        """
+        Returns the model parameters that weight the classes when the
+        strategy is "class_weight"
+
+        Inputs:
+            * model_type: (string) Type of MachineLearningModel
+            * y: (np.ndarray) Training labels
+
+        Returns:
+            * params: (dict) Parameters to pass to the model
+        """
+        if self.strategy != "class_weight":
+            return {}
+
+        if model_type == "RF":
+            return {"class_weight": "balanced"}
+
+        # XGBoost weights the positive class instead
+        class_counts = np.bincount(np.asarray(y), minlength=2)
+        if class_counts[1] == 0:
+            raise ValueError("The training labels have no customers that "
+                             "exited, so the classes cannot be weighted")
+
+        return {"scale_pos_weight": class_counts[0] / class_counts[1]}
@@ -0,0 +1,132 @@
+"""
+This module contains the Scorer class which scores new customers with a saved
+model. The encoding, sentiment column and derived features saved with the
+model are applied to the raw customer data so that it matches the data the
+model was trained on.
+"""
+import numpy as np
+import pandas as pd
+
+from data_loader import DataLoader
+from encoder import CategoryEncoder
+from features import FeatureBuilder
+from model import MachineLearningModel
+from sentiment import SentimentEngine
+
+# Probabilities above the threshold are predicted as exited
+DECISION_THRESHOLD = 0.5
+
+
+class Scorer():
+    """
+    The Scorer loads a model saved with MachineLearningModel.save and applies
+    the same cleaning, label encoding, sentiment analysis and derived features
+    as the training data before predicting. Sentiment is scored in process,
+    as customers are scored a batch at a time.
+
+    Attributes:
+        * self.model_dir: (string)
+        * self.model: (MachineLearningModel)
+        * self.encoder: (CategoryEncoder)
+        * self.sentiment_col: (string)
+        * self.sentiment_backend: (string)
+        * self.feature_builder: (FeatureBuilder or None)
+        * self.required_fields: (list(string))
+
+    Methods:
+        * score
+        * score_records
+        * close
+    """
+
+    def __init__(self, model_dir: str,
+                 lexicon_path: str | None = None) -> None:
+        """
+        Init function for the Scorer class
+
+        Inputs:
+            * model_dir: (string) Directory of a model saved with
+              MachineLearningModel.save
+            * lexicon_path: (string) Optional path to a vader_lexicon.txt
+              file, see SentimentEngine
+        """
+        self.model_dir = model_dir
+
+        self.model = MachineLearningModel.load(model_dir)
+        preprocessing = self.model.preprocessing
+        self.encoder = CategoryEncoder.from_dict(
+            preprocessing["label_encoder"])
+        self.sentiment_col = preprocessing["sentiment_col"]
+
+        # Models saved before the sentiment backend was configurable were
+        # trained on VADER scores
+        self.sentiment_backend = preprocessing.get("sentiment_backend",
+                                                   "vader")
+
+        # Models saved with derived features store the specs used to build
+        # them
+        self.feature_builder = None
+        if preprocessing.get("derived_features") is not None:
+            self.feature_builder = FeatureBuilder(
+                preprocessing["derived_features"])
+
+        self._dataloader = DataLoader(None)
+        self._sentiment_engine = SentimentEngine(
+            lexicon_path, n_workers=1, backend=self.sentiment_backend)
+
+        # The compound score and derived features are computed from the
+        # other fields
+        derived_cols = {f"{self.sentiment_col}Compound"}
+        if self.feature_builder is not None:
+            derived_cols.update(self.feature_builder.feature_names)
+        self.required_fields = [col for col in self.model.feature_names
+                                if col not in derived_cols]
+
+    def __enter__(self) -> "Scorer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def score(self, customer_data: pd.DataFrame) -> np.ndarray:
+        """
+        Scores cleaned customer data in a single predict call
+
+        Inputs:
+            * customer_data: (pd.DataFrame) Customer data cleaned with
+              DataLoader.clean. It is not modified.
+
+        Returns:
+            * y_proba: (np.ndarray) float32 probability that each customer
+              exits
+        """
+        customer_data = self._dataloader.apply_label_encoding(
+            customer_data.copy(), list(self.encoder.categories), self.encoder)
+        customer_data = self._dataloader.apply_sentiment_analysis(
+            customer_data, self.sentiment_col, self._sentiment_engine)
+        if self.feature_builder is not None:
+            customer_data = self.feature_builder.append_features(
+                customer_data)
+
+        return self.model.predict_proba(customer_data)
+
+    def score_records(self, records: list[dict]) -> np.ndarray:
+        """
+        Scores raw customer records in a single predict call
+
+        Inputs:
+            * records: (list(dict)) Customer records in the raw format of the
+              customer spreadsheet
+
+        Returns:
+            * y_proba: (np.ndarray) float32 probability that each customer
+              exits
+        """
+        return self.score(self._dataloader.clean(
+            pd.DataFrame.from_records(records)))
+
+    def close(self) -> None:
+        """
+        Releases the sentiment engine
+        """
+        self._sentiment_engine.close()
@@ -0,0 +1,377 @@
+"""
+This module contains the ScoringServer class which serves churn predictions
+for single customers over HTTP. The saved model and its preprocessing state
+are loaded once, and requests that arrive at the same time are scored
+together in a single vectorised predict call.
+
+Usage:
+    python scoring_server.py --model-dir models/XGB --port 8080
+
+    curl -X POST localhost:8080/score -d '{"CreditScore": 619, ...}'
+    curl localhost:8080/metrics
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import time
+
+import numpy as np
+
+from scorer import DECISION_THRESHOLD, Scorer
+
+# Largest number of records scored in one predict call
+MAX_BATCH_SIZE = 256
+
+# Longest time in seconds a request waits for others to join its batch
+MAX_BATCH_DELAY = 0.002
+
+# Number of most recent requests the latency percentiles are computed over
+LATENCY_WINDOW = 10_000
+
+HTTP_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+}
+
+
+class RequestError(Exception):
+    """
+    Raised when a request cannot be scored because of its content
+    """
+
+
+async def read_http_message(reader: asyncio.StreamReader) \
+        -> tuple[str, dict, bytes] | None:
+    """
+    Reads one HTTP/1.1 request or response from a stream
+
+    Inputs:
+        * reader: (asyncio.StreamReader) Stream to read from
+
+    Returns:
+        * message: (tuple or None) Start line, lower case headers and body,
+          or None if the connection was closed
+    """
+    start_line = await reader.readline()
+    if not start_line:
+        return None
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+    return start_line.decode("latin-1").strip(), headers, body
+
+
+def http_response(status: int, payload) -> bytes:
+    """
+    Builds an HTTP/1.1 response with a JSON body
+
+    Inputs:
+        * status: (int) HTTP status code
+        * payload: JSON serialisable body
+
+    Returns:
+        * response: (bytes) The encoded response
+    """
+    body = json.dumps(payload).encode()
+    head = (f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n")
+
+    return head.encode("latin-1") + body
+
+
+class ScoringServer():
+    """
+    The ScoringServer answers these requests:
+        * POST /score with a JSON customer record, or a list of records, in
+          the raw format of the customer spreadsheet. Returns the probability
+          that each customer exits and the predicted label.
+        * GET /metrics returns the p50 and p99 latency and the throughput
+        * GET /health
+
+    Records are scored by a Scorer, which applies the same cleaning, label
+    encoding, sentiment analysis and derived features as the training data,
+    using the state saved with the model. Requests are queued and a single
+    batcher task scores everything that arrives within MAX_BATCH_DELAY of
+    the first queued request, up to MAX_BATCH_SIZE records, in one predict
+    call on a worker thread so the event loop keeps accepting requests.
+
+    Attributes:
+        * self.model_dir: (string)
+        * self.host: (string)
+        * self.port: (int)
+        * self.max_batch_size: (int)
+        * self.max_batch_delay: (float)
+        * self.scorer: (Scorer)
+
+    Methods:
+        * submit
+        * metrics
+        * serve
+        * run
+    """
+
+    def __init__(self, model_dir: str, host: str = "127.0.0.1",
+                 port: int = 8080, max_batch_size: int = MAX_BATCH_SIZE,
+                 max_batch_delay: float = MAX_BATCH_DELAY,
+                 lexicon_path: str | None = None) -> None:
+        """
+        Init function for the ScoringServer class
+
+        Inputs:
+            * model_dir: (string) Directory of a model saved with
+              MachineLearningModel.save
+            * host: (string) Address to listen on
+            * port: (int) Port to listen on
+            * max_batch_size: (int) Largest number of records scored in one
+              predict call
+            * max_batch_delay: (float) Longest time in seconds a request
+              waits for others to join its batch
+            * lexicon_path: (string) Optional path to a vader_lexicon.txt
+              file, see SentimentEngine
+        """
+        self.model_dir = model_dir
+        self.host = host
+        self.port = port
+        self.max_batch_size = max_batch_size
+        self.max_batch_delay = max_batch_delay
+        self.scorer = Scorer(model_dir, lexicon_path)
+
+        self._queue = None
+        self._latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self._counts = {"requests": 0, "records": 0, "batches": 0,
+                        "errors": 0}
+        self._start_time = time.perf_counter()
+
+    async def submit(self, records: list[dict]) -> np.ndarray:
+        """
+        Queues records to be scored in the next batch
+
+        Inputs:
+            * records: (list(dict)) Customer records
+
+        Returns:
+            * y_proba: (np.ndarray) Probability that each customer exits
+        """
+        for record in records:
+            if not isinstance(record, dict):
+                raise RequestError("Each record must be a JSON object")
+            missing = [field for field in self.scorer.required_fields
+                       if field not in record]
+            if missing:
+                raise RequestError(f"Missing fields: {missing}")
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((records, future))
+
+        return await future
+
+    def metrics(self) -> dict:
+        """
+        Returns:
+            * metrics: (dict) Request counts, p50 and p99 latency in
+              milliseconds over the last LATENCY_WINDOW requests, mean batch
+              size and throughput since the server started
+        """
+        uptime = time.perf_counter() - self._start_time
+        latencies = np.fromiter(self._latencies, dtype=np.float64)
+
+        p50_ms = p99_ms = None
+        if len(latencies):
+            p50_ms, p99_ms = (np.percentile(latencies, [50, 99]) * 1e3) \
+                .tolist()
+
+        return {
+            **self._counts,
+            "uptime_seconds": uptime,
+            "p50_ms": p50_ms,
+            "p99_ms": p99_ms,
+            "mean_batch_size": self._counts["records"] /
+            max(self._counts["batches"], 1),
+            "requests_per_second": self._counts["requests"] / uptime,
+            "records_per_second": self._counts["records"] / uptime,
+        }
+
+    async def serve(self) -> None:
+        """
+        Starts the batcher and serves requests until cancelled
+        """
+        self._queue = asyncio.Queue()
+        self._start_time = time.perf_counter()
+        batcher = asyncio.create_task(self._batcher())
+
+        server = await asyncio.start_server(self._handle_connection,
+                                            self.host, self.port)
+        print(f"Scoring with the model in {self.model_dir} on "
+              f"http://{self.host}:{self.port}\n")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            self.scorer.close()
+
+    def run(self) -> None:
+        """
+        Serves requests until interrupted
+        """
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+
+    async def _batcher(self) -> None:
+        """
+        Collects queued requests into batches and scores each batch on a
+        worker thread
+        """
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await self._queue.get()]
+            num_records = len(batch[0][0])
+            deadline = loop.time() + self.max_batch_delay
+
+            while num_records < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                num_records += len(item[0])
+
+            records = [record for item in batch for record in item[0]]
+            try:
+                y_proba = await loop.run_in_executor(
+                    None, self.scorer.score_records, records)
+            except Exception:
+                # Score the requests one at a time so a bad record only
+                # fails its own request
+                await self._score_separately(batch)
+                continue
+
+            self._counts["batches"] += 1
+            start = 0
+            for item_records, future in batch:
+                end = start + len(item_records)
+                if not future.done():
+                    future.set_result(y_proba[start:end])
+                start = end
+
+    async def _score_separately(self, batch: list[tuple]) -> None:
+        """
+        Scores each request of a failed batch on its own
+        """
+        loop = asyncio.get_running_loop()
+
+        for records, future in batch:
+            try:
+                y_proba = await loop.run_in_executor(
+                    None, self.scorer.score_records, records)
+            except Exception as error:
+                if not future.done():
+                    future.set_exception(RequestError(
+                        f"Could not score the records: {error}"))
+                continue
+
+            self._counts["batches"] += 1
+            if not future.done():
+                future.set_result(y_proba)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader,
+                                 writer: asyncio.StreamWriter) -> None:
+        """
+        Answers requests on a connection until the client closes it
+        """
+        try:
+            while True:
+                try:
+                    message = await read_http_message(reader)
+                except (asyncio.IncompleteReadError, ValueError):
+                    break
+                if message is None:
+                    break
+
+                start_line, headers, body = message
+                writer.write(await self._respond(start_line, body))
+                await writer.drain()
+
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, start_line: str, body: bytes) -> bytes:
+        """
+        Routes a request and builds its response
+        """
+        method, path = (start_line.split() + ["", ""])[:2]
+
+        if path == "/health":
+            return http_response(200, {"status": "ok"})
+        if path == "/metrics":
+            return http_response(200, self.metrics())
+        if path != "/score":
+            return http_response(404, {"error": f"Unknown path {path}"})
+        if method != "POST":
+            return http_response(405, {"error": "Use POST to score"})
+
+        start_time = time.perf_counter()
+        try:
+            payload = json.loads(body)
+            records = payload if isinstance(payload, list) else [payload]
+            y_proba = await self.submit(records)
+        except (ValueError, RequestError) as error:
+            self._counts["errors"] += 1
+            return http_response(400, {"error": str(error)})
+
+        self._latencies.append(time.perf_counter() - start_time)
+        self._counts["requests"] += 1
+        self._counts["records"] += len(records)
+
+        predictions = [{"probability": float(proba),
+                        "exited": int(proba > DECISION_THRESHOLD)}
+                       for proba in y_proba]
+
+        return http_response(
+            200, predictions if isinstance(payload, list) else predictions[0])
+
+
+def main(argv: list[str] | None = None) -> None:
+    """
+    Runs the scoring server from the command line
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--model-dir", default=os.path.join("models", "XGB"))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-batch-size", type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument("--max-batch-delay", type=float,
+                        default=MAX_BATCH_DELAY)
+    parser.add_argument("--lexicon-path")
+    args = parser.parse_args(argv)
+
+    ScoringServer(args.model_dir, args.host, args.port, args.max_batch_size,
+                  args.max_batch_delay, args.lexicon_path).run()
+
+
+if __name__ == "__main__":
+    main()
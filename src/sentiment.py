@@ -0,0 +1,263 @@
+"""
+This module contains the SentimentEngine class which scores free text with the
+VADER sentiment analyser. Texts are deduplicated before scoring and large
+workloads are spread across a pool of worker processes, or scored all at once
+by the vectorised LexiconSentimentAnalyzer.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import traced
+from lexicon_sentiment import LexiconSentimentAnalyzer
+
+if TYPE_CHECKING:
+    from nltk.sentiment.vader import SentimentIntensityAnalyzer
+
+# Location of the VADER lexicon within the local NLTK data directories
+NLTK_LEXICON_RESOURCE = \
+    "sentiment/vader_lexicon.zip/vader_lexicon/vader_lexicon.txt"
+
+# Plain text copy of the lexicon, extracted from the NLTK data on first use so
+# that later runs read it directly
+LEXICON_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache",
+                                  "churn-prediction", "vader_lexicon.txt")
+
+# Compound scores above POSITIVE_THRESHOLD are positive, those below
+# NEGATIVE_THRESHOLD are negative and everything else is neutral
+POSITIVE_THRESHOLD = 0.05
+NEGATIVE_THRESHOLD = -0.05
+
+# Ways of computing the compound scores. "vader" runs NLTK's VADER analyser on
+# each text and "lexicon" scores every text at once with array operations,
+# see LexiconSentimentAnalyzer.
+SENTIMENT_BACKENDS = ("vader", "lexicon")
+
+# Analyser owned by each worker process, created once by _init_worker
+_WORKER_ANALYZER = None
+
+
+def cached_lexicon_path() -> str:
+    """
+    Finds a local copy of the VADER lexicon. The first call copies the
+    lexicon out of the NLTK data directories to LEXICON_CACHE_PATH. The
+    lexicon is never downloaded.
+
+    Returns:
+        * lexicon_path: (string) Path to a vader_lexicon.txt file
+    """
+    if os.path.exists(LEXICON_CACHE_PATH):
+        return LEXICON_CACHE_PATH
+
+    import nltk
+
+    try:
+        lexicon = nltk.data.load(NLTK_LEXICON_RESOURCE, format="text")
+    except LookupError as error:
+        raise LookupError(
+            "The VADER lexicon was not found locally. Either pass "
+            "lexicon_path or install it once with "
+            "nltk.download('vader_lexicon').") from error
+
+    # Write to a temporary file first so a reader never sees a partial
+    # lexicon
+    os.makedirs(os.path.dirname(LEXICON_CACHE_PATH), exist_ok=True)
+    tmp_path = f"{LEXICON_CACHE_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        file.write(lexicon)
+    os.replace(tmp_path, LEXICON_CACHE_PATH)
+
+    return LEXICON_CACHE_PATH
+
+
+def load_analyzer(lexicon_path: str | None = None) \
+        -> "SentimentIntensityAnalyzer":
+    """
+    Creates a VADER analyser from a local copy of the lexicon. The lexicon is
+    never downloaded.
+
+    Inputs:
+        * lexicon_path: (string) Path to a vader_lexicon.txt file. If None
+          then the cached copy from cached_lexicon_path is used.
+
+    Returns:
+        * analyzer: (SentimentIntensityAnalyzer) VADER analyser
+    """
+    # NLTK is slow to import, so only import it when sentiment is scored
+    from nltk.sentiment.vader import SentimentIntensityAnalyzer
+
+    if lexicon_path is None:
+        lexicon_path = cached_lexicon_path()
+
+    return SentimentIntensityAnalyzer(
+        f"file:{os.path.abspath(lexicon_path)}")
+
+
+def _init_worker(lexicon_path: str | None) -> None:
+    """
+    Loads the lexicon once in each worker process
+    """
+    global _WORKER_ANALYZER
+    _WORKER_ANALYZER = load_analyzer(lexicon_path)
+
+
+def _score_batch(texts: list[str]) -> list[float]:
+    """
+    Scores a batch of texts with the worker's analyser
+    """
+    return [_WORKER_ANALYZER.polarity_scores(text)["compound"]
+            for text in texts]
+
+
+class SentimentEngine():
+    """
+    The SentimentEngine computes VADER compound scores for a column of text.
+    Only the unique, non-empty texts are scored and the results are scattered
+    back to every row. Empty texts receive a compound score of 0. When there
+    are more unique texts than fit in one batch, the batches are scored in a
+    process pool that is created on first use and reused for later calls.
+    The "lexicon" backend instead scores every unique text in process with
+    LexiconSentimentAnalyzer, which gives the same buckets as VADER at a
+    fraction of the cost and does not import NLTK.
+
+    Attributes:
+        * self.lexicon_path: (string or None)
+        * self.backend: (string)
+        * self.n_workers: (int)
+        * self.batch_size: (int)
+
+    Methods:
+        * score
+        * to_buckets
+        * close
+    """
+
+    def __init__(self, lexicon_path: str | None = None,
+                 n_workers: int | None = None,
+                 batch_size: int = 2_000, backend: str = "vader") -> None:
+        """
+        Init function for the SentimentEngine class
+
+        Inputs:
+            * lexicon_path: (string) Path to a vader_lexicon.txt file. If None
+              then the cached copy from cached_lexicon_path is used.
+            * n_workers: (int) Number of worker processes. Defaults to the
+              number of CPUs. A value of 1 scores everything in process.
+            * batch_size: (int) Number of texts sent to a worker at a time
+            * backend: (string) One of SENTIMENT_BACKENDS. The worker
+              settings only apply to the "vader" backend.
+        """
+        if backend not in SENTIMENT_BACKENDS:
+            raise ValueError(f"Unknown sentiment backend {backend}. The "
+                             f"backend must be one of {SENTIMENT_BACKENDS}")
+
+        self.lexicon_path = lexicon_path
+        self.backend = backend
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+
+        # Load the lexicon up front so a missing lexicon fails immediately
+        if backend == "lexicon":
+            self._analyzer = LexiconSentimentAnalyzer(
+                lexicon_path or cached_lexicon_path())
+        else:
+            self._analyzer = load_analyzer(lexicon_path)
+        self._pool = None
+
+    def __enter__(self) -> "SentimentEngine":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @traced("SentimentEngine.score")
+    def score(self, texts: pd.Series | np.ndarray) -> np.ndarray:
+        """
+        Computes the VADER compound score of every text
+
+        Inputs:
+            * texts: (pd.Series or np.ndarray) Texts to score. Missing values
+              are treated as empty strings.
+
+        Returns:
+            * compound_scores: (np.ndarray) float64 compound score per text.
+              Buckets should be taken before any downcast, as, e.g.,
+              float32(0.05) is above POSITIVE_THRESHOLD.
+        """
+        texts = pd.Series(texts).fillna("").astype(str).to_numpy()
+
+        compound_scores = np.zeros(len(texts), dtype=np.float64)
+
+        non_empty = texts != ""
+        if not non_empty.any():
+            return compound_scores
+
+        # Score each unique text once and scatter the scores back
+        codes, unique_texts = pd.factorize(texts[non_empty])
+        unique_scores = np.asarray(self._score_unique(list(unique_texts)),
+                                   dtype=np.float64)
+        compound_scores[non_empty] = unique_scores[codes]
+
+        return compound_scores
+
+    @staticmethod
+    def to_buckets(compound_scores: np.ndarray) -> np.ndarray:
+        """
+        Converts compound scores into sentiment buckets:
+            * > 0.05 = Review is positive (1)
+            * -0.05 <= && <= 0.05 = Review is neutral (0)
+            * < -0.05 = Review is negative (-1)
+
+        Inputs:
+            * compound_scores: (np.ndarray) Compound scores from score
+
+        Returns:
+            * buckets: (np.ndarray) Sentiment bucket per score
+        """
+        return np.select([compound_scores > POSITIVE_THRESHOLD,
+                          compound_scores < NEGATIVE_THRESHOLD],
+                         [1, -1], default=0).astype(np.int8)
+
+    def close(self) -> None:
+        """
+        Shuts down the worker pool if one has been started
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _score_unique(self, texts: list[str]) -> list[float] | np.ndarray:
+        """
+        Scores a list of texts, all at once with the "lexicon" backend or
+        using the worker pool if the texts span more than one batch
+
+        Inputs:
+            * texts: (list(string)) Texts to score
+
+        Returns:
+            * compound_scores: (list(float) or np.ndarray) Compound score per
+              text
+        """
+        if self.backend == "lexicon":
+            return self._analyzer.compound_scores(texts)
+
+        if self.n_workers == 1 or len(texts) <= self.batch_size:
+            return [self._analyzer.polarity_scores(text)["compound"]
+                    for text in texts]
+
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.n_workers,
+                                             initializer=_init_worker,
+                                             initargs=(self.lexicon_path,))
+
+        batches = [texts[start:start + self.batch_size]
+                   for start in range(0, len(texts), self.batch_size)]
+
+        compound_scores = []
+        for batch_scores in self._pool.map(_score_batch, batches):
+            compound_scores.extend(batch_scores)
+
+        return compound_scores
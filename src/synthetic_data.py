@@ -0,0 +1,138 @@
+"""
+This module generates synthetic customer data with the same schema and
+similar distributions to the churn spreadsheet described in the README, so
+that the pipeline can be benchmarked at sizes far larger than the real data.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+# Share of customers that exited and share of customers without feedback in
+# the real data
+EXITED_RATIO = 0.204
+MISSING_FEEDBACK_RATIO = 0.698
+
+# Largest number of data rows an excel worksheet can hold
+EXCEL_MAX_ROWS = 1_048_575
+
+COUNTRIES = ["France", "Germany", "Spain"]
+COUNTRY_PROBS = [0.50, 0.25, 0.25]
+
+SURNAME_PARTS = ["Ab", "Bel", "Car", "Dun", "El", "Fer", "Gr", "Hol", "Ing",
+                 "Jon", "Kel", "Lam", "Mor", "Nic", "Ol", "Pen", "Ri", "Sto",
+                 "Tho", "Wal"]
+SURNAME_ENDINGS = ["bert", "den", "ford", "son", "ley", "ton", "ski", "ini",
+                   "ova", "well"]
+
+FEEDBACK_OPENINGS = ["The app is great", "Really happy with the service",
+                     "Customer support was helpful", "It is okay I guess",
+                     "Nothing special", "Fees are far too high",
+                     "Terrible experience with support",
+                     "I am disappointed with the bank",
+                     "Transfers are fast and easy", "Not bad at all"]
+FEEDBACK_DETAILS = ["since I joined", "this year", "after my last visit",
+                    "compared to other banks", "for my savings",
+                    "when I travel", "on the website", "in branch"]
+
+
+def generate_customer_data(num_rows: int, seed: int = 42) -> pd.DataFrame:
+    """
+    Generates a dataframe of synthetic customers. Customers that are older,
+    hold a balance or are inactive are more likely to have exited, as found
+    in the real data.
+
+    Inputs:
+        * num_rows: (int) Number of customers to generate
+        * seed: (int) Seed for the random number generator
+
+    Returns:
+        * customer_data: (pd.DataFrame) The synthetic customers, with the
+          same 15 columns in the same order as the real data
+    """
+    rng = np.random.default_rng(seed)
+
+    surnames = np.array([start + end.lower() for start in SURNAME_PARTS
+                         for end in SURNAME_ENDINGS])
+
+    credit_score = np.clip(rng.normal(650, 97, num_rows), 350, 850) \
+        .astype(np.int64)
+    age = np.clip(rng.normal(39, 10.5, num_rows), 18, 92).astype(np.int64)
+    tenure = rng.integers(0, 11, num_rows)
+    balance = np.where(rng.random(num_rows) < 0.36, 0.0,
+                       np.clip(rng.normal(119_800, 30_000, num_rows),
+                               3_700, 250_900)).round(2)
+    num_products = rng.choice([1, 2, 3, 4], num_rows,
+                              p=[0.508, 0.459, 0.027, 0.006])
+    has_credit_card = (rng.random(num_rows) < 0.71).astype(np.int64)
+    is_active = (rng.random(num_rows) < 0.515).astype(np.int64)
+    salary = rng.uniform(11.58, 199_992.48, num_rows).round(2)
+
+    # Customers with the highest churn propensity are marked as exited
+    propensity = 0.07 * (age - 39) + 0.6 * (balance > 0) - 0.9 * is_active \
+        + rng.logistic(size=num_rows)
+    exited = (propensity > np.quantile(propensity, 1 - EXITED_RATIO)) \
+        .astype(np.int64)
+
+    # Combine phrases with customer specific numbers so that, as in the real
+    # data, feedback is rarely duplicated
+    feedback = pd.Series(
+        np.array(FEEDBACK_OPENINGS)[rng.integers(0, len(FEEDBACK_OPENINGS),
+                                                 num_rows)], dtype=object) \
+        + " " + np.array(FEEDBACK_DETAILS)[
+            rng.integers(0, len(FEEDBACK_DETAILS), num_rows)] \
+        + ", customer for " + (tenure + 1).astype(str) + " years, rating " \
+        + rng.integers(1, 101, num_rows).astype(str) + "/100"
+    feedback[rng.random(num_rows) < MISSING_FEEDBACK_RATIO] = np.nan
+
+    return pd.DataFrame({
+        "RowNumber": np.arange(1, num_rows + 1),
+        "CustomerId": 15_565_701 + rng.permutation(num_rows),
+        "Surname": surnames[rng.integers(0, len(surnames), num_rows)],
+        "CreditScore": credit_score,
+        "Country": rng.choice(COUNTRIES, num_rows, p=COUNTRY_PROBS),
+        "Gender": np.where(rng.random(num_rows) < 0.546, "Male", "Female"),
+        "Age": age,
+        "Tenure": tenure,
+        "CustomerFeedback": feedback,
+        "Balance (EUR)": balance,
+        "NumberOfProducts": num_products,
+        "HasCreditCard": has_credit_card,
+        "IsActiveMember": is_active,
+        "EstimatedSalary": salary,
+        "Exited": exited,
+    })
+
+
+def write_customer_data(path: str, num_rows: int, seed: int = 42) -> str:
+    """
+    Generates synthetic customers and writes them to an excel, CSV or Parquet
+    file depending on the extension of the path. Existing files are reused.
+
+    Inputs:
+        * path: (string) File to write
+        * num_rows: (int) Number of customers to generate
+        * seed: (int) Seed for the random number generator
+
+    Returns:
+        * path: (string) The written file
+    """
+    if os.path.exists(path):
+        return path
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".xlsx" and num_rows > EXCEL_MAX_ROWS:
+        raise ValueError(f"An excel spreadsheet can hold at most "
+                         f"{EXCEL_MAX_ROWS} rows, use CSV or Parquet instead")
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    customer_data = generate_customer_data(num_rows, seed)
+
+    if extension == ".csv":
+        customer_data.to_csv(path, index=False)
+    elif extension == ".parquet":
+        customer_data.to_parquet(path, index=False)
+    else:
+        customer_data.to_excel(path, index=False)
+
+    return path
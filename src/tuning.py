@@ -0,0 +1,331 @@
+"""
+This module contains the HyperparameterSearch class which tunes the Random
+Forest and XGBoost models used by MachineLearningModel with stratified k-fold
+cross validation. Candidates and folds are evaluated in parallel and bad
+candidates can be pruned early with successive halving.
+"""
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import f1_score
+from sklearn.model_selection import (ParameterGrid, ParameterSampler,
+                                     StratifiedKFold, train_test_split)
+from threadpoolctl import threadpool_limits
+
+# Parameter that controls the number of trees and therefore the training
+# budget of a candidate. It is the budget that successive halving grows.
+BUDGET_PARAM = "n_estimators"
+
+# Share of each training fold held out to choose when XGBoost stops early, as
+# MachineLearningModel does with model.VALIDATION_FRACTION. The fold's
+# validation data is only used to score the candidate, so that the early
+# stopping round is not chosen on the data it is scored on.
+EARLY_STOPPING_FRACTION = 0.1
+
+# State shared by every task run in a process, set by _init_worker
+_WORKER_STATE = {}
+
+
+def _init_worker(data_dir: str, folds: list[tuple[np.ndarray, np.ndarray]],
+                 model_type: str, n_threads: int,
+                 early_stopping_rounds: int | None) -> None:
+    """
+    Memory-maps the cross validation data in a worker process and limits the
+    number of threads used by native libraries in the worker
+    """
+    _WORKER_STATE.clear()
+    _WORKER_STATE.update({
+        "x": np.load(os.path.join(data_dir, "x.npy"), mmap_mode="r"),
+        "y": np.load(os.path.join(data_dir, "y.npy"), mmap_mode="r"),
+        "folds": folds,
+        "model_type": model_type,
+        "n_threads": n_threads,
+        "early_stopping_rounds": early_stopping_rounds,
+        "fold_cache": {},
+        "thread_limits": threadpool_limits(limits=n_threads),
+    })
+
+
+def _fold_data(fold: int) -> tuple:
+    """
+    Builds the training and validation matrices of a fold the first time the
+    fold is used in a process and returns the cached copy afterwards
+    """
+    fold_cache = _WORKER_STATE["fold_cache"]
+    if fold not in fold_cache:
+        train_idx, valid_idx = _WORKER_STATE["folds"][fold]
+        x, y = _WORKER_STATE["x"], _WORKER_STATE["y"]
+        fold_data = (x[train_idx], y[train_idx], x[valid_idx], y[valid_idx])
+
+        if _WORKER_STATE["model_type"] == "XGB":
+            x_train, y_train, x_valid, y_valid = fold_data
+            n_threads = _WORKER_STATE["n_threads"]
+
+            dstop = None
+            if _WORKER_STATE["early_stopping_rounds"] is not None:
+                x_train, x_stop, y_train, y_stop = train_test_split(
+                    x_train, y_train, test_size=EARLY_STOPPING_FRACTION,
+                    stratify=y_train, random_state=42)
+                dstop = xgb.DMatrix(x_stop, label=y_stop, nthread=n_threads)
+
+            # XGBoost bins the features when a DMatrix is built, so build
+            # them once rather than once per candidate
+            fold_data = (xgb.DMatrix(x_train, label=y_train,
+                                     nthread=n_threads),
+                         dstop,
+                         xgb.DMatrix(x_valid, label=y_valid,
+                                     nthread=n_threads),
+                         y_valid)
+        fold_cache[fold] = fold_data
+
+    return fold_cache[fold]
+
+
+def _evaluate_candidate(params: dict, fold: int) -> tuple[float, int]:
+    """
+    Trains a candidate on one fold and scores it on the fold's validation
+    data with the macro F1 score. XGBoost candidates stop early on a share of
+    the training fold, never on the validation data.
+
+    Returns:
+        * score: (float) Macro F1 score on the validation data
+        * num_trees: (int) Number of trees used for the prediction, which is
+          lower than the budget when XGBoost stops early
+    """
+    params = dict(params)
+    num_trees = params.pop(BUDGET_PARAM)
+    n_threads = _WORKER_STATE["n_threads"]
+
+    if _WORKER_STATE["model_type"] == "XGB":
+        dtrain, dstop, dvalid, y_valid = _fold_data(fold)
+        early_stopping_rounds = _WORKER_STATE["early_stopping_rounds"]
+
+        booster = xgb.train({"objective": "binary:logistic",
+                             "nthread": n_threads, **params},
+                            dtrain, num_boost_round=num_trees,
+                            evals=[] if dstop is None else [(dstop, "stop")],
+                            early_stopping_rounds=early_stopping_rounds,
+                            verbose_eval=False)
+        if early_stopping_rounds is not None:
+            num_trees = booster.best_iteration + 1
+
+        y_proba = booster.predict(dvalid, iteration_range=(0, num_trees))
+    else:
+        x_train, y_train, x_valid, y_valid = _fold_data(fold)
+
+        model = RandomForestClassifier(n_estimators=num_trees,
+                                       random_state=42, n_jobs=n_threads,
+                                       **params)
+        model.fit(x_train, y_train)
+        y_proba = model.predict_proba(x_valid)[:, 1]
+
+    y_pred = (y_proba > 0.5).astype(np.int8)
+
+    return f1_score(y_valid, y_pred, average="macro"), num_trees
+
+
+class HyperparameterSearch():
+    """
+    The HyperparameterSearch evaluates candidate parameters for a Random
+    Forest ("RF") or XGBoost ("XGB") model with stratified k-fold cross
+    validation and ranks them by their mean macro F1 score.
+
+    The features are converted to float32 once and memory-mapped by the
+    worker processes, and each worker builds the matrices of a fold once and
+    reuses them for every candidate. Each worker limits native libraries to
+    threads_per_worker threads so that the pool does not oversubscribe the
+    CPU.
+
+    When halving is enabled, every candidate is first trained with a small
+    number of trees and only the best 1/halving_factor of the candidates are
+    trained again with halving_factor times as many trees, until the full
+    budget is reached.
+
+    Attributes:
+        * self.model_type: (string)
+        * self.param_grid: (dict)
+        * self.results: (pd.DataFrame or None)
+        * self.best_params: (dict or None)
+
+    Methods:
+        * fit
+    """
+
+    def __init__(self, model_type: str, param_grid: dict[str, list],
+                 n_splits: int = 5, n_iter: int | None = None,
+                 max_estimators: int = 100, halving: bool = False,
+                 halving_factor: int = 3,
+                 early_stopping_rounds: int | None = None,
+                 n_workers: int | None = None, threads_per_worker: int = 1,
+                 random_state: int = 42) -> None:
+        """
+        Init function for the HyperparameterSearch class
+
+        Inputs:
+            * model_type: (string) "RF" or "XGB"
+            * param_grid: (dict) Mapping of parameter name to the values to
+              search. Values may also be scipy distributions when n_iter is
+              given.
+            * n_splits: (int) Number of cross validation folds
+            * n_iter: (int) If given then this many candidates are sampled
+              at random from the grid instead of searching all of it
+            * max_estimators: (int) Number of trees used to train each
+              candidate, unless n_estimators is part of the grid
+            * halving: (bool) If True then candidates are pruned with
+              successive halving
+            * halving_factor: (int) Factor by which the candidates are
+              reduced and the number of trees is grown each halving round
+            * early_stopping_rounds: (int) Stop adding XGBoost trees once the
+              loss on EARLY_STOPPING_FRACTION of the training fold has not
+              improved for this many rounds
+            * n_workers: (int) Number of worker processes. Defaults to the
+              number of CPUs divided by threads_per_worker.
+            * threads_per_worker: (int) Number of threads used by each worker
+            * random_state: (int) Seed for the folds and candidate sampling
+        """
+        if model_type not in ("RF", "XGB"):
+            raise ValueError("The selected model must be either RF or XGB.")
+
+        self.model_type = model_type
+        self.param_grid = param_grid
+        self.n_splits = n_splits
+        self.n_iter = n_iter
+        self.max_estimators = max_estimators
+        self.halving = halving
+        self.halving_factor = halving_factor
+        self.early_stopping_rounds = early_stopping_rounds
+        self.threads_per_worker = threads_per_worker
+        self.n_workers = n_workers or \
+            max(1, (os.cpu_count() or 1) // threads_per_worker)
+        self.random_state = random_state
+
+        self.results = None
+        self.best_params = None
+
+    def fit(self, x: pd.DataFrame | np.ndarray,
+            y: pd.Series | np.ndarray) -> pd.DataFrame:
+        """
+        Runs the search
+
+        Inputs:
+            * x: (pd.DataFrame or np.ndarray) Input training data
+            * y: (pd.Series or np.ndarray) Training labels
+
+        Returns:
+            * results: (pd.DataFrame) Mean and standard deviation of the
+              score of every candidate in every round, best first. The best
+              parameters are also stored in self.best_params and can be
+              passed to MachineLearningModel.
+        """
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        y = np.asarray(y, dtype=np.int8)
+
+        folds = list(StratifiedKFold(n_splits=self.n_splits, shuffle=True,
+                                     random_state=self.random_state)
+                     .split(x, y))
+
+        with tempfile.TemporaryDirectory() as data_dir:
+            np.save(os.path.join(data_dir, "x.npy"), x)
+            np.save(os.path.join(data_dir, "y.npy"), y)
+            init_args = (data_dir, folds, self.model_type,
+                         self.threads_per_worker, self.early_stopping_rounds)
+
+            if self.n_workers == 1:
+                _init_worker(*init_args)
+                try:
+                    results = self._run_rounds(map)
+                finally:
+                    _WORKER_STATE["thread_limits"].restore_original_limits()
+                    _WORKER_STATE.clear()
+            else:
+                with ProcessPoolExecutor(max_workers=self.n_workers,
+                                         initializer=_init_worker,
+                                         initargs=init_args) as pool:
+                    results = self._run_rounds(pool.map)
+
+        self.results = results.sort_values(
+            ["round", "mean_score"], ascending=False).reset_index(drop=True)
+
+        best = self.results.iloc[0]
+        self.best_params = {**best["params"],
+                            BUDGET_PARAM: int(best["mean_trees"])}
+
+        return self.results
+
+    def _candidates(self) -> list[dict]:
+        """
+        Returns:
+            * candidates: (list(dict)) Parameters of every candidate
+        """
+        if self.n_iter is None:
+            return list(ParameterGrid(self.param_grid))
+
+        return list(ParameterSampler(self.param_grid, n_iter=self.n_iter,
+                                     random_state=self.random_state))
+
+    def _budgets(self, num_candidates: int) -> list[int]:
+        """
+        Returns:
+            * budgets: (list(int)) Number of trees used in each round
+        """
+        if not self.halving:
+            return [self.max_estimators]
+
+        num_rounds = 1
+        while self.halving_factor ** num_rounds < num_candidates and \
+                self.max_estimators // self.halving_factor ** num_rounds > 0:
+            num_rounds += 1
+
+        return [max(1, self.max_estimators // self.halving_factor ** level)
+                for level in reversed(range(num_rounds))]
+
+    def _run_rounds(self, map_func) -> pd.DataFrame:
+        """
+        Evaluates the candidates over every fold for each round, keeping
+        only the best candidates between rounds
+
+        Inputs:
+            * map_func: (callable) map or the map method of a process pool
+
+        Returns:
+            * results: (pd.DataFrame) Scores of every candidate in every
+              round
+        """
+        candidates = self._candidates()
+        budgets = self._budgets(len(candidates))
+
+        all_results = []
+        for round_idx, budget in enumerate(budgets):
+            # A grid value for the budget takes precedence outside of halving
+            tasks = [({BUDGET_PARAM: budget, **params} if not self.halving
+                      else {**params, BUDGET_PARAM: budget}, fold)
+                     for params in candidates
+                     for fold in range(self.n_splits)]
+
+            fold_results = np.array(list(map_func(_evaluate_candidate,
+                                                  *zip(*tasks))))
+            fold_results = fold_results.reshape(len(candidates),
+                                                self.n_splits, 2)
+
+            round_results = pd.DataFrame({
+                "round": round_idx,
+                "budget": budget,
+                "params": candidates,
+                "mean_score": fold_results[:, :, 0].mean(axis=1),
+                "std_score": fold_results[:, :, 0].std(axis=1),
+                "mean_trees": fold_results[:, :, 1].mean(axis=1).round(),
+            })
+            all_results.append(round_results)
+
+            # Keep the best candidates for the next round
+            num_kept = max(1, len(candidates) // self.halving_factor)
+            best_idx = np.argsort(-round_results["mean_score"].to_numpy(),
+                                  kind="stable")[:num_kept]
+            candidates = [candidates[idx] for idx in best_idx]
+
+        return pd.concat(all_results, ignore_index=True)
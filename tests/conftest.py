@@ -0,0 +1,9 @@
+"""
+Shared setup for the tests. The modules in src/ import each other by their
+bare names, so src/ is put on the import path.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "src"))
@@ -0,0 +1,25 @@
+"""
+Tests for streaming the customer data with DataLoader.iter_clean
+"""
+import numpy as np
+import pandas as pd
+
+from data_loader import DataLoader
+from synthetic_data import generate_customer_data
+
+
+def test_iter_clean_first_chunk_with_empty_text_column(tmp_path):
+    customer_data = generate_customer_data(50)
+    customer_data["CustomerFeedback"] = np.where(
+        customer_data.index < 10, None, "good service")
+    dataset_path = tmp_path / "customers.csv"
+    customer_data.to_csv(dataset_path, index=False)
+
+    chunks = list(DataLoader(str(dataset_path)).iter_clean(chunk_rows=10))
+
+    streamed = pd.concat(chunks)
+    assert len(streamed) == 50
+    assert streamed["CustomerFeedback"].dtype == object
+    assert (streamed["CustomerFeedback"].iloc[:10] == "").all()
+    assert (streamed["CustomerFeedback"].iloc[10:] == "good service").all()
+    assert all((chunk.dtypes == chunks[0].dtypes).all() for chunk in chunks)
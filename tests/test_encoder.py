@@ -0,0 +1,44 @@
+"""
+Tests for encoding string columns with CategoryEncoder
+"""
+import json
+
+import pandas as pd
+from sklearn.preprocessing import LabelEncoder
+
+from encoder import UNKNOWN_CODE, CategoryEncoder
+
+
+def test_codes_match_label_encoder():
+    df = pd.DataFrame({"Country": ["Spain", "France", "Germany", "France"]})
+
+    codes = CategoryEncoder().fit_transform(df.copy(), ["Country"])
+
+    assert codes["Country"].tolist() == \
+        LabelEncoder().fit_transform(df["Country"]).tolist()
+
+
+def test_to_dict_and_from_dict_encode_the_same():
+    train = pd.DataFrame({"Country": ["Spain", "France", "Germany"],
+                          "Gender": ["Male", "Female", "Female"]})
+    encoder = CategoryEncoder().fit(train, ["Country", "Gender"])
+
+    # The state is stored in the model's JSON metadata
+    state = json.loads(json.dumps(encoder.to_dict()))
+    restored = CategoryEncoder.from_dict(state)
+
+    new_data = pd.DataFrame({"Country": ["Germany", "France", "Spain"],
+                             "Gender": ["Female", "Male", "Male"]})
+    assert restored.categories == encoder.categories
+    pd.testing.assert_frame_equal(restored.transform(new_data.copy()),
+                                  encoder.transform(new_data.copy()))
+
+
+def test_unseen_values_get_the_unknown_code():
+    encoder = CategoryEncoder().fit(
+        pd.DataFrame({"Country": ["France", "Germany"]}), ["Country"])
+
+    codes = encoder.transform(
+        pd.DataFrame({"Country": ["Germany", "Italy", None, "France"]}))
+
+    assert codes["Country"].tolist() == [1, UNKNOWN_CODE, UNKNOWN_CODE, 0]
@@ -0,0 +1,62 @@
+"""
+Tests for accumulating metrics over chunks of predictions with
+StreamingMetrics, compared with sklearn.metrics on the same predictions
+"""
+import numpy as np
+import pytest
+from sklearn import metrics
+
+from evaluation import StreamingMetrics
+
+
+@pytest.fixture
+def predictions():
+    rng = np.random.default_rng(0)
+    # Probabilities lie between the swept thresholds, so counting them in
+    # bins of 1 / NUM_BINS does not move any across a threshold. Customers
+    # exit with their predicted probability.
+    y_proba = (rng.integers(0, 1000, 5000) + 0.5) / 1000
+    y_true = (rng.random(5000) < y_proba).astype(int)
+
+    return y_true, y_proba
+
+
+def test_results_match_sklearn_over_chunks(predictions):
+    y_true, y_proba = predictions
+    streaming = StreamingMetrics()
+    for start in range(0, len(y_true), 700):
+        streaming.update(y_true[start:start + 700],
+                         y_proba[start:start + 700])
+
+    results = streaming.results()
+    y_pred = (y_proba > 0.5).astype(int)
+
+    assert results["rows"] == len(y_true)
+    np.testing.assert_array_equal(streaming.confusion_matrix(),
+                                  metrics.confusion_matrix(y_true, y_pred))
+    assert results["accuracy"] == pytest.approx(
+        metrics.accuracy_score(y_true, y_pred))
+    assert results["precision"] == pytest.approx(
+        metrics.precision_score(y_true, y_pred))
+    assert results["recall"] == pytest.approx(
+        metrics.recall_score(y_true, y_pred))
+    assert results["f1"] == pytest.approx(metrics.f1_score(y_true, y_pred))
+    assert results["roc_auc"] == pytest.approx(
+        metrics.roc_auc_score(y_true, y_proba), abs=1e-4)
+    assert results["pr_auc"] == pytest.approx(
+        metrics.average_precision_score(y_true, y_proba), abs=1e-4)
+
+
+def test_threshold_sweep_matches_sklearn(predictions):
+    y_true, y_proba = predictions
+    sweep = StreamingMetrics().update(y_true, y_proba).threshold_sweep()
+
+    for row in sweep.itertuples():
+        y_pred = (y_proba >= row.threshold).astype(int)
+        assert row.precision == pytest.approx(
+            metrics.precision_score(y_true, y_pred, zero_division=0))
+        assert row.recall == pytest.approx(
+            metrics.recall_score(y_true, y_pred))
+        assert row.f1 == pytest.approx(metrics.f1_score(y_true, y_pred))
+        assert row.accuracy == pytest.approx(
+            metrics.accuracy_score(y_true, y_pred))
@@ -0,0 +1,37 @@
+"""
+Tests for saving and loading a MachineLearningModel
+"""
+import numpy as np
+import pytest
+
+from model import MachineLearningModel
+from synthetic_data import generate_customer_data
+
+FEATURE_COLS = ["CreditScore", "Age", "Tenure", "Balance (EUR)",
+                "NumberOfProducts", "IsActiveMember", "EstimatedSalary"]
+
+
+@pytest.mark.parametrize("model_type", ["XGB", "XGBC", "RF"])
+def test_save_and_load_predict_the_same(tmp_path, model_type):
+    customer_data = generate_customer_data(600)
+    # The native classifier also encodes a string column itself
+    feature_cols = FEATURE_COLS + (["Country"] if model_type == "XGBC"
+                                   else [])
+    x, y = customer_data[feature_cols], customer_data["Exited"]
+    x_train, x_test, y_train, y_test = x[:400], x[400:], y[:400], y[400:]
+
+    model = MachineLearningModel(x_train, x_test, y_train, y_test,
+                                 model_type, params={"n_estimators": 20})
+    y_pred = model.fit_and_predict()
+    y_proba = model.predict_proba(x_test)
+    model.save(str(tmp_path), {"label_encoder": {"categories": {}}})
+
+    loaded_model = MachineLearningModel.load(str(tmp_path))
+
+    assert loaded_model.model_type == model_type
+    assert loaded_model.feature_names == feature_cols
+    assert loaded_model.preprocessing == {
+        "label_encoder": {"categories": {}}}
+    np.testing.assert_allclose(loaded_model.predict_proba(x_test), y_proba,
+                               rtol=0, atol=1e-6)
+    np.testing.assert_array_equal(loaded_model.predict(x_test), y_pred)